@@ -0,0 +1,241 @@
+"""
+Password hashing off the request threads, and login throttles.
+
+PBKDF2 is slow on purpose. /register and /login used to run it inline on the
+web worker, so a burst of logins (or a credential-stuffing run) starved every
+other route of CPU. PasswordHasher runs it in a small process pool instead:
+
+  * PASSWORD_HASH_WORKERS       - hashing processes per app process (default 2)
+  * PASSWORD_HASH_QUEUE_SIZE    - hashes that may wait for a free worker; past
+                                  that a request waits PASSWORD_HASH_QUEUE_TIMEOUT
+                                  seconds for a slot and then gets a 503
+  * PASSWORD_HASH_ITERATIONS    - PBKDF2-SHA256 iterations for new hashes; a hash
+                                  made with another cost is replaced on the next
+                                  successful login
+
+LoginThrottle turns abusive traffic away before any hash is computed. Every
+/login and /register attempt counts against the client IP
+(LOGIN_IP_LIMIT per LOGIN_IP_WINDOW_SECONDS). Failed logins count against the
+username (LOGIN_ACCOUNT_FAILURES per LOGIN_ACCOUNT_WINDOW_SECONDS). Counters are
+fixed windows kept in the session store (db/sessions.py), so the limits hold
+across workers and nodes. Behind a reverse proxy, set TRUSTED_PROXIES (see
+app.py) so the client IP is taken from X-Forwarded-For.
+"""
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 16))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0))
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+
+LOGIN_IP_LIMIT = int(os.environ.get('LOGIN_IP_LIMIT', 30))
+LOGIN_IP_WINDOW_SECONDS = float(os.environ.get('LOGIN_IP_WINDOW_SECONDS', 60))
+LOGIN_ACCOUNT_FAILURES = int(os.environ.get('LOGIN_ACCOUNT_FAILURES', 5))
+LOGIN_ACCOUNT_WINDOW_SECONDS = float(os.environ.get('LOGIN_ACCOUNT_WINDOW_SECONDS', 900))
+
+# Oldest windows are forgotten past this many tracked IPs or usernames
+MAX_TRACKED_KEYS = 100000
+
+
+class HashQueueFull(Exception):
+    """Every hashing worker is busy and no queue slot freed up in time"""
+
+
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE_SIZE,
+                 queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT, iterations=PASSWORD_HASH_ITERATIONS,
+                 stats_window=1000):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.method = f'pbkdf2:sha256:{iterations}'
+        # Running plus waiting hashes; nothing beyond this reaches the pool
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._rejected = 0
+        self._completed = {'hash': 0, 'verify': 0}
+        self._latencies = {'hash': deque(maxlen=stats_window), 'verify': deque(maxlen=stats_window)}
+
+    def _pool(self):
+        # Started on first use so a forking server starts it in each worker, not the parent
+        if self._executor is None:
+            with self._start_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=mp.get_context('spawn'))
+        return self._executor
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise HashQueueFull(f"Password hashing is saturated ({self.workers + self.queue_size} in flight)")
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            return self._pool().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A hashing process died; start a fresh pool for the next request
+            with self._start_lock:
+                self._executor = None
+            raise
+        finally:
+            self._slots.release()
+            with self._stats_lock:
+                self._in_flight -= 1
+                self._completed[kind] += 1
+                self._latencies[kind].append(time.perf_counter() - started)
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with a different method or iteration count"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        """Queue depth, rejections and latency (including the wait for a worker) per operation"""
+        with self._stats_lock:
+            latencies = {kind: np.array(values) * 1000.0 for kind, values in self._latencies.items()}
+            stats = {
+                'method': self.method,
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._in_flight,
+                'queued': max(0, self._in_flight - self.workers),
+                'max_in_flight': self._max_in_flight,
+                'rejected': self._rejected,
+                'completed': dict(self._completed)
+            }
+        stats['latency_ms'] = {
+            kind: {
+                'p50': float(np.percentile(values, 50)) if len(values) else 0.0,
+                'p99': float(np.percentile(values, 99)) if len(values) else 0.0,
+                'max': float(values.max()) if len(values) else 0.0
+            }
+            for kind, values in latencies.items()
+        }
+        return stats
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MemoryCounters:
+    """Fixed-window counters in this process only; the session stores provide shared ones"""
+    backend = 'memory'
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        # key -> [hits, window closes at], ordered by when the window opened
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._windows:
+            expires_at = next(iter(self._windows.values()))[1]
+            if expires_at > now and len(self._windows) <= self.max_keys:
+                break
+            self._windows.popitem(last=False)
+
+    def hit(self, key, window_seconds):
+        now = time.time()
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[1] <= now:
+                # A new window goes to the end, keeping the order by window start
+                self._windows.pop(key, None)
+                entry = self._windows[key] = [0, now + window_seconds]
+                self._prune(now)
+            entry[0] += 1
+
+    def count(self, key):
+        with self._lock:
+            entry = self._windows.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return tuple(entry)
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class Throttle:
+    """At most `limit` hits per key in each fixed window of window_seconds"""
+
+    def __init__(self, name, limit, window_seconds, counters=None):
+        self.name = name
+        self.limit = limit
+        self.window = window_seconds
+        self.counters = counters if counters is not None else MemoryCounters()
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    def _key(self, key):
+        return f'throttle:{self.name}:{key}'
+
+    def retry_after(self, key):
+        """Seconds until key may try again, 0 while it is under the limit"""
+        entry = self.counters.count(self._key(key))
+        if entry is None or entry[0] < self.limit:
+            return 0
+        with self._lock:
+            self._rejected += 1
+        return max(1, int(entry[1] - time.time()) + 1)
+
+    def hit(self, key):
+        self.counters.hit(self._key(key), self.window)
+
+    def reset(self, key):
+        self.counters.reset(self._key(key))
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'window_seconds': self.window,
+                    'backend': self.counters.backend, 'rejected': self._rejected}
+
+
+class LoginThrottle:
+    def __init__(self, counters=None, ip_limit=LOGIN_IP_LIMIT, ip_window=LOGIN_IP_WINDOW_SECONDS,
+                 account_failures=LOGIN_ACCOUNT_FAILURES, account_window=LOGIN_ACCOUNT_WINDOW_SECONDS):
+        # counters: a session store (db/sessions.py) shares the limits between processes
+        self.per_ip = Throttle('login-ip', ip_limit, ip_window, counters)
+        self.per_account = Throttle('login-account', account_failures, account_window, counters)
+
+    def check(self, ip, username=None):
+        """Seconds the client must wait, or 0 to go ahead (the attempt then counts against the IP)"""
+        retry_after = self.per_ip.retry_after(ip)
+        if not retry_after and username:
+            retry_after = self.per_account.retry_after(username)
+        if not retry_after:
+            self.per_ip.hit(ip)
+        return retry_after
+
+    def failed(self, username):
+        self.per_account.hit(username)
+
+    def succeeded(self, username):
+        self.per_account.reset(username)
+
+    def stats(self):
+        return {'per_ip': self.per_ip.stats(), 'per_account': self.per_account.stats()}
@@ -3,6 +3,10 @@ import requests
 import json
 import time
 
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
 class GroqAPI:
     def __init__(self):
         # Try both API keys, use the first one that works
@@ -31,17 +35,17 @@ class GroqAPI:
                 return response.json()
             elif response.status_code == 401 and api_key_index < len(self.api_keys) - 1:
                 # Try the next API key
-                print(f"API key {api_key_index+1} failed. Trying next key...")
+                log.warning("API key rejected, trying next key", key_index=api_key_index + 1)
                 return self._make_request(endpoint, payload, api_key_index + 1)
             else:
-                print(f"API request failed: {response.status_code} - {response.text}")
+                log.error("API request failed", status=response.status_code, body=response.text)
                 return {"error": response.text}
                 
         except Exception as e:
-            print(f"Error making API request: {str(e)}")
+            log.warning("Error making API request", error=str(e))
             if api_key_index < len(self.api_keys) - 1:
                 # Try the next API key
-                print(f"Trying next API key...")
+                log.info("Trying next API key")
                 return self._make_request(endpoint, payload, api_key_index + 1)
             else:
                 return {"error": str(e)}
@@ -122,8 +126,7 @@ class GroqAPI:
             attributes["food_name"] = food_name
             return attributes
         except Exception as e:
-            print(f"Error parsing LLM response: {str(e)}")
-            print(f"Raw response: {response}")
+            log.warning("Error parsing LLM response", error=str(e), response=response)
             # Return default values if parsing fails
             return self._get_default_food_attributes(food_name)
     
@@ -169,7 +172,7 @@ class GroqAPI:
         try:
             return response["choices"][0]["message"]["content"]
         except Exception as e:
-            print(f"Error parsing chat response: {str(e)}")
+            log.warning("Error parsing chat response", error=str(e))
             return "I'm having trouble generating a response right now. Please try again."
 
     def get_structured_response(self, prompt):
@@ -221,7 +224,7 @@ class GroqAPI:
             return json_str
             
         except Exception as e:
-            print(f"Error parsing structured response: {str(e)}")
+            log.warning("Error parsing structured response", error=str(e))
             # Return fallback response
             return json.dumps({
                 "activity_name": "Mindful Walking",
@@ -312,7 +315,7 @@ class GroqAPI:
             return points
             
         except Exception as e:
-            print(f"Error parsing explanation response: {str(e)}")
+            log.warning("Error parsing explanation response", error=str(e))
             # Return fallback explanation
             return [
                 "During this menstrual phase, specific hormonal changes affect both physical comfort and mood regulation.",
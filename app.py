@@ -1,100 +1,346 @@
 import os
 import json
-import sqlite3
-from flask import Flask, request, render_template, jsonify, session, redirect, url_for, flash
+import math
+from flask import Flask, Response, request, render_template, jsonify, session, redirect, url_for, flash
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
 import sys
+import atexit
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, where waitress serves from a single process
 
 # Add the project root to the path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import custom modules
 from api.llm_service import GroqAPI
-from models.predict import Predictor
+from api.auth import HashQueueFull, LoginThrottle, PasswordHasher
+from models.predict import MODEL_PATH, Predictor
+from models.inference_server import InferenceServer
+from models.online_update import run_update as run_online_update
+from db.repository import DuplicateUser, SQLiteRepository, create_repository
+from db.pagination import InvalidCursor, page_params, split_page
+from db.predictions import (FOOD_COLUMNS, IMPACT_CODES, IMPACT_COLUMNS, IMPACT_LABELS, NUMERIC_FOOD_COLUMNS,
+                            food_from_row, impact_results)
+from db.retention import run_retention, stats as retention_stats
+from db import sessions
+from observability.log import get_logger, shutdown as shutdown_logging, stats as logging_stats
+from observability import timing
+from observability.timing import span
+
+log = get_logger(__name__)
+atexit.register(shutdown_logging)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
-app.secret_key = os.urandom(24)
+
+# Behind a reverse proxy, take the client address and scheme from the X-Forwarded-* headers set by the
+# TRUSTED_PROXIES proxies in front of the app; without it every client shares the proxy's address
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES,
+                            x_host=TRUSTED_PROXIES)
+
+# Per-stage timings go into the /metrics histograms, and with SERVER_TIMING=1 a Server-Timing header
+# (see observability/timing.py)
+timing.init_app(app)
 
 # Initialize services
 llm_api = GroqAPI()
 
-# Setup SQLite database
+# Password hashing runs in a bounded process pool; throttles apply before any hash (see api/auth.py)
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.stop)
+
+# Opened by create_app() below: the session store, the throttles counting in it and the database
+session_interface = None
+login_throttle = None
+repository = None
+# The maintenance jobs read and write the SQLite file directly
+sqlite_backend = False
+
+# Apply schema migrations on startup
 def init_db():
-    conn = sqlite3.connect('food_predictions.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        food_name TEXT,
-        food_data TEXT,
-        prediction_results TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user_id INTEGER NULL
-    )
-    ''')
+    repository.migrate()
+
+# Load predictor (only when needed to avoid loading models at startup)
+# INFERENCE_MODE=process moves the model into a micro-batching worker process
+predictor = None
+predictor_lock = threading.Lock()
+def get_predictor():
+    global predictor
+    if predictor is None or (isinstance(predictor, InferenceServer) and not predictor.is_alive()):
+        with predictor_lock:
+            # A crashed inference worker is replaced on the next request
+            if isinstance(predictor, InferenceServer) and not predictor.is_alive():
+                log.warning("Inference worker exited, restarting it")
+                predictor.stop()
+                predictor = None
+            if predictor is None:
+                try:
+                    cache_size = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+                    if os.environ.get('INFERENCE_MODE', 'inprocess') == 'process':
+                        server = InferenceServer(
+                            max_batch_size=int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 32)),
+                            max_wait_ms=float(os.environ.get('INFERENCE_MAX_WAIT_MS', 2)),
+                            cache_size=cache_size
+                        )
+                        predictor = server.start()
+                        atexit.register(server.stop)
+                    else:
+                        predictor = Predictor(cache_size=cache_size)
+                except Exception:
+                    log.exception("Error loading predictor")
+                    return None
+    return predictor
+
+# Periodically fold user feedback into the model (ONLINE_UPDATE_INTERVAL_MINUTES, off by default)
+def schedule_online_updates(interval_minutes):
+    def update_loop():
+        while True:
+            time.sleep(interval_minutes * 60)
+            try:
+                summary = run_online_update(repository.path)
+                log.info("Online model update", summary=summary)
+                if summary.get('published') and predictor is not None:
+                    predictor.load_model()
+            except Exception:
+                log.exception("Error in online model update")
+    
+    threading.Thread(target=update_loop, daemon=True).start()
+
+# Periodically archive and delete expired history rows (RETENTION_INTERVAL_MINUTES, off by default)
+def schedule_retention(interval_minutes):
+    def retention_loop():
+        while True:
+            time.sleep(interval_minutes * 60)
+            try:
+                with repository.pool.connection() as conn:
+                    summary = run_retention(conn)
+                log.info("Retention run", rows_deleted=summary['rows_deleted'], foods_deleted=summary['foods_deleted'],
+                         bytes_reclaimed=summary['vacuum']['bytes_reclaimed'])
+            except Exception:
+                log.exception("Error in retention run")
+    
+    threading.Thread(target=retention_loop, daemon=True).start()
+
+# Delete expired sessions in the background (SESSION_GC_INTERVAL_SECONDS, 0 disables)
+def schedule_session_gc(interval_seconds):
+    def gc_loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                purged = session_interface.store.purge_expired()
+                if purged:
+                    log.info("Session GC", deleted=purged)
+            except Exception:
+                log.exception("Error in session GC")
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS chat_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id TEXT,
-        user_message TEXT,
-        bot_response TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user_id INTEGER NULL
-    )
-    ''')
+    threading.Thread(target=gc_loop, daemon=True).start()
+
+# Reload the model when another process replaces best_model.pkl (MODEL_RELOAD_INTERVAL_SECONDS, 0 disables).
+# The online update publishes from one process; every other worker picks the new model up here
+def model_mtime():
+    try:
+        return os.path.getmtime(MODEL_PATH)
+    except OSError:
+        return None
+
+def schedule_model_reload(interval_seconds):
+    def reload_loop():
+        loaded_mtime = model_mtime()
+        while True:
+            time.sleep(interval_seconds)
+            mtime = model_mtime()
+            if mtime == loaded_mtime:
+                continue
+            loaded_mtime = mtime
+            try:
+                if predictor is not None:
+                    predictor.load_model()
+                    log.info("Reloaded model", path=MODEL_PATH)
+            except Exception:
+                log.exception("Error reloading model")
+    
+    threading.Thread(target=reload_loop, daemon=True).start()
+
+# The maintenance jobs run in one process per host: the one holding BACKGROUND_JOBS_LOCK
+BACKGROUND_JOBS_LOCK = os.environ.get('BACKGROUND_JOBS_LOCK', 'background_jobs.lock')
+JOBS_LOCK_RETRY_SECONDS = 60
+jobs_lock_file = None
+
+def take_jobs_lock():
+    global jobs_lock_file
+    if fcntl is None:
+        return True
+    lock_file = open(BACKGROUND_JOBS_LOCK, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Held until the process exits; a recycled worker hands the jobs to another one
+    jobs_lock_file = lock_file
+    return True
+
+def start_maintenance_jobs():
+    if float(os.environ.get('ONLINE_UPDATE_INTERVAL_MINUTES', 0)) > 0:
+        if sqlite_backend:
+            schedule_online_updates(float(os.environ['ONLINE_UPDATE_INTERVAL_MINUTES']))
+        else:
+            log.warning("ONLINE_UPDATE_INTERVAL_MINUTES is ignored: online updates read the SQLite database")
+    
+    if float(os.environ.get('RETENTION_INTERVAL_MINUTES', 0)) > 0:
+        if sqlite_backend:
+            schedule_retention(float(os.environ['RETENTION_INTERVAL_MINUTES']))
+        else:
+            log.warning("RETENTION_INTERVAL_MINUTES is ignored: retention runs against the SQLite database")
+    
+    if sessions.SESSION_GC_INTERVAL_SECONDS > 0:
+        schedule_session_gc(sessions.SESSION_GC_INTERVAL_SECONDS)
+
+def start_background_jobs():
+    model_reload_interval = float(os.environ.get('MODEL_RELOAD_INTERVAL_SECONDS', 30))
+    if model_reload_interval > 0:
+        schedule_model_reload(model_reload_interval)
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    if take_jobs_lock():
+        start_maintenance_jobs()
+        return
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS activity_recommendations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        cycle_phase TEXT,
-        stress_level TEXT,
-        emotion TEXT,
-        additional_factors TEXT,
-        recommendation TEXT,
-        steps TEXT,
-        extras TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user_id INTEGER NULL
-    )
-    ''')
+    def standby_loop():
+        # Another process runs the jobs; take over once it exits
+        while not take_jobs_lock():
+            time.sleep(JOBS_LOCK_RETRY_SECONDS)
+        start_maintenance_jobs()
     
-    conn.commit()
-    conn.close()
+    threading.Thread(target=standby_loop, daemon=True).start()
 
-# Initialize database on startup
-init_db()
+# Pre-forking servers call this in each worker (gunicorn.conf.py): connections opened
+# while the master preloaded the app must not be shared with the workers
+def after_fork():
+    repository.after_fork()
+    session_interface.store.after_fork()
+    start_background_jobs()
 
-# Load predictor (only when needed to avoid loading models at startup)
-predictor = None
-def get_predictor():
-    global predictor
-    if predictor is None:
+# Open the stores, apply migrations and start the background jobs, once per process
+app_ready = False
+def create_app():
+    global session_interface, login_throttle, repository, sqlite_backend, app_ready
+    if app_ready:
+        return app
+    
+    # Sessions live in a shared store keyed by a signed id (FLASK_SECRET_KEY, see db/sessions.py)
+    session_interface = sessions.init_app(app)
+    atexit.register(session_interface.store.close)
+    # Counters live in the session store so the limits hold across workers and nodes
+    login_throttle = LoginThrottle(session_interface.store)
+    
+    # Storage backend from DATABASE_URL (SQLite file by default, see db/repository.py)
+    repository = create_repository()
+    atexit.register(repository.close)
+    init_db()
+    sqlite_backend = isinstance(repository, SQLiteRepository)
+    
+    # gunicorn preloads the app in its master, which serves no requests: there the jobs
+    # are started in each worker by after_fork instead (gunicorn.conf.py)
+    if os.environ.get('BACKGROUND_JOBS_AFTER_FORK') != '1':
+        start_background_jobs()
+    app_ready = True
+    return app
+
+# Processes spawned from `python app.py` (password hashing, INFERENCE_MODE=process) re-run this
+# script as __mp_main__ to find their functions; they must not open a second copy of everything
+if __name__ != '__mp_main__':
+    create_app()
+
+# Runtime statistics for monitoring
+@app.route('/stats', methods=['GET'])
+def stats():
+    stats_data = repository.stats()
+    stats_data['sessions'] = session_interface.store.stats()
+    stats_data['auth'] = dict(password_hasher.stats(), throttle=login_throttle.stats())
+    stats_data['logging'] = logging_stats()
+    stats_data['timing'] = timing.stats()
+    if sqlite_backend:
+        stats_data['retention'] = retention_stats()
+    if isinstance(predictor, InferenceServer):
+        stats_data['inference'] = predictor.stats()
+    elif predictor is not None:
+        stats_data['prediction_cache'] = predictor.cache_info()
+    return jsonify(stats_data)
+
+# Request latency histograms per route and stage, in the Prometheus text format (needs ADMIN_TOKEN)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not timing.ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not timing.admin_token_valid(timing.request_token()):
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(timing.histograms.render(), mimetype='text/plain; version=0.0.4')
+
+# Profile a sampled share of live requests for a fixed window (needs ADMIN_TOKEN)
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    if not timing.ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not timing.admin_token_valid(timing.request_token()):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
         try:
-            predictor = Predictor()
-        except Exception as e:
-            print(f"Error loading predictor: {str(e)}")
-            return None
-    return predictor
+            window = timing.profiler.start(data.get('seconds', 60), data.get('sample_rate', 0.1))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seconds and sample_rate must be numbers'}), 400
+        log.warning("Profiling started", until=window['until'], sample_rate=window['sample_rate'])
+    elif request.method == 'DELETE':
+        timing.profiler.stop()
+        log.warning("Profiling stopped")
+    return jsonify(timing.profiler.stats())
+
+FEEDBACK_TARGETS = [
+    'impact_on_cramps',
+    'impact_on_bloating',
+    'impact_on_headache',
+    'impact_on_mood_swings',
+    'impact_on_fatigue',
+    'impact_on_acne'
+]
+FEEDBACK_IMPACTS = ['Beneficial', 'Neutral', 'Harmful']
+
+def is_number(value):
+    try:
+        return not isinstance(value, bool) and math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
 
 # Check if user is logged in
 def is_logged_in():
     return 'user_id' in session
 
+def too_many_attempts(retry_after):
+    response = jsonify({'error': 'Too many attempts, please try again later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def hashing_busy():
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def inference_unavailable():
+    response = jsonify({'error': 'Prediction service is temporarily unavailable, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # Routes
 @app.route('/')
 def index():
@@ -112,41 +358,35 @@ def register():
         if not username or not email or not password:
             return jsonify({'error': 'All fields are required'}), 400
         
-        # Hash password
-        hashed_password = generate_password_hash(password)
+        retry_after = login_throttle.check(request.remote_addr)
+        if retry_after:
+            return too_many_attempts(retry_after)
         
-        # Save user to database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
+        # Hash password (in the hashing pool)
+        hashed_password = password_hasher.hash(password)
         
+        # Save user to database
         try:
-            cursor.execute(
-                'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                (username, email, hashed_password)
-            )
-            conn.commit()
+            user_id = repository.create_user(username, email, hashed_password)
             
-            # Get the user_id
-            cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-            user_id = cursor.fetchone()[0]
-            
-            # Set session
+            # Set session (under a fresh id)
+            session.regenerate()
             session['user_id'] = user_id
             session['username'] = username
             
             return jsonify({'success': True, 'message': 'Registration successful', 'username': username})
-        except sqlite3.IntegrityError:
+        except DuplicateUser:
             return jsonify({'error': 'Username or email already exists'}), 400
-        finally:
-            conn.close()
     
+    except HashQueueFull:
+        return hashing_busy()
     except Exception as e:
-        print(f"Error in registration: {str(e)}")
+        log.exception("Error in registration")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/login', methods=['POST'])
 def login():
-    print("Login attempt")  # Debugging line
+    log.debug("Login attempt")
     try:
         data = request.json
         username = data.get('username')
@@ -155,23 +395,32 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password are required'}), 400
         
+        # Rejected before any hashing when the IP or the account is over its limit
+        retry_after = login_throttle.check(request.remote_addr, username)
+        if retry_after:
+            return too_many_attempts(retry_after)
+        
         # Check credentials
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, username, password FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user[2], password):
-            # Set session
+        user = repository.get_user_by_username(username)
+        
+        if user and password_hasher.verify(user[2], password):
+            login_throttle.succeeded(username)
+            # Upgrade hashes made with an older PASSWORD_HASH_ITERATIONS
+            if password_hasher.needs_rehash(user[2]):
+                repository.update_password_hash(user[0], password_hasher.hash(password))
+            # Set session (under a fresh id)
+            session.regenerate()
             session['user_id'] = user[0]
             session['username'] = user[1]
             return jsonify({'success': True, 'message': 'Login successful', 'username': user[1]})
         else:
+            login_throttle.failed(username)
             return jsonify({'error': 'Invalid username or password'}), 401
     
+    except HashQueueFull:
+        return hashing_busy()
     except Exception as e:
-        print(f"Error in login: {str(e)}")
+        log.exception("Error in login")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/logout', methods=['POST'])
@@ -191,7 +440,7 @@ def predict():
     try:
         # Get food name from the request
         data = request.json
-        print(f"Received prediction request with data: {data}")
+        log.debug("Prediction request", payload=data)
         
         food_name = data.get('food_name')
         quantity = data.get('quantity', 'Standard serving')
@@ -200,8 +449,9 @@ def predict():
             return jsonify({'error': 'Food name is required'}), 400
         
         # Get food attributes from LLM and check for alerts
-        print(f"Getting food attributes for: {food_name}, quantity: {quantity}")
-        food_data = llm_api.get_food_attributes(food_name)
+        log.debug("Getting food attributes", food_name=food_name, quantity=quantity)
+        with span('llm'):
+            food_data = llm_api.get_food_attributes(food_name)
         
         # Check for alert in the response
         if 'alert' in food_data:
@@ -228,7 +478,7 @@ def predict():
             return jsonify(non_edible_response)
         
         food_data['quantity'] = quantity
-        print(f"Retrieved food data: {food_data}")
+        log.debug("Retrieved food data", food_data=food_data)
         
         # Load predictor
         pred = get_predictor()
@@ -236,37 +486,78 @@ def predict():
             return jsonify({'error': 'Failed to load the prediction model'}), 500
         
         # Make prediction
-        print(f"Making prediction for food data")
-        prediction_results = pred.predict(food_data)
-        print(f"Prediction results: {prediction_results}")
+        try:
+            with span('predict'):
+                prediction_results = pred.predict(food_data)
+        except (TimeoutError, RuntimeError) as e:
+            if not isinstance(pred, InferenceServer):
+                raise
+            # The worker timed out or crashed; get_predictor() restarts it if it exited
+            log.warning("Inference worker unavailable", error=str(e))
+            return inference_unavailable()
+        log.debug("Prediction results", results=prediction_results)
         
         # Save prediction to database only if user is logged in
         user_id = session.get('user_id')
+        prediction_id = None
         if user_id:
-            conn = sqlite3.connect('food_predictions.db')
-            cursor = conn.cursor()
-            print(f"User ID for this prediction: {user_id}")
-            
-            cursor.execute(
-                'INSERT INTO predictions (food_name, food_data, prediction_results, user_id) VALUES (?, ?, ?, ?)',
-                (food_name, json.dumps(food_data), json.dumps(prediction_results), user_id)
-            )
-            conn.commit()
-            conn.close()
-            print(f"Saved prediction to database for user {user_id}")
+            # The id links later feedback to this prediction; with SQLite it arrives with the next group commit
+            with span('db'):
+                prediction_id = repository.add_prediction(food_name, food_data, prediction_results, user_id)
+            if prediction_id is None:
+                # Not written, or still queued past PREDICTION_ID_TIMEOUT
+                log.warning("Prediction id not available", user_id=user_id)
+            else:
+                log.info("Saved prediction", user_id=user_id, prediction_id=prediction_id)
         else:
-            print("User not logged in, not saving prediction history")
+            log.debug("User not logged in, not saving prediction history")
         
         # Return results
         response_data = {
             'food_data': food_data,
-            'prediction_results': prediction_results
+            'prediction_results': prediction_results,
+            'prediction_id': prediction_id
         }
-        print(f"Sending response: {response_data}")
-        return jsonify(response_data)
+        log.debug("Prediction response", response=response_data)
+        with span('serialize'):
+            return jsonify(response_data)
+    
+    except Exception as e:
+        log.exception("Error in prediction")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/feedback', methods=['POST'])
+def feedback():
+    try:
+        # Confirmed symptom impacts for a food, used for incremental model updates
+        data = request.json
+        food_data = data.get('food_data')
+        impacts = data.get('impacts', {})
+        
+        if not isinstance(food_data, dict) or not food_data.get('food_name'):
+            return jsonify({'error': 'Food data with a food name is required'}), 400
+        
+        # The online update feeds these to the scaler, so they must be finite numbers
+        non_numeric = [col for col in NUMERIC_FOOD_COLUMNS if col in food_data and not is_number(food_data[col])]
+        if non_numeric:
+            return jsonify({'error': f"Food data must be numeric for: {', '.join(non_numeric)}"}), 400
+        
+        missing = [col for col in FEEDBACK_TARGETS if col not in impacts]
+        if missing:
+            return jsonify({'error': f"Impacts are required for: {', '.join(missing)}"}), 400
+        invalid = [col for col in FEEDBACK_TARGETS if impacts[col] not in FEEDBACK_IMPACTS]
+        if invalid:
+            return jsonify({'error': f"Impacts must be one of {', '.join(FEEDBACK_IMPACTS)}"}), 400
+        
+        repository.add_feedback(
+            data.get('prediction_id'), food_data['food_name'], json.dumps(food_data),
+            json.dumps({col: impacts[col] for col in FEEDBACK_TARGETS}), session.get('user_id')
+        )
+        
+        return jsonify({'success': True, 'message': 'Feedback recorded'})
     
     except Exception as e:
-        print(f"Error in prediction: {str(e)}")
+        log.exception("Error saving feedback")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/chat', methods=['POST'])
@@ -274,7 +565,7 @@ def chat():
     try:
         # Get message from request
         data = request.json
-        print(f"Received chat request with data: {data}")
+        log.debug("Chat request", payload=data)
         
         message = data.get('message')
         if not message:
@@ -282,32 +573,16 @@ def chat():
         
         # Get user ID if logged in
         user_id = session.get('user_id')
-        print(f"Chat for user_id: {user_id}")
         
         # Get or create session ID for chat (for non-logged in users)
         if 'chat_session_id' not in session:
-            session['chat_session_id'] = os.urandom(16).hex()
+            session['chat_session_id'] = sessions.new_session_id()
         
         # Get chat history from the database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
         # If user is logged in, get their chat history, otherwise use session-based history
-        if user_id:
-            cursor.execute(
-                'SELECT user_message, bot_response FROM chat_history WHERE user_id = ? ORDER BY timestamp ASC LIMIT 10',
-                (user_id,)
-            )
-        else:
-            cursor.execute(
-                'SELECT user_message, bot_response FROM chat_history WHERE session_id = ? ORDER BY timestamp ASC LIMIT 10',
-                (session['chat_session_id'],)
-            )
-            
-        history = cursor.fetchall()
-        conn.close()
+        history = repository.chat_context(user_id, session['chat_session_id'])
         
-        print(f"Retrieved {len(history)} chat history messages")
+        log.debug("Retrieved chat history", user_id=user_id, messages=len(history))
         
         # Format history for the API
         conversation_history = []
@@ -315,29 +590,21 @@ def chat():
             conversation_history.append({"role": "user", "content": user_msg})
             conversation_history.append({"role": "assistant", "content": bot_msg})
         
-        print(f"Formatted {len(conversation_history)} messages for context")
         
         # Get response from LLM with context
         response = llm_api.chat(message, conversation_history)
         
         # Save to database only if user is logged in
         if user_id:
-            conn = sqlite3.connect('food_predictions.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO chat_history (session_id, user_message, bot_response, user_id) VALUES (?, ?, ?, ?)',
-                (session['chat_session_id'], message, response, user_id)
-            )
-            conn.commit()
-            conn.close()
-            print(f"Saved chat message to database for user {user_id}")
+            repository.add_chat(session['chat_session_id'], message, response, user_id)
+            log.debug("Saved chat message", user_id=user_id)
         else:
-            print("User not logged in, not saving chat history")
+            log.debug("User not logged in, not saving chat history")
             
         return jsonify({'response': response})
     
     except Exception as e:
-        print(f"Error in chat: {str(e)}")
+        log.exception("Error in chat")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/history', methods=['GET'])
@@ -345,46 +612,54 @@ def history():
     try:
         # Get user ID if logged in
         user_id = session.get('user_id')
-        print(f"Fetching history for user_id: {user_id}")
         
-        # Get predictions history
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
-        if user_id:
-            # Get user-specific history if logged in
-            cursor.execute(
-                'SELECT food_name, prediction_results, timestamp FROM predictions WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10',
-                (user_id,)
-            )
-        else:
-            # Get session-based history if not logged in
-            cursor.execute(
-                'SELECT food_name, prediction_results, timestamp FROM predictions WHERE user_id IS NULL ORDER BY timestamp DESC LIMIT 10'
-            )
-            
-        predictions = cursor.fetchall()
-        print(f"Found {len(predictions)} prediction records")
+        # Keyset page: ?limit=N&cursor=<next_cursor from the previous page>
+        cursor_timestamp, cursor_id, fetch_limit = page_params(request.args, default_limit=10)
+        # User-specific history if logged in, otherwise anonymous history
+        rows = repository.prediction_page(user_id, cursor_timestamp, cursor_id, fetch_limit)
+        predictions, next_cursor = split_page(rows, fetch_limit, key=lambda row: (row[-1], row[0]))
+        log.debug("Fetched prediction history", user_id=user_id, records=len(predictions))
         
-        # Format the results
+        # Format the results (list fields only; /history/<id> returns the food details)
         prediction_history = []
-        for food_name, results, timestamp in predictions:
-            try:
-                parsed_results = json.loads(results)
-                prediction_history.append({
-                    'food_name': food_name,
-                    'results': parsed_results,
-                    'timestamp': timestamp
-                })
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON from database: {e}")
-                continue
+        for prediction_id, food_name, *codes, timestamp in predictions:
+            prediction_history.append({
+                'id': prediction_id,
+                'food_name': food_name,
+                'results': impact_results(codes),
+                'timestamp': timestamp
+            })
+        
+        return jsonify({'history': prediction_history, 'next_cursor': next_cursor})
+    
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("Error retrieving history")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/history/<int:prediction_id>', methods=['GET'])
+def history_detail(prediction_id):
+    try:
+        user_id = session.get('user_id')
+        row = repository.prediction_detail(prediction_id, user_id)
+        
+        if row is None:
+            return jsonify({'error': 'Prediction not found'}), 404
         
-        print(f"Formatted {len(prediction_history)} history items")
-        return jsonify({'history': prediction_history})
+        food_values = row[2:2 + len(FOOD_COLUMNS)]
+        extra_attributes = row[2 + len(FOOD_COLUMNS)]
+        codes = row[3 + len(FOOD_COLUMNS):-1]
+        return jsonify({
+            'id': row[0],
+            'food_name': row[1],
+            'food_data': food_from_row(food_values, extra_attributes),
+            'results': impact_results(codes),
+            'timestamp': row[-1]
+        })
     
     except Exception as e:
-        print(f"Error retrieving history: {str(e)}")
+        log.exception("Error retrieving prediction")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/chat-history', methods=['GET'])
@@ -392,44 +667,48 @@ def chat_history():
     try:
         # Get user ID if logged in
         user_id = session.get('user_id')
-        print(f"Fetching chat history for user_id: {user_id}")
         
-        # Get chat history
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
-        if user_id:
-            # Get user-specific chat history if logged in
-            cursor.execute(
-                'SELECT user_message, bot_response, timestamp FROM chat_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20',
-                (user_id,)
-            )
-        else:
-            # Get session-based chat history if not logged in
-            cursor.execute(
-                'SELECT user_message, bot_response, timestamp FROM chat_history WHERE session_id = ? ORDER BY timestamp DESC LIMIT 20',
-                (session.get('chat_session_id', ''),)
-            )
-            
-        history = cursor.fetchall()
-        conn.close()
+        # Keyset page: ?limit=N&cursor=<next_cursor from the previous page>
+        cursor_timestamp, cursor_id, fetch_limit = page_params(request.args, default_limit=20)
+        # User-specific chat history if logged in, otherwise session-based
+        rows = repository.chat_page(user_id, session.get('chat_session_id', ''), cursor_timestamp, cursor_id, fetch_limit)
+        history, next_cursor = split_page(rows, fetch_limit, key=lambda row: (row[4], row[0]))
         
-        print(f"Found {len(history)} chat history records")
+        log.debug("Fetched chat history", user_id=user_id, records=len(history))
         
-        # Format the results
+        # Format the results; long responses are previews, /chat-history/<id> has the full text
         chat_history = []
-        for user_msg, bot_msg, timestamp in history:
+        for chat_id, user_msg, bot_preview, bot_length, timestamp in history:
             chat_history.append({
+                'id': chat_id,
                 'user_message': user_msg,
-                'bot_response': bot_msg,
+                'bot_response': bot_preview,
+                'truncated': (bot_length or 0) > len(bot_preview or ''),
                 'timestamp': timestamp
             })
         
-        print(f"Formatted {len(chat_history)} chat history items")
-        return jsonify({'history': chat_history})
+        return jsonify({'history': chat_history, 'next_cursor': next_cursor})
+    
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("Error retrieving chat history")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat-history/<int:chat_id>', methods=['GET'])
+def chat_history_detail(chat_id):
+    try:
+        user_id = session.get('user_id')
+        row = repository.chat_detail(chat_id, user_id, session.get('chat_session_id', ''))
+        
+        if row is None:
+            return jsonify({'error': 'Chat message not found'}), 404
+        
+        chat_id, user_msg, bot_msg, timestamp = row
+        return jsonify({'id': chat_id, 'user_message': user_msg, 'bot_response': bot_msg, 'timestamp': timestamp})
     
     except Exception as e:
-        print(f"Error retrieving chat history: {str(e)}")
+        log.exception("Error retrieving chat message")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/clear-predictions', methods=['POST'])
@@ -438,55 +717,80 @@ def clear_predictions():
         # Get user ID if logged in
         user_id = session.get('user_id')
         
-        # Connect to database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
+        # Deletes are ordered after any queued inserts
+        repository.clear_predictions(user_id)
         if user_id:
-            # Clear user-specific predictions if logged in
-            cursor.execute('DELETE FROM predictions WHERE user_id = ?', (user_id,))
-            print(f"Cleared predictions for user {user_id}")
+            log.info("Cleared predictions", user_id=user_id)
         else:
-            # Clear session-based predictions if not logged in
-            cursor.execute('DELETE FROM predictions WHERE user_id IS NULL')
-            print("Cleared predictions for non-logged in session")
-            
-        conn.commit()
-        conn.close()
+            log.info("Cleared predictions for non-logged in session")
         
         return jsonify({'success': True, 'message': 'Prediction history cleared'})
     
     except Exception as e:
-        print(f"Error clearing predictions: {str(e)}")
+        log.exception("Error clearing predictions")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Per-symptom impact counts by food category, read from the rollup table only
+@app.route('/insights', methods=['GET'])
+def insights():
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'You must be logged in to view insights'}), 401
+        
+        symptom = request.args.get('symptom')
+        if symptom and symptom not in IMPACT_COLUMNS:
+            return jsonify({'error': f"Unknown symptom. Use one of: {', '.join(IMPACT_COLUMNS)}"}), 400
+        
+        rows = repository.insights(user_id, symptom)
+        
+        summary = {}
+        for symptom_name, impact, food_category, count in rows:
+            label = IMPACT_LABELS.get(impact)
+            if label is None:
+                continue
+            entry = summary.setdefault(symptom_name, {
+                'total': 0,
+                'impacts': {name: 0 for name in IMPACT_CODES},
+                'categories': {}
+            })
+            category = entry['categories'].setdefault(food_category, {name: 0 for name in IMPACT_CODES})
+            entry['total'] += count
+            entry['impacts'][label] += count
+            category[label] += count
+        
+        # Categories that most often made the symptom worse come first
+        for entry in summary.values():
+            entry['categories'] = sorted(
+                ({'food_category': name, 'total': sum(counts.values()), **counts}
+                 for name, counts in entry['categories'].items()),
+                key=lambda item: (-item['Harmful'], -item['total'], item['food_category'])
+            )
+        
+        return jsonify({'insights': summary})
+    
+    except Exception as e:
+        log.exception("Error retrieving insights")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/clear-chats', methods=['POST'])
 def clear_chats():
     try:
         # Get user ID if logged in
         user_id = session.get('user_id')
         
-        # Connect to database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
+        # Deletes are ordered after any queued inserts
+        session_id = session.get('chat_session_id', '')
+        repository.clear_chats(user_id, session_id)
         if user_id:
-            # Clear user-specific chat history if logged in
-            cursor.execute('DELETE FROM chat_history WHERE user_id = ?', (user_id,))
-            print(f"Cleared chat history for user {user_id}")
+            log.info("Cleared chat history", user_id=user_id)
         else:
-            # Clear session-based chat history if not logged in
-            session_id = session.get('chat_session_id', '')
-            cursor.execute('DELETE FROM chat_history WHERE session_id = ?', (session_id,))
-            print(f"Cleared chat history for session {session_id}")
-            
-        conn.commit()
-        conn.close()
+            log.info("Cleared chat history", session_id=session_id)
         
         return jsonify({'success': True, 'message': 'Chat history cleared'})
     
     except Exception as e:
-        print(f"Error clearing chat history: {str(e)}")
+        log.exception("Error clearing chat history")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Service worker route - ensures proper MIME type
@@ -560,7 +864,7 @@ def explain_prediction():
                 
                 return jsonify({"explanation": explanation_points})
         except Exception as e:
-            print(f"OpenAI API error: {e}")
+            log.warning("OpenAI API error", error=str(e))
             # Fall back to simulated response
         
         # Simulated AI response if OpenAI is not available
@@ -650,8 +954,8 @@ def explain_prediction():
         
         return jsonify({"explanation": explanation})
         
-    except Exception as e:
-        print(f"Error in explain_prediction: {e}")
+    except Exception:
+        log.exception("Error in explain_prediction")
         return jsonify({"explanation": [
             f"Based on our analysis, {food_name} appears to affect menstrual symptoms through several biological mechanisms.",
             "Nutrient content and glycemic impact may influence hormone regulation and inflammation responses.",
@@ -665,7 +969,7 @@ def moodmotion_recommend():
     try:
         # Get data from request
         data = request.json
-        print(f"Received MoodMotion recommendation request with data: {data}")
+        log.debug("MoodMotion recommendation request", payload=data)
         
         cycle_phase = data.get('cycle_phase')
         stress_level = data.get('stress_level')
@@ -702,7 +1006,7 @@ def moodmotion_recommend():
             recommendation = json.loads(recommendation_json)
         except json.JSONDecodeError:
             # If not valid JSON, create a structured response
-            print("LLM did not return valid JSON, creating structured format")
+            log.warning("LLM did not return valid JSON, creating structured format")
             recommendation = {
                 'activity_name': 'Gentle Stretching Routine',
                 'description': 'A series of gentle stretches to help ease discomfort and improve mood',
@@ -719,33 +1023,26 @@ def moodmotion_recommend():
         
         # Save recommendation to database if user is logged in
         if user_id:
-            conn = sqlite3.connect('food_predictions.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                'INSERT INTO activity_recommendations (cycle_phase, stress_level, emotion, additional_factors, recommendation, steps, extras, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                (cycle_phase, stress_level, emotion, additional_factors, 
-                 json.dumps({
-                     'activity_name': recommendation.get('activity_name', ''),
-                     'description': recommendation.get('description', '')
-                 }), 
-                 json.dumps(recommendation.get('steps', [])),
-                 json.dumps({
-                     'extras': recommendation.get('extras', ''),
-                     'benefits': recommendation.get('benefits', '')
-                 }),
-                 user_id)
+            repository.add_recommendation(
+                cycle_phase, stress_level, emotion, additional_factors,
+                json.dumps({
+                    'activity_name': recommendation.get('activity_name', ''),
+                    'description': recommendation.get('description', '')
+                }),
+                json.dumps(recommendation.get('steps', [])),
+                json.dumps({
+                    'extras': recommendation.get('extras', ''),
+                    'benefits': recommendation.get('benefits', '')
+                }),
+                user_id
             )
-            
-            conn.commit()
-            conn.close()
         
         return jsonify({
             'recommendation': recommendation
         })
     
     except Exception as e:
-        print(f"Error in MoodMotion recommendation: {str(e)}")
+        log.exception("Error in MoodMotion recommendation")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/moodmotion-explain', methods=['POST'])
@@ -791,8 +1088,8 @@ def moodmotion_explain():
         
         return jsonify({"explanation": explanation_points})
         
-    except Exception as e:
-        print(f"Error in MoodMotion explanation: {e}")
+    except Exception:
+        log.exception("Error in MoodMotion explanation")
         return jsonify({"explanation": [
             f"During the {cycle_phase} phase, hormone levels create a unique internal environment.",
             "This activity has been shown to help balance mood and energy specifically during this phase.",
@@ -807,53 +1104,72 @@ def moodmotion_history():
         # Get user ID if logged in
         user_id = session.get('user_id')
         
-        # Connect to database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
-        if user_id:
-            # Get user-specific history if logged in
-            cursor.execute(
-                '''SELECT cycle_phase, stress_level, emotion, recommendation, steps, extras, timestamp 
-                   FROM activity_recommendations 
-                   WHERE user_id = ? 
-                   ORDER BY timestamp DESC LIMIT 10''',
-                (user_id,)
-            )
-        else:
+        if not user_id:
             # Return empty history if not logged in
-            return jsonify({'history': []})
-            
-        recommendations = cursor.fetchall()
-        conn.close()
+            return jsonify({'history': [], 'next_cursor': None})
+        
+        # Keyset page: ?limit=N&cursor=<next_cursor from the previous page>
+        cursor_timestamp, cursor_id, fetch_limit = page_params(request.args, default_limit=10)
+        rows = repository.recommendation_page(user_id, cursor_timestamp, cursor_id, fetch_limit)
+        recommendations, next_cursor = split_page(rows, fetch_limit, key=lambda row: (row[5], row[0]))
         
-        # Format the results
+        # Format the results (card fields only; steps, extras and benefits come from /moodmotion-history/<id>)
         recommendation_history = []
-        for phase, stress, emotion, recommendation, steps, extras, timestamp in recommendations:
+        for rec_id, phase, stress, emotion, recommendation, timestamp in recommendations:
             try:
                 rec_data = json.loads(recommendation) if recommendation else {}
-                steps_data = json.loads(steps) if steps else []
-                extras_data = json.loads(extras) if extras else {}
                 
                 recommendation_history.append({
+                    'id': rec_id,
                     'cycle_phase': phase,
                     'stress_level': stress,
                     'emotion': emotion,
                     'activity_name': rec_data.get('activity_name', ''),
                     'description': rec_data.get('description', ''),
-                    'steps': steps_data,
-                    'extras': extras_data.get('extras', ''),
-                    'benefits': extras_data.get('benefits', ''),
                     'timestamp': timestamp
                 })
             except json.JSONDecodeError:
-                print(f"Error parsing JSON from database")
+                log.warning("Error parsing MoodMotion recommendation JSON from database")
                 continue
         
-        return jsonify({'history': recommendation_history})
+        return jsonify({'history': recommendation_history, 'next_cursor': next_cursor})
+    
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("Error retrieving MoodMotion history")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/moodmotion-history/<int:rec_id>', methods=['GET'])
+def moodmotion_history_detail(rec_id):
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'You must be logged in to view history'}), 401
+        
+        row = repository.recommendation_detail(rec_id, user_id)
+        if row is None:
+            return jsonify({'error': 'Recommendation not found'}), 404
+        
+        rec_id, phase, stress, emotion, additional_factors, recommendation, steps, extras, timestamp = row
+        rec_data = json.loads(recommendation) if recommendation else {}
+        extras_data = json.loads(extras) if extras else {}
+        return jsonify({
+            'id': rec_id,
+            'cycle_phase': phase,
+            'stress_level': stress,
+            'emotion': emotion,
+            'additional_factors': additional_factors,
+            'activity_name': rec_data.get('activity_name', ''),
+            'description': rec_data.get('description', ''),
+            'steps': json.loads(steps) if steps else [],
+            'extras': extras_data.get('extras', ''),
+            'benefits': extras_data.get('benefits', ''),
+            'timestamp': timestamp
+        })
     
     except Exception as e:
-        print(f"Error retrieving MoodMotion history: {str(e)}")
+        log.exception("Error retrieving MoodMotion recommendation")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/clear-moodmotion', methods=['POST'])
@@ -865,20 +1181,14 @@ def clear_moodmotion():
         if not user_id:
             return jsonify({'error': 'You must be logged in to clear history'}), 401
             
-        # Connect to database
-        conn = sqlite3.connect('food_predictions.db')
-        cursor = conn.cursor()
-        
-        # Clear user-specific recommendations
-        cursor.execute('DELETE FROM activity_recommendations WHERE user_id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        # Clear user-specific recommendations (after any queued inserts)
+        repository.clear_recommendations(user_id)
         
         return jsonify({'success': True, 'message': 'MoodMotion history cleared'})
     
     except Exception as e:
-        print(f"Error clearing MoodMotion history: {str(e)}")
+        log.exception("Error clearing MoodMotion history")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threaded=True)
\ No newline at end of file
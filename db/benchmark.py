@@ -0,0 +1,130 @@
+"""
+Requests-per-second benchmark: connect-per-request vs. the connection pool.
+
+Replays the app's request mix against a scratch database from several threads:
+mostly history reads (predictions, chat, MoodMotion) with a share of inserts.
+"connect" is the old behavior (sqlite3.connect per request, rollback journal,
+default synchronous); "pool" goes through ConnectionPool with WAL and the tuned
+PRAGMAs.
+
+    python db/benchmark.py --threads 8 --seconds 10 --write-ratio 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import ConnectionPool
+
+SCHEMA = [
+    '''CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, food_name TEXT, food_data TEXT,
+       prediction_results TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, user_id INTEGER NULL)''',
+    '''CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, user_message TEXT,
+       bot_response TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, user_id INTEGER NULL)''',
+    '''CREATE TABLE activity_recommendations (id INTEGER PRIMARY KEY AUTOINCREMENT, cycle_phase TEXT,
+       stress_level TEXT, emotion TEXT, additional_factors TEXT, recommendation TEXT, steps TEXT, extras TEXT,
+       timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, user_id INTEGER NULL)'''
+]
+
+READS = [
+    ('SELECT food_name, prediction_results, timestamp FROM predictions WHERE user_id = ? '
+     'ORDER BY timestamp DESC LIMIT 10'),
+    ('SELECT user_message, bot_response, timestamp FROM chat_history WHERE user_id = ? '
+     'ORDER BY timestamp DESC LIMIT 20'),
+    ('SELECT cycle_phase, stress_level, emotion, recommendation, steps, extras, timestamp '
+     'FROM activity_recommendations WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10')
+]
+
+WRITE = 'INSERT INTO predictions (food_name, food_data, prediction_results, user_id) VALUES (?, ?, ?, ?)'
+
+RESULTS = json.dumps({"impact_on_cramps": "Beneficial", "impact_on_bloating": "Neutral"})
+
+
+def create_database(path, rows, users):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    rng = random.Random(42)
+    conn.executemany(WRITE, ((f"food{i % 500}", "{}", RESULTS, rng.randint(1, users)) for i in range(rows)))
+    conn.executemany(
+        'INSERT INTO chat_history (session_id, user_message, bot_response, user_id) VALUES (?, ?, ?, ?)',
+        (("s", "hi", "hello", rng.randint(1, users)) for _ in range(rows))
+    )
+    conn.executemany(
+        'INSERT INTO activity_recommendations (cycle_phase, stress_level, emotion, recommendation, user_id) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (("luteal", "5", "calm", "{}", rng.randint(1, users)) for _ in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def handle_request(conn, rng, users, write_ratio):
+    """One simulated request: a history read, or an insert plus commit"""
+    user_id = rng.randint(1, users)
+    if rng.random() < write_ratio:
+        conn.execute(WRITE, ("apple", "{}", RESULTS, user_id))
+        conn.commit()
+    else:
+        conn.execute(rng.choice(READS), (user_id,)).fetchall()
+
+
+def run(mode, path, threads, seconds, users, write_ratio):
+    pool = ConnectionPool(path, max_size=threads) if mode == "pool" else None
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            try:
+                if pool is not None:
+                    with pool.connection() as conn:
+                        handle_request(conn, rng, users, write_ratio)
+                else:
+                    conn = sqlite3.connect(path)
+                    try:
+                        handle_request(conn, rng, users, write_ratio)
+                    finally:
+                        conn.close()
+                counts[index] += 1
+            except sqlite3.OperationalError:
+                errors[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if pool is not None:
+        pool.close_all()
+    return sum(counts) / seconds, sum(errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request connections with the connection pool")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=50000, help="Rows per history table")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ["connect", "pool"]:
+            path = os.path.join(tmp, f"{mode}.db")
+            create_database(path, args.rows, args.users)
+            rps, errors = run(mode, path, args.threads, args.seconds, args.users, args.write_ratio)
+            results[mode] = rps
+            print(f"{mode:<8} {rps:10.1f} req/s  ({errors} lock errors)")
+    print(f"Speedup: {results['pool'] / results['connect']:.2f}x")
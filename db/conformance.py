@@ -0,0 +1,200 @@
+"""
+Shared behaviour checks for the repository backends.
+
+Runs the same scenario (users, predictions with keyset paging, rollup-backed
+insights, chat previews, recommendations, clears) against each backend and
+reports every mismatch. By default it checks a temporary SQLite file, plus
+PostgreSQL when CONFORMANCE_POSTGRES_URL is set; otherwise the PostgreSQL
+backend is reported as skipped. tests/test_conformance.py runs the same checks
+under pytest. Use a throwaway PostgreSQL database: the scenario clears anonymous
+predictions. See docs/DEPLOYMENT.md for starting one locally.
+
+    python db/conformance.py
+    CONFORMANCE_POSTGRES_URL=postgresql://postgres@localhost:5432/predo_test python db/conformance.py
+    python db/conformance.py --url postgresql://postgres@localhost:5432/predo_test
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.pagination import FIRST_PAGE
+from db.predictions import FOOD_COLUMNS, IMPACT_CODES, food_from_row, impact_results
+from db.queries import CHAT_PREVIEW_LENGTH
+from db.repository import DuplicateUser, create_repository
+
+FOOD = {
+    'food_name': 'Greek yogurt', 'food_category': 'Dairy', 'food_subcategory': 'Yogurt',
+    'processing_level': 'Minimally Processed', 'caffeine_content_mg': 0, 'flavor_profile': 'Sour',
+    'common_allergens': 'Dairy', 'glycemic_index': 35, 'inflammatory_index': 3, 'calories_kcal': 59,
+    'quantity': '1 cup', 'is_non_edible': False
+}
+RESULTS = {
+    'impact_on_cramps': 'Harmful', 'impact_on_bloating': 'Harmful', 'impact_on_headache': 'Neutral',
+    'impact_on_mood_swings': 'Beneficial', 'impact_on_fatigue': 'Neutral', 'impact_on_acne': 'Harmful'
+}
+
+
+class Checker:
+    def __init__(self, name):
+        self.name = name
+        self.failures = []
+        self.checks = 0
+
+    def equal(self, label, actual, expected):
+        self.checks += 1
+        if actual != expected:
+            self.failures.append(f"{label}: expected {expected!r}, got {actual!r}")
+
+
+def page_all(fetch_page, limit):
+    """Follow keyset pages to the end; returns every row in order"""
+    rows = []
+    cursor_timestamp, cursor_id = FIRST_PAGE
+    while True:
+        page = fetch_page(cursor_timestamp, cursor_id, limit + 1)
+        rows.extend(page[:limit])
+        if len(page) <= limit:
+            return rows
+        cursor_timestamp, cursor_id = page[limit - 1][-1], page[limit - 1][0]
+
+
+def check_repository(repo):
+    """Run the scenario against a migrated repository; returns a Checker with any failures"""
+    check = Checker(repo.backend)
+    tag = uuid.uuid4().hex[:8]
+
+    # Users
+    username = f'conformance-{tag}'
+    user_id = repo.create_user(username, f'{username}@example.com', 'hash')
+    other_id = repo.create_user(f'{username}-other', f'{username}-other@example.com', 'hash')
+    check.equal('get_user_by_username', tuple(repo.get_user_by_username(username)), (user_id, username, 'hash'))
+    check.equal('unknown user', repo.get_user_by_username(f'missing-{tag}'), None)
+    try:
+        repo.create_user(username, f'{username}-again@example.com', 'hash')
+        check.equal('duplicate username raises DuplicateUser', False, True)
+    except DuplicateUser:
+        check.equal('duplicate username raises DuplicateUser', True, True)
+
+    # Predictions: ids, detail round trip, paging across equal timestamps
+    prediction_ids = [repo.add_prediction(f'food {i}', dict(FOOD, food_name=f'food {i % 2}'), RESULTS, user_id,
+                                          wait=True) for i in range(7)]
+    check.equal('prediction ids increase', prediction_ids, sorted(set(prediction_ids)))
+    detail = repo.prediction_detail(prediction_ids[0], user_id)
+    check.equal('prediction detail id', detail[0], prediction_ids[0])
+    food_values, extra_attributes = detail[2:2 + len(FOOD_COLUMNS)], detail[2 + len(FOOD_COLUMNS)]
+    check.equal('prediction detail food_data', food_from_row(food_values, extra_attributes),
+                dict(FOOD, food_name='food 0', caffeine_content_mg=0.0, glycemic_index=35.0,
+                     inflammatory_index=3.0, calories_kcal=59.0))
+    check.equal('prediction detail results', impact_results(detail[3 + len(FOOD_COLUMNS):-1]), RESULTS)
+    check.equal("another user's prediction is hidden", repo.prediction_detail(prediction_ids[0], other_id), None)
+
+    rows = page_all(lambda ts, row_id, n: repo.prediction_page(user_id, ts, row_id, n), limit=3)
+    check.equal('prediction pages cover every row newest first', [row[0] for row in rows], prediction_ids[::-1])
+    check.equal('prediction page results', impact_results(rows[0][2:-1]), RESULTS)
+
+    anonymous_id = repo.add_prediction('anonymous food', FOOD, RESULTS, None, wait=True)
+    anonymous_page = repo.prediction_page(None, *FIRST_PAGE, 100)
+    check.equal('anonymous page contains anonymous prediction', anonymous_id in [row[0] for row in anonymous_page], True)
+    check.equal('anonymous page excludes user predictions',
+                any(row[0] in prediction_ids for row in anonymous_page), False)
+
+    # Insights come from the rollups
+    insights = {(symptom, impact, category): count for symptom, impact, category, count in repo.insights(user_id)}
+    check.equal('insights cramps harmful dairy', insights.get(('impact_on_cramps', IMPACT_CODES['Harmful'], 'Dairy')), 7)
+    check.equal('insights row count', len(insights), len(RESULTS))
+    check.equal('insights by symptom', len(repo.insights(user_id, 'impact_on_headache')), 1)
+    check.equal('anonymous predictions are not rolled up', repo.insights(other_id), [])
+
+    repo.clear_predictions(user_id)
+    check.equal('clear predictions', repo.prediction_page(user_id, *FIRST_PAGE, 10), [])
+    check.equal('clear predictions empties insights', repo.insights(user_id), [])
+    repo.clear_predictions(None)
+    check.equal('clear anonymous predictions', repo.prediction_page(None, *FIRST_PAGE, 10), [])
+
+    # The LLM can return lists, which have no typed column to bind to
+    listed_food = dict(FOOD, food_name=f'listed {tag}', common_allergens=['Nuts', 'Soy'])
+    listed_id = repo.add_prediction('listed food', listed_food, RESULTS, user_id, wait=True)
+    check.equal('list-valued attribute prediction id', listed_id is not None, True)
+    listed = repo.prediction_detail(listed_id, user_id) if listed_id is not None else None
+    check.equal('list-valued attribute round trip',
+                listed and food_from_row(listed[2:2 + len(FOOD_COLUMNS)], listed[2 + len(FOOD_COLUMNS)])['common_allergens'],
+                ['Nuts', 'Soy'])
+    repo.clear_predictions(user_id)
+
+    # Feedback is write-only from the app
+    repo.add_feedback(prediction_ids[0], FOOD['food_name'], json.dumps(FOOD), json.dumps(RESULTS), user_id)
+
+    # Chat: context order, previews, session ownership
+    session_id = f'session-{tag}'
+    long_response = 'x' * (CHAT_PREVIEW_LENGTH + 50)
+    for i in range(12):
+        repo.add_chat(session_id, f'message {i}', long_response if i == 11 else f'reply {i}', user_id)
+    repo.flush()
+    context = repo.chat_context(user_id, session_id)
+    check.equal('chat context is the 10 oldest messages in order', [row[0] for row in context],
+                [f'message {i}' for i in range(10)])
+    chats = page_all(lambda ts, row_id, n: repo.chat_page(user_id, session_id, ts, row_id, n), limit=5)
+    check.equal('chat pages cover every message newest first', [row[1] for row in chats],
+                [f'message {i}' for i in reversed(range(12))])
+    check.equal('chat preview length', len(chats[0][2]), CHAT_PREVIEW_LENGTH)
+    check.equal('chat full length', chats[0][3], len(long_response))
+    check.equal('chat detail by session', repo.chat_detail(chats[0][0], None, session_id)[2], long_response)
+    check.equal('chat detail other session', repo.chat_detail(chats[0][0], None, f'other-{tag}'), None)
+    repo.clear_chats(user_id, session_id)
+    check.equal('clear chats', repo.chat_page(user_id, session_id, *FIRST_PAGE, 10), [])
+
+    # Activity recommendations
+    recommendation = json.dumps({'activity_name': 'Walk', 'description': 'Easy walk'})
+    for phase in ('menstrual', 'follicular', 'luteal'):
+        repo.add_recommendation(phase, '4', 'calm', 'none', recommendation, json.dumps(['Go']),
+                                json.dumps({'extras': 'Shoes', 'benefits': 'Calm'}), user_id)
+    repo.flush()
+    recommendations = page_all(lambda ts, row_id, n: repo.recommendation_page(user_id, ts, row_id, n), limit=2)
+    check.equal('recommendation pages', [row[1] for row in recommendations], ['luteal', 'follicular', 'menstrual'])
+    rec_detail = repo.recommendation_detail(recommendations[0][0], user_id)
+    check.equal('recommendation detail steps', json.loads(rec_detail[6]), ['Go'])
+    check.equal("another user's recommendation is hidden", repo.recommendation_detail(rec_detail[0], other_id), None)
+    repo.clear_recommendations(user_id)
+    check.equal('clear recommendations', repo.recommendation_page(user_id, *FIRST_PAGE, 10), [])
+
+    return check
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the shared repository checks against each backend')
+    parser.add_argument('--url', action='append', help='Database URL to check (repeatable); '
+                        'default: a temporary SQLite file plus CONFORMANCE_POSTGRES_URL if set')
+    args = parser.parse_args()
+
+    urls = args.url
+    temp_dir = None
+    if not urls:
+        temp_dir = tempfile.TemporaryDirectory()
+        urls = [f"sqlite:///{os.path.join(temp_dir.name, 'conformance.db')}"]
+        if os.environ.get('CONFORMANCE_POSTGRES_URL'):
+            urls.append(os.environ['CONFORMANCE_POSTGRES_URL'])
+        else:
+            print("postgresql: SKIPPED, not checked (set CONFORMANCE_POSTGRES_URL or pass --url)")
+
+    failed = False
+    for url in urls:
+        repo = create_repository(url)
+        try:
+            repo.migrate()
+            check = check_repository(repo)
+        finally:
+            repo.close()
+        for failure in check.failures:
+            print(f"FAIL [{check.name}] {failure}")
+        print(f"{check.name}: {check.checks - len(check.failures)}/{check.checks} checks passed")
+        failed = failed or bool(check.failures)
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,151 @@
+"""
+SQLite connection pool shared by the Flask app.
+
+Connections are opened once and reused for the life of the process instead of
+per request. Each one is configured with:
+  * journal_mode=WAL     - readers no longer block on the writer (and vice versa)
+  * synchronous=NORMAL   - fsync at checkpoints instead of every commit (safe with WAL)
+  * busy_timeout         - wait for the write lock instead of failing with "database is locked"
+  * mmap_size/cache_size - serve hot pages from memory
+  * cached_statements    - compiled statements are reused across requests on the same connection
+
+Borrow a connection with `with get_pool().connection() as conn:`. Request
+handlers do not touch connections; they go through db/repository.py.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'food_predictions.db')
+
+DEFAULT_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 16))
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
+CACHED_STATEMENTS = 256
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, path=DATABASE_PATH, max_size=DEFAULT_POOL_SIZE, timeout=10.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        # LIFO keeps the most recently used (warmest) connections in rotation
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._acquired = 0
+        self._waits = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, open a new one below max_size, or wait for one"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+                    self._waits += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        with self._lock:
+            self._acquired += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection, discarding any transaction the caller left open"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped and replaced on demand
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def after_fork(self):
+        """Forget connections inherited from the parent process; the child opens its own"""
+        # Not closed: the parent may still be using the same file handles and locks
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def close_all(self):
+        """Close every idle connection (used at shutdown)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'max_size': self.max_size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'acquired': self._acquired,
+                'waits': self._waits
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """The process-wide pool for DATABASE_PATH, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
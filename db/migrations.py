@@ -0,0 +1,154 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in SQLite's PRAGMA user_version. migrate() applies every
+migration above the stored version in order, each in its own IMMEDIATE
+transaction together with the version bump, so concurrent workers starting at the
+same time apply each step exactly once. Add new steps to the end of MIGRATIONS;
+never edit one that has shipped.
+
+    python db/migrations.py              # migrate DATABASE_PATH
+    python db/migrations.py --status     # show current and latest versions
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import DATABASE_PATH
+from db.predictions import normalize_predictions
+from db.rollups import create_rollups
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+# Version 1 is the schema init_db used to create; IF NOT EXISTS lets existing databases adopt it
+INITIAL_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        food_name TEXT,
+        food_data TEXT,
+        prediction_results TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        user_message TEXT,
+        bot_response TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_recommendations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cycle_phase TEXT,
+        stress_level TEXT,
+        emotion TEXT,
+        additional_factors TEXT,
+        recommendation TEXT,
+        steps TEXT,
+        extras TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS prediction_feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        prediction_id INTEGER NULL,
+        food_name TEXT,
+        food_data TEXT,
+        confirmed_results TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NULL
+    )
+    '''
+]
+
+# History reads filter on the owner and sort by time: (owner, timestamp) serves both,
+# so the LIMIT stops after a few index entries instead of scanning and sorting the table
+HISTORY_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions (user_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_chat_history_user_time ON chat_history (user_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_chat_history_session_time ON chat_history (session_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_activity_user_time ON activity_recommendations (user_id, timestamp)'
+]
+
+# (version, description, list of SQL statements or a callable taking the connection)
+MIGRATIONS = [
+    (1, 'initial schema', INITIAL_SCHEMA),
+    (2, 'history indexes on (owner, timestamp)', HISTORY_INDEXES + ['ANALYZE']),
+    (3, 'normalized predictions: foods table and typed impact columns', normalize_predictions),
+    (4, 'per-user symptom rollups maintained by triggers', create_rollups)
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to target; returns the list of versions applied"""
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version > target:
+            break
+        if current_version(conn) >= version:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have applied it while we waited for the write lock
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(steps):
+                steps(conn)
+            else:
+                for statement in steps:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        log.info("Applied migration", version=version, description=description)
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply database migrations')
+    parser.add_argument('--db', default=DATABASE_PATH)
+    parser.add_argument('--status', action='store_true', help='Only print the schema version')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.status:
+            print(f"Schema version {current_version(conn)} (latest {LATEST_VERSION})")
+        else:
+            applied = migrate(conn)
+            print(f"Schema at version {current_version(conn)}" + ("" if applied else " (up to date)"))
+    finally:
+        conn.close()
@@ -0,0 +1,65 @@
+"""
+Keyset pagination helpers.
+
+History lists are ordered by (timestamp, id) descending. A page ends with an
+opaque cursor encoding the last row's (timestamp, id); the next page asks for
+rows strictly before it, which an (owner, timestamp) index answers directly,
+so every page costs the same no matter how deep it is (unlike OFFSET).
+"""
+import base64
+import json
+
+# Sorts after every stored row, so the first page uses the same query as the rest
+FIRST_PAGE = ('9999-12-31 23:59:59', 2 ** 63 - 1)
+
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor"""
+
+
+def encode_cursor(timestamp, row_id):
+    payload = json.dumps([timestamp, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor, or FIRST_PAGE when there is none"""
+    if not cursor:
+        return FIRST_PAGE
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(timestamp, str) or not isinstance(row_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return timestamp, row_id
+
+
+def parse_limit(value, default):
+    """Page size from a query parameter, clamped to 1..MAX_LIMIT"""
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(MAX_LIMIT, limit))
+
+
+def page_params(args, default_limit):
+    """(cursor timestamp, cursor id, limit + 1) for a keyset query from request args"""
+    limit = parse_limit(args.get('limit'), default_limit)
+    timestamp, row_id = decode_cursor(args.get('cursor'))
+    # One extra row tells us whether another page exists
+    return timestamp, row_id, limit + 1
+
+
+def split_page(rows, limit_plus_one, key):
+    """Trim the look-ahead row and build next_cursor from the last row kept"""
+    limit = limit_plus_one - 1
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    timestamp, row_id = key(rows[-1])
+    return rows, encode_cursor(timestamp, row_id)
@@ -0,0 +1,186 @@
+"""
+Normalized prediction storage.
+
+Each distinct food attribute set is stored once in `foods` (typed columns for the
+attributes the model uses, plus a JSON column for anything else the LLM returned),
+keyed by a hash of the canonical attribute JSON. `predictions` references the food
+and stores the six impact targets as small integers (IMPACT_CODES), so history
+reads need no JSON parsing and cross-row questions are plain SQL, e.g.
+
+    SELECT COUNT(*) FROM predictions WHERE impact_on_cramps = -1   -- Harmful
+
+Migration 3 (normalize_predictions) converts the old JSON-blob table in place.
+"""
+import hashlib
+import json
+
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+IMPACT_COLUMNS = [
+    'impact_on_cramps', 'impact_on_bloating', 'impact_on_headache',
+    'impact_on_mood_swings', 'impact_on_fatigue', 'impact_on_acne'
+]
+
+# Signed so AVG() over a column reads as net benefit (+) or harm (-)
+IMPACT_CODES = {'Beneficial': 1, 'Neutral': 0, 'Harmful': -1}
+IMPACT_LABELS = {code: label for label, code in IMPACT_CODES.items()}
+
+# Attributes with their own column in `foods`; anything else goes to extra_attributes
+FOOD_COLUMNS = [
+    'food_name', 'food_category', 'food_subcategory', 'processing_level',
+    'caffeine_content_mg', 'flavor_profile', 'common_allergens',
+    'glycemic_index', 'inflammatory_index', 'calories_kcal', 'quantity'
+]
+NUMERIC_FOOD_COLUMNS = ['caffeine_content_mg', 'glycemic_index', 'inflammatory_index', 'calories_kcal']
+
+FOODS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS foods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        attributes_hash TEXT UNIQUE NOT NULL,
+        food_name TEXT,
+        food_category TEXT,
+        food_subcategory TEXT,
+        processing_level TEXT,
+        caffeine_content_mg REAL,
+        flavor_profile TEXT,
+        common_allergens TEXT,
+        glycemic_index REAL,
+        inflammatory_index REAL,
+        calories_kcal REAL,
+        quantity TEXT,
+        extra_attributes TEXT
+    )
+'''
+
+PREDICTIONS_TABLE = '''
+    CREATE TABLE predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        food_id INTEGER REFERENCES foods (id),
+        food_name TEXT,
+        impact_on_cramps INTEGER,
+        impact_on_bloating INTEGER,
+        impact_on_headache INTEGER,
+        impact_on_mood_swings INTEGER,
+        impact_on_fatigue INTEGER,
+        impact_on_acne INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NULL
+    )
+'''
+
+INSERT_FOOD = (
+    f'INSERT OR IGNORE INTO foods (attributes_hash, {", ".join(FOOD_COLUMNS)}, extra_attributes) '
+    f'VALUES ({", ".join("?" * (len(FOOD_COLUMNS) + 2))})'
+)
+
+# Looks the food up by hash, so it can be queued right behind INSERT_FOOD
+INSERT_PREDICTION = (
+    f'INSERT INTO predictions (food_id, food_name, {", ".join(IMPACT_COLUMNS)}, user_id) '
+    f'SELECT id, ?, {", ".join("?" * len(IMPACT_COLUMNS))}, ? FROM foods WHERE attributes_hash = ?'
+)
+
+
+def attributes_hash(food_data):
+    canonical = json.dumps(food_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def food_params(food_data):
+    """Parameters for INSERT_FOOD"""
+    extra = {key: value for key, value in food_data.items() if key not in FOOD_COLUMNS}
+    values = []
+    for col in FOOD_COLUMNS:
+        value = food_data.get(col)
+        if col in NUMERIC_FOOD_COLUMNS and value is not None:
+            number = _as_number(value)
+            if number is None:
+                # e.g. "Unknown" from the LLM: keep the text, leave the typed column empty
+                extra[col] = value
+            value = number
+        elif isinstance(value, (list, dict)):
+            # e.g. common_allergens as a list: the drivers cannot bind it to a TEXT column
+            extra[col] = value
+            value = None
+        values.append(value)
+    return (attributes_hash(food_data),) + tuple(values) + (json.dumps(extra) if extra else None,)
+
+
+def impact_codes(results):
+    """Impact labels -> tuple of small ints in IMPACT_COLUMNS order (None when missing or unknown)"""
+    results = results or {}
+    return tuple(IMPACT_CODES.get(results.get(col)) for col in IMPACT_COLUMNS)
+
+
+def impact_results(codes):
+    """Inverse of impact_codes; skips targets with no stored value"""
+    return {col: IMPACT_LABELS[code] for col, code in zip(IMPACT_COLUMNS, codes) if code is not None}
+
+
+def food_from_row(values, extra_attributes):
+    """Rebuild the food attribute dict from FOOD_COLUMNS values and extra_attributes"""
+    food_data = {col: value for col, value in zip(FOOD_COLUMNS, values) if value is not None}
+    if extra_attributes:
+        food_data.update(json.loads(extra_attributes))
+    return food_data
+
+
+def prediction_writes(food_name, food_data, prediction_results, user_id):
+    """[(sql, params), ...] that store one prediction, in order"""
+    return [
+        (INSERT_FOOD, food_params(food_data)),
+        (INSERT_PREDICTION, (food_name,) + impact_codes(prediction_results) + (user_id, attributes_hash(food_data)))
+    ]
+
+
+def normalize_predictions(conn):
+    """Migration 3: move JSON-blob predictions to foods + typed impact columns, keeping ids and timestamps"""
+    conn.execute(FOODS_TABLE)
+    conn.execute('ALTER TABLE predictions RENAME TO predictions_json')
+    conn.execute(PREDICTIONS_TABLE)
+
+    rows = conn.execute(
+        'SELECT id, food_name, food_data, prediction_results, timestamp, user_id FROM predictions_json ORDER BY id'
+    )
+    converted = 0
+    for row_id, food_name, food_data, prediction_results, timestamp, user_id in rows.fetchall():
+        try:
+            food_data = json.loads(food_data) if food_data else None
+            prediction_results = json.loads(prediction_results) if prediction_results else {}
+        except json.JSONDecodeError:
+            log.warning("Unreadable prediction JSON, keeping it without attributes", prediction_id=row_id)
+            food_data, prediction_results = None, {}
+
+        food_id = None
+        if isinstance(food_data, dict):
+            conn.execute(INSERT_FOOD, food_params(food_data))
+            food_id = conn.execute(
+                'SELECT id FROM foods WHERE attributes_hash = ?', (attributes_hash(food_data),)
+            ).fetchone()[0]
+        conn.execute(
+            f'INSERT INTO predictions (id, food_id, food_name, {", ".join(IMPACT_COLUMNS)}, timestamp, user_id) '
+            f'VALUES (?, ?, ?, {", ".join("?" * len(IMPACT_COLUMNS))}, ?, ?)',
+            (row_id, food_id, food_name) + impact_codes(prediction_results) + (timestamp, user_id)
+        )
+        converted += 1
+
+    conn.execute('DROP TABLE predictions_json')
+    # The index went with the old table. The page reads only small columns now, so the index carries
+    # them and the page never touches the table; id follows timestamp so the keyset order stays in it
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions '
+        f'(user_id, timestamp, id, food_name, {", ".join(IMPACT_COLUMNS)})'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_food ON predictions (food_id)')
+    conn.execute('ANALYZE')
+    log.info("Normalized predictions", converted=converted)
@@ -0,0 +1,122 @@
+"""
+SQL for the request paths.
+
+The repositories in db/repository.py execute these constants (the PostgreSQL
+backend translates the placeholders), and tests/test_query_plans.py checks the
+hot ones with EXPLAIN QUERY PLAN (db/query_plans.py), so an index can't silently
+stop matching a query after either one changes.
+"""
+from db.predictions import FOOD_COLUMNS, IMPACT_COLUMNS
+
+_IMPACTS = ', '.join(IMPACT_COLUMNS)
+_FOOD = ', '.join(f'f.{col}' for col in FOOD_COLUMNS)
+
+USER_BY_USERNAME = 'SELECT id, username, password FROM users WHERE username = ?'
+INSERT_USER = 'INSERT INTO users (username, email, password) VALUES (?, ?, ?)'
+UPDATE_USER_PASSWORD = 'UPDATE users SET password = ? WHERE id = ?'
+
+INSERT_FEEDBACK = (
+    'INSERT INTO prediction_feedback (prediction_id, food_name, food_data, confirmed_results, user_id) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+INSERT_CHAT = 'INSERT INTO chat_history (session_id, user_message, bot_response, user_id) VALUES (?, ?, ?, ?)'
+INSERT_RECOMMENDATION = (
+    'INSERT INTO activity_recommendations '
+    '(cycle_phase, stress_level, emotion, additional_factors, recommendation, steps, extras, user_id) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+# History pages: keyset on (timestamp, id), see db/pagination.py.
+# Parameters: owner, cursor timestamp, cursor id, limit
+PREDICTION_PAGE_BY_USER = (
+    f'SELECT id, food_name, {_IMPACTS}, timestamp FROM predictions '
+    'WHERE user_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?'
+)
+PREDICTION_PAGE_ANONYMOUS = (
+    f'SELECT id, food_name, {_IMPACTS}, timestamp FROM predictions '
+    'WHERE user_id IS NULL AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?'
+)
+# Columns: id, food_name, FOOD_COLUMNS..., extra_attributes, IMPACT_COLUMNS..., timestamp
+PREDICTION_DETAIL_BY_USER = (
+    f'SELECT p.id, p.food_name, {_FOOD}, f.extra_attributes, {_IMPACTS}, p.timestamp '
+    'FROM predictions p LEFT JOIN foods f ON f.id = p.food_id WHERE p.id = ? AND p.user_id = ?'
+)
+PREDICTION_DETAIL_ANONYMOUS = (
+    f'SELECT p.id, p.food_name, {_FOOD}, f.extra_attributes, {_IMPACTS}, p.timestamp '
+    'FROM predictions p LEFT JOIN foods f ON f.id = p.food_id WHERE p.id = ? AND p.user_id IS NULL'
+)
+
+CHAT_CONTEXT_BY_USER = (
+    'SELECT user_message, bot_response FROM chat_history '
+    'WHERE user_id = ? ORDER BY timestamp ASC, id ASC LIMIT 10'
+)
+CHAT_CONTEXT_BY_SESSION = (
+    'SELECT user_message, bot_response FROM chat_history '
+    'WHERE session_id = ? ORDER BY timestamp ASC, id ASC LIMIT 10'
+)
+
+# Chat pages return a preview of the bot response; the full text comes from the detail query
+CHAT_PREVIEW_LENGTH = 200
+CHAT_PAGE_BY_USER = (
+    f'SELECT id, user_message, substr(bot_response, 1, {CHAT_PREVIEW_LENGTH}), length(bot_response), timestamp '
+    'FROM chat_history WHERE user_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?'
+)
+CHAT_PAGE_BY_SESSION = (
+    f'SELECT id, user_message, substr(bot_response, 1, {CHAT_PREVIEW_LENGTH}), length(bot_response), timestamp '
+    'FROM chat_history WHERE session_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?'
+)
+CHAT_DETAIL_BY_USER = (
+    'SELECT id, user_message, bot_response, timestamp FROM chat_history WHERE id = ? AND user_id = ?'
+)
+CHAT_DETAIL_BY_SESSION = (
+    'SELECT id, user_message, bot_response, timestamp FROM chat_history WHERE id = ? AND session_id = ?'
+)
+
+MOODMOTION_PAGE_BY_USER = (
+    'SELECT id, cycle_phase, stress_level, emotion, recommendation, timestamp '
+    'FROM activity_recommendations WHERE user_id = ? AND (timestamp, id) < (?, ?) '
+    'ORDER BY timestamp DESC, id DESC LIMIT ?'
+)
+MOODMOTION_DETAIL_BY_USER = (
+    'SELECT id, cycle_phase, stress_level, emotion, additional_factors, recommendation, steps, extras, timestamp '
+    'FROM activity_recommendations WHERE id = ? AND user_id = ?'
+)
+
+# Rollups maintained by triggers, see db/rollups.py
+INSIGHTS_BY_USER = 'SELECT symptom, impact, food_category, count FROM symptom_rollups WHERE user_id = ?'
+INSIGHTS_BY_USER_SYMPTOM = (
+    'SELECT symptom, impact, food_category, count FROM symptom_rollups WHERE user_id = ? AND symptom = ?'
+)
+
+DELETE_PREDICTIONS_BY_USER = 'DELETE FROM predictions WHERE user_id = ?'
+DELETE_PREDICTIONS_ANONYMOUS = 'DELETE FROM predictions WHERE user_id IS NULL'
+DELETE_CHATS_BY_USER = 'DELETE FROM chat_history WHERE user_id = ?'
+DELETE_CHATS_BY_SESSION = 'DELETE FROM chat_history WHERE session_id = ?'
+DELETE_MOODMOTION_BY_USER = 'DELETE FROM activity_recommendations WHERE user_id = ?'
+
+# Sample parameters for query plan checks: first-page cursor and limit + 1
+PAGE = ('9999-12-31 23:59:59', 2 ** 63 - 1, 11)
+
+# name -> (sql, sample parameters) for query plan checks
+HOT_QUERIES = {
+    'user_by_username': (USER_BY_USERNAME, ('name',)),
+    'prediction_page_by_user': (PREDICTION_PAGE_BY_USER, (1,) + PAGE),
+    'prediction_page_anonymous': (PREDICTION_PAGE_ANONYMOUS, PAGE),
+    'prediction_detail_by_user': (PREDICTION_DETAIL_BY_USER, (1, 1)),
+    'prediction_detail_anonymous': (PREDICTION_DETAIL_ANONYMOUS, (1,)),
+    'chat_context_by_user': (CHAT_CONTEXT_BY_USER, (1,)),
+    'chat_context_by_session': (CHAT_CONTEXT_BY_SESSION, ('session',)),
+    'chat_page_by_user': (CHAT_PAGE_BY_USER, (1,) + PAGE),
+    'chat_page_by_session': (CHAT_PAGE_BY_SESSION, ('session',) + PAGE),
+    'chat_detail_by_user': (CHAT_DETAIL_BY_USER, (1, 1)),
+    'chat_detail_by_session': (CHAT_DETAIL_BY_SESSION, (1, 'session')),
+    'moodmotion_page_by_user': (MOODMOTION_PAGE_BY_USER, (1,) + PAGE),
+    'moodmotion_detail_by_user': (MOODMOTION_DETAIL_BY_USER, (1, 1)),
+    'insights_by_user': (INSIGHTS_BY_USER, (1,)),
+    'insights_by_user_symptom': (INSIGHTS_BY_USER_SYMPTOM, (1, 'impact_on_cramps')),
+    'delete_predictions_by_user': (DELETE_PREDICTIONS_BY_USER, (1,)),
+    'delete_predictions_anonymous': (DELETE_PREDICTIONS_ANONYMOUS, ()),
+    'delete_chats_by_user': (DELETE_CHATS_BY_USER, (1,)),
+    'delete_chats_by_session': (DELETE_CHATS_BY_SESSION, ('session',)),
+    'delete_moodmotion_by_user': (DELETE_MOODMOTION_BY_USER, (1,))
+}
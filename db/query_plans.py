@@ -0,0 +1,63 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot queries.
+
+Every statement in db.queries.HOT_QUERIES must be answered from an index: a plan
+step that scans a table (SCAN) or sorts through a temporary B-tree fails the
+check. tests/test_query_plans.py runs it under pytest; from the command line it
+checks a freshly migrated in-memory database (the default) or an existing file:
+
+    python db/query_plans.py
+    python db/query_plans.py --db food_predictions.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.migrations import migrate
+from db.queries import HOT_QUERIES
+
+
+def query_plan(conn, sql, params):
+    """The detail column of each EXPLAIN QUERY PLAN row"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def plan_problems(plan):
+    """Plan steps that read a whole table or sort outside an index"""
+    return [step for step in plan if step.startswith('SCAN') or 'TEMP B-TREE' in step]
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Return {query name: offending plan steps} for queries that scan or sort; empty when all pass"""
+    failures = {}
+    for name, (sql, params) in queries.items():
+        problems = plan_problems(query_plan(conn, sql, params))
+        if problems:
+            failures[name] = problems
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that hot queries use indexes')
+    parser.add_argument('--db', default=':memory:', help='Database to check (default: fresh in-memory schema)')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.db == ':memory:':
+        migrate(conn)
+
+    if args.verbose:
+        for name, (sql, params) in HOT_QUERIES.items():
+            print(f"{name}: {' | '.join(query_plan(conn, sql, params))}")
+
+    failures = check_query_plans(conn)
+    conn.close()
+    for name, problems in failures.items():
+        print(f"FAIL {name}: {' | '.join(problems)}")
+    print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use an index")
+    sys.exit(1 if failures else 0)
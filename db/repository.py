@@ -0,0 +1,227 @@
+"""
+Storage backends behind one repository interface.
+
+app.py talks to a Repository instead of issuing SQL itself: users, predictions,
+feedback, chat history, activity recommendations and insights. The statements
+live in db/queries.py and are shared by both backends:
+
+  * SQLiteRepository   - the default; pooled WAL connections (db/connection.py),
+                         inserts group-committed by the write-behind queue
+  * PostgresRepository - db/postgres.py; a psycopg2 connection pool, for running
+                         several app nodes against one database
+
+create_repository() picks the backend from DATABASE_URL: a postgres:// or
+postgresql:// URL selects PostgreSQL, anything else (or nothing) uses the SQLite
+file at DATABASE_PATH. Timestamps are returned as 'YYYY-MM-DD HH:MM:SS' strings
+from either backend, so keyset cursors (db/pagination.py) work unchanged.
+
+    python db/conformance.py                      # run the shared checks against both
+"""
+import os
+import sqlite3
+
+from db import queries
+from db.connection import ConnectionPool, get_pool
+from db.migrations import migrate
+from db.predictions import prediction_writes
+from db.write_behind import WriteBehindQueue
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+# How long /predict waits for the prediction id before answering without it
+PREDICTION_ID_TIMEOUT = 1.0
+
+
+class DuplicateUser(Exception):
+    """The username or email is already registered"""
+
+
+class Repository:
+    """
+    Persistence operations used by the app.
+
+    Backends provide _fetchall, _fetchone, _write and the lifecycle methods;
+    rows are plain tuples in the column order of the db/queries.py statements.
+    """
+    backend = None
+    integrity_errors = ()
+
+    # --- backend primitives ---
+
+    def _fetchall(self, sql, params=()):
+        raise NotImplementedError
+
+    def _fetchone(self, sql, params=()):
+        raise NotImplementedError
+
+    def _write(self, statements, wait=False, expected_errors=()):
+        """
+        Execute [(sql, params), ...] in order. wait=False may return before the
+        rows are committed; wait=True blocks until they are, a number waits at most
+        that many seconds. Returns the id of the last inserted row, when known.
+        expected_errors are handled by the caller and not logged as failures.
+        """
+        raise NotImplementedError
+
+    def migrate(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Block until earlier writes are visible to reads"""
+
+    def after_fork(self):
+        """Drop connections inherited from a parent process (pre-forking servers call this in each worker)"""
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+    # --- users ---
+
+    def create_user(self, username, email, password_hash):
+        try:
+            return self._write([(queries.INSERT_USER, (username, email, password_hash))], wait=True,
+                               expected_errors=self.integrity_errors)
+        except self.integrity_errors:
+            raise DuplicateUser(username)
+
+    def get_user_by_username(self, username):
+        """(id, username, password hash) or None"""
+        return self._fetchone(queries.USER_BY_USERNAME, (username,))
+
+    def update_password_hash(self, user_id, password_hash):
+        self._write([(queries.UPDATE_USER_PASSWORD, (password_hash, user_id))])
+
+    # --- predictions ---
+
+    def add_prediction(self, food_name, food_data, prediction_results, user_id, wait=PREDICTION_ID_TIMEOUT):
+        """The new prediction's id; None if no row was written or it was not committed within `wait`"""
+        return self._write(prediction_writes(food_name, food_data, prediction_results, user_id), wait=wait)
+
+    def prediction_page(self, user_id, cursor_timestamp, cursor_id, fetch_limit):
+        if user_id:
+            return self._fetchall(queries.PREDICTION_PAGE_BY_USER, (user_id, cursor_timestamp, cursor_id, fetch_limit))
+        return self._fetchall(queries.PREDICTION_PAGE_ANONYMOUS, (cursor_timestamp, cursor_id, fetch_limit))
+
+    def prediction_detail(self, prediction_id, user_id):
+        if user_id:
+            return self._fetchone(queries.PREDICTION_DETAIL_BY_USER, (prediction_id, user_id))
+        return self._fetchone(queries.PREDICTION_DETAIL_ANONYMOUS, (prediction_id,))
+
+    def clear_predictions(self, user_id):
+        if user_id:
+            self._write([(queries.DELETE_PREDICTIONS_BY_USER, (user_id,))], wait=True)
+        else:
+            self._write([(queries.DELETE_PREDICTIONS_ANONYMOUS, ())], wait=True)
+
+    def add_feedback(self, prediction_id, food_name, food_data, confirmed_results, user_id):
+        self._write([(queries.INSERT_FEEDBACK, (prediction_id, food_name, food_data, confirmed_results, user_id))])
+
+    def insights(self, user_id, symptom=None):
+        """(symptom, impact, food_category, count) rollup rows"""
+        if symptom:
+            return self._fetchall(queries.INSIGHTS_BY_USER_SYMPTOM, (user_id, symptom))
+        return self._fetchall(queries.INSIGHTS_BY_USER, (user_id,))
+
+    # --- chat ---
+
+    def chat_context(self, user_id, session_id):
+        if user_id:
+            return self._fetchall(queries.CHAT_CONTEXT_BY_USER, (user_id,))
+        return self._fetchall(queries.CHAT_CONTEXT_BY_SESSION, (session_id,))
+
+    def add_chat(self, session_id, user_message, bot_response, user_id):
+        self._write([(queries.INSERT_CHAT, (session_id, user_message, bot_response, user_id))])
+
+    def chat_page(self, user_id, session_id, cursor_timestamp, cursor_id, fetch_limit):
+        if user_id:
+            return self._fetchall(queries.CHAT_PAGE_BY_USER, (user_id, cursor_timestamp, cursor_id, fetch_limit))
+        return self._fetchall(queries.CHAT_PAGE_BY_SESSION, (session_id, cursor_timestamp, cursor_id, fetch_limit))
+
+    def chat_detail(self, chat_id, user_id, session_id):
+        if user_id:
+            return self._fetchone(queries.CHAT_DETAIL_BY_USER, (chat_id, user_id))
+        return self._fetchone(queries.CHAT_DETAIL_BY_SESSION, (chat_id, session_id))
+
+    def clear_chats(self, user_id, session_id):
+        if user_id:
+            self._write([(queries.DELETE_CHATS_BY_USER, (user_id,))], wait=True)
+        else:
+            self._write([(queries.DELETE_CHATS_BY_SESSION, (session_id,))], wait=True)
+
+    # --- activity recommendations ---
+
+    def add_recommendation(self, cycle_phase, stress_level, emotion, additional_factors,
+                           recommendation, steps, extras, user_id):
+        self._write([(queries.INSERT_RECOMMENDATION, (
+            cycle_phase, stress_level, emotion, additional_factors, recommendation, steps, extras, user_id
+        ))])
+
+    def recommendation_page(self, user_id, cursor_timestamp, cursor_id, fetch_limit):
+        return self._fetchall(queries.MOODMOTION_PAGE_BY_USER, (user_id, cursor_timestamp, cursor_id, fetch_limit))
+
+    def recommendation_detail(self, rec_id, user_id):
+        return self._fetchone(queries.MOODMOTION_DETAIL_BY_USER, (rec_id, user_id))
+
+    def clear_recommendations(self, user_id):
+        self._write([(queries.DELETE_MOODMOTION_BY_USER, (user_id,))], wait=True)
+
+
+class SQLiteRepository(Repository):
+    backend = 'sqlite'
+    integrity_errors = (sqlite3.IntegrityError,)
+
+    def __init__(self, path=None):
+        # The default database shares the process-wide pool with the maintenance jobs
+        self.pool = get_pool() if path is None else ConnectionPool(path)
+        self.path = self.pool.path
+        self.write_queue = WriteBehindQueue(self.pool)
+
+    def _fetchall(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def _write(self, statements, wait=False, expected_errors=()):
+        # Queued to the single writer thread, which commits them in order
+        pending = [self.write_queue.submit(sql, params, expected_errors) for sql, params in statements]
+        if wait is False:
+            return None
+        return pending[-1].wait(None if wait is True else wait)
+
+    def migrate(self):
+        with self.pool.connection() as conn:
+            migrate(conn)
+
+    def flush(self):
+        self.write_queue.flush()
+
+    def after_fork(self):
+        self.pool.after_fork()
+        # The writer thread (if any) stayed behind in the parent
+        self.write_queue = WriteBehindQueue(self.pool)
+
+    def stats(self):
+        return {'database': dict(self.pool.stats(), backend=self.backend), 'write_queue': self.write_queue.stats()}
+
+    def close(self):
+        self.write_queue.stop()
+        self.pool.close_all()
+
+
+def create_repository(url=None):
+    """Repository for DATABASE_URL (PostgreSQL when it is a postgres URL, otherwise SQLite)"""
+    url = DATABASE_URL if url is None else url
+    if url.startswith(('postgres://', 'postgresql://')):
+        from db.postgres import PostgresRepository
+        return PostgresRepository(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteRepository(url[len('sqlite:///'):])
+    if url:
+        raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]}")
+    return SQLiteRepository()
@@ -0,0 +1,267 @@
+"""
+Retention for history tables: archive, delete, compact, vacuum.
+
+Each history table has a TTL in days per user class: "anonymous" rows have
+user_id NULL, "user" rows belong to an account. None keeps rows forever. The
+defaults only age out anonymous history; override them with RETENTION_POLICY,
+a JSON object merged over DEFAULT_POLICY, e.g.
+
+    RETENTION_POLICY='{"chat_history": {"user": 365}, "predictions": {"anonymous": 1}}'
+
+Expired rows are removed oldest first in batches of RETENTION_BATCH_SIZE, each
+its own short transaction with a pause in between, so request writes are never
+held behind the write lock for long. Each batch is appended to
+<RETENTION_ARCHIVE_DIR>/<table>-<date>.jsonl.gz before it is deleted. Food
+attribute sets no longer referenced by any prediction are archived and removed
+the same way. Finally free pages are returned to the filesystem with
+PRAGMA incremental_vacuum (the database is switched to auto_vacuum=INCREMENTAL
+by the first --full-vacuum run) and the WAL is truncated.
+
+app.py runs this every RETENTION_INTERVAL_MINUTES (off by default) and reports
+the last run at /stats. From cron or by hand:
+
+    python db/retention.py --dry-run
+    python db/retention.py --full-vacuum
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import DATABASE_PATH, ConnectionPool
+
+BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))
+BATCH_PAUSE_MS = float(os.environ.get('RETENTION_BATCH_PAUSE_MS', 50))
+ARCHIVE_DIR = os.environ.get('RETENTION_ARCHIVE_DIR', 'archive')
+VACUUM_PAGES = int(os.environ.get('RETENTION_VACUUM_PAGES', 2000))
+
+USER_CLASSES = {
+    'anonymous': 'user_id IS NULL',
+    'user': 'user_id IS NOT NULL'
+}
+
+# table -> {user class: TTL in days, or None to keep forever}
+DEFAULT_POLICY = {
+    'predictions': {'anonymous': 7, 'user': None},
+    'chat_history': {'anonymous': 7, 'user': None},
+    'activity_recommendations': {'anonymous': 7, 'user': None},
+    # Confirmed labels are training data for models/online_update.py
+    'prediction_feedback': {'anonymous': None, 'user': None}
+}
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+_stats_lock = threading.Lock()
+_totals = {'runs': 0, 'rows_deleted': 0, 'foods_deleted': 0, 'bytes_reclaimed': 0}
+_last_run = None
+
+
+def load_policy(overrides=None):
+    """DEFAULT_POLICY with overrides (a dict or JSON string, default RETENTION_POLICY) merged per table"""
+    if overrides is None:
+        overrides = os.environ.get('RETENTION_POLICY')
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides) if overrides.strip() else {}
+
+    policy = {table: dict(ttls) for table, ttls in DEFAULT_POLICY.items()}
+    for table, ttls in (overrides or {}).items():
+        if table not in policy:
+            raise ValueError(f"Unknown retention table '{table}'")
+        for user_class, days in ttls.items():
+            if user_class not in USER_CLASSES:
+                raise ValueError(f"Unknown user class '{user_class}' for {table}")
+            if days is not None and days < 0:
+                raise ValueError(f"TTL for {table}.{user_class} must be >= 0 days")
+            policy[table][user_class] = days
+    return policy
+
+
+def archive_rows(archive_dir, table, columns, rows):
+    """Append rows as JSON lines to today's gzip archive for the table (gzip members concatenate)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{table}-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl.gz")
+    with gzip.open(path, 'at', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(dict(zip(columns, row)), default=str) + '\n')
+    return path
+
+
+def _delete_batches(conn, table, select_sql, params, batch_size, pause, archive_dir, dry_run):
+    """Archive and delete the rows select_sql returns, batch_size at a time; returns (rows, batches)"""
+    if dry_run:
+        # Nothing is deleted, so count everything in one go
+        return conn.execute(f'SELECT COUNT(*) FROM ({select_sql})', params).fetchone()[0], 0
+
+    deleted = 0
+    batches = 0
+    while True:
+        # Select, archive and delete under one write lock, so no request can start referencing
+        # a selected row (e.g. a food reused by INSERT OR IGNORE) before it is gone
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(f'{select_sql} LIMIT ?', params + (batch_size,))
+            rows = cursor.fetchall()
+            if rows:
+                columns = [description[0] for description in cursor.description]
+                if archive_dir:
+                    archive_rows(archive_dir, table, columns, rows)
+                ids = [row[columns.index('id')] for row in rows]
+                conn.execute(f'DELETE FROM {table} WHERE id IN ({", ".join("?" * len(ids))})', ids)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if not rows:
+            break
+        deleted += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+        # Let queued request writes take the lock between batches
+        time.sleep(pause)
+    return deleted, batches
+
+
+def purge_expired(conn, table, user_class, ttl_days, batch_size=BATCH_SIZE, pause_ms=BATCH_PAUSE_MS,
+                  archive_dir=ARCHIVE_DIR, dry_run=False):
+    """Remove rows of one table and user class older than ttl_days"""
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{ttl_days} days',)).fetchone()[0]
+    select_sql = (
+        f'SELECT * FROM {table} WHERE {USER_CLASSES[user_class]} AND timestamp < ? ORDER BY timestamp, id'
+    )
+    deleted, batches = _delete_batches(
+        conn, table, select_sql, (cutoff,), batch_size, pause_ms / 1000, archive_dir, dry_run
+    )
+    return {'table': table, 'user_class': user_class, 'ttl_days': ttl_days, 'cutoff': cutoff,
+            'deleted': deleted, 'batches': batches}
+
+
+def compact_foods(conn, batch_size=BATCH_SIZE, pause_ms=BATCH_PAUSE_MS, archive_dir=ARCHIVE_DIR, dry_run=False):
+    """Remove food attribute sets that no prediction references any more"""
+    select_sql = (
+        'SELECT * FROM foods WHERE NOT EXISTS (SELECT 1 FROM predictions WHERE food_id = foods.id) ORDER BY id'
+    )
+    deleted, _ = _delete_batches(conn, 'foods', select_sql, (), batch_size, pause_ms / 1000, archive_dir, dry_run)
+    return deleted
+
+
+def _page_counts(conn):
+    return {
+        'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+        'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+        'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0]
+    }
+
+
+def reclaim_space(conn, max_pages=VACUUM_PAGES, full=False):
+    """Return free pages to the filesystem; full=True rewrites the file and enables incremental vacuum"""
+    conn.commit()
+    before = _page_counts(conn)
+    auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+    if full:
+        # auto_vacuum can only change on an empty database or through a full VACUUM
+        conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+        conn.execute('VACUUM')
+        mode = 'full'
+    elif auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        # sqlite3 steps a statement without result columns once, and each step frees one page
+        conn.execute('BEGIN IMMEDIATE')
+        for _ in range(min(int(max_pages), before['freelist_count'])):
+            conn.execute('PRAGMA incremental_vacuum(1)')
+        conn.commit()
+        mode = 'incremental'
+    else:
+        mode = 'skipped (auto_vacuum is off; run once with --full-vacuum)'
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+
+    after = _page_counts(conn)
+    return {
+        'mode': mode,
+        'pages_before': before['page_count'],
+        'pages_after': after['page_count'],
+        'free_pages_left': after['freelist_count'],
+        'bytes_reclaimed': (before['page_count'] - after['page_count']) * before['page_size']
+    }
+
+
+def run_retention(conn, policy=None, batch_size=BATCH_SIZE, pause_ms=BATCH_PAUSE_MS, archive_dir=ARCHIVE_DIR,
+                  vacuum_pages=VACUUM_PAGES, full_vacuum=False, dry_run=False):
+    """Apply every TTL in the policy, compact foods, reclaim space; returns a summary of what was removed"""
+    global _last_run
+    started = time.perf_counter()
+    policy = load_policy() if policy is None else policy
+
+    purged = []
+    for table, ttls in policy.items():
+        for user_class, ttl_days in ttls.items():
+            if ttl_days is None:
+                continue
+            purged.append(purge_expired(conn, table, user_class, ttl_days, batch_size, pause_ms,
+                                        archive_dir, dry_run))
+
+    summary = {
+        'dry_run': dry_run,
+        'purged': purged,
+        'rows_deleted': sum(entry['deleted'] for entry in purged),
+        'foods_deleted': compact_foods(conn, batch_size, pause_ms, archive_dir, dry_run)
+    }
+    summary['vacuum'] = None if dry_run else reclaim_space(conn, vacuum_pages, full_vacuum)
+    summary['duration_seconds'] = round(time.perf_counter() - started, 3)
+    summary['finished_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    if not dry_run:
+        with _stats_lock:
+            _totals['runs'] += 1
+            _totals['rows_deleted'] += summary['rows_deleted']
+            _totals['foods_deleted'] += summary['foods_deleted']
+            _totals['bytes_reclaimed'] += summary['vacuum']['bytes_reclaimed']
+            _last_run = summary
+    return summary
+
+
+def stats():
+    """Totals across runs in this process and the last run's summary"""
+    with _stats_lock:
+        return dict(_totals, last_run=_last_run)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive and delete expired history rows, then reclaim space')
+    parser.add_argument('--db', default=DATABASE_PATH)
+    parser.add_argument('--policy', default=None, help='JSON merged over the default TTLs (default: RETENTION_POLICY)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause-ms', type=float, default=BATCH_PAUSE_MS)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="Set to '' to delete without archiving")
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES)
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='Rewrite the file with VACUUM and switch to incremental auto_vacuum')
+    parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db, max_size=1)
+    try:
+        with pool.connection() as conn:
+            summary = run_retention(
+                conn, load_policy(args.policy), args.batch_size, args.pause_ms, args.archive_dir,
+                args.vacuum_pages, args.full_vacuum, args.dry_run
+            )
+    finally:
+        pool.close_all()
+
+    for entry in summary['purged']:
+        print(f"{entry['table']} ({entry['user_class']}, older than {entry['ttl_days']} days): "
+              f"{entry['deleted']} rows" + (" would be deleted" if args.dry_run else f" in {entry['batches']} batches"))
+    print(f"Unreferenced foods: {summary['foods_deleted']}")
+    if summary['vacuum']:
+        vacuum = summary['vacuum']
+        print(f"Vacuum {vacuum['mode']}: {vacuum['pages_before']} -> {vacuum['pages_after']} pages, "
+              f"{vacuum['bytes_reclaimed']} bytes reclaimed")
+    print(f"Finished in {summary['duration_seconds']}s")
@@ -0,0 +1,150 @@
+"""
+Per-user symptom rollups.
+
+symptom_rollups holds, for each logged-in user, how many predictions put each
+symptom at each impact for each food category. Triggers on `predictions` keep it
+current on every insert and delete (including /clear-predictions and retention
+deletes), so /insights reads a few rollup rows instead of the user's whole
+history. Anonymous predictions (user_id NULL) are not rolled up.
+
+Migration 4 creates the table and triggers and backfills it. To rebuild or
+verify the rollups afterwards:
+
+    python db/rollups.py --rebuild
+    python db/rollups.py --check      # exits 1 if the rollups drifted
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import DATABASE_PATH
+from db.predictions import IMPACT_COLUMNS
+
+UNKNOWN_CATEGORY = 'Unknown'
+
+ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS symptom_rollups (
+        user_id INTEGER NOT NULL,
+        symptom TEXT NOT NULL,
+        impact INTEGER NOT NULL,
+        food_category TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, symptom, impact, food_category)
+    ) WITHOUT ROWID
+'''
+
+
+def _symptom_rows(alias):
+    """One (symptom, impact) row per impact column of the trigger's NEW/OLD row"""
+    return ' UNION ALL '.join(f"SELECT '{col}' AS symptom, {alias}.{col} AS impact" for col in IMPACT_COLUMNS)
+
+
+def _category(alias):
+    return f"COALESCE((SELECT food_category FROM foods WHERE id = {alias}.food_id), '{UNKNOWN_CATEGORY}')"
+
+
+ROLLUP_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS predictions_rollup_insert AFTER INSERT ON predictions
+    WHEN NEW.user_id IS NOT NULL
+    BEGIN
+        INSERT INTO symptom_rollups (user_id, symptom, impact, food_category, count)
+        SELECT NEW.user_id, symptom, impact, {_category('NEW')}, 1
+        FROM ({_symptom_rows('NEW')}) WHERE impact IS NOT NULL
+        ON CONFLICT (user_id, symptom, impact, food_category) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS predictions_rollup_delete AFTER DELETE ON predictions
+    WHEN OLD.user_id IS NOT NULL
+    BEGIN
+        UPDATE symptom_rollups SET count = count - 1
+        WHERE user_id = OLD.user_id AND food_category = {_category('OLD')}
+          AND (symptom, impact) IN ({_symptom_rows('OLD')});
+        DELETE FROM symptom_rollups WHERE user_id = OLD.user_id AND count <= 0;
+    END
+    '''
+]
+
+
+def _aggregate_sql():
+    """The same counts computed from scratch, for the backfill and drift check"""
+    cases = ' '.join(f"WHEN '{col}' THEN p.{col}" for col in IMPACT_COLUMNS)
+    symptoms = ' UNION ALL '.join(f"SELECT '{col}' AS symptom" for col in IMPACT_COLUMNS)
+    return (
+        f'SELECT user_id, symptom, impact, food_category, COUNT(*) FROM ('
+        f'SELECT p.user_id, s.symptom, CASE s.symptom {cases} END AS impact, '
+        f'COALESCE(f.food_category, ?) AS food_category '
+        f'FROM predictions p CROSS JOIN ({symptoms}) s LEFT JOIN foods f ON f.id = p.food_id '
+        f'WHERE p.user_id IS NOT NULL) '
+        f'WHERE impact IS NOT NULL GROUP BY user_id, symptom, impact, food_category'
+    )
+
+
+def create_rollups(conn):
+    """Migration 4: rollup table, its maintenance triggers, and the initial backfill"""
+    conn.execute(ROLLUP_TABLE)
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(trigger)
+    backfill(conn)
+
+
+def backfill(conn):
+    """Recompute every rollup row from predictions; runs inside the caller's transaction"""
+    conn.execute('DELETE FROM symptom_rollups')
+    conn.execute(
+        f'INSERT INTO symptom_rollups (user_id, symptom, impact, food_category, count) {_aggregate_sql()}',
+        (UNKNOWN_CATEGORY,)
+    )
+    return conn.execute('SELECT COUNT(*) FROM symptom_rollups').fetchone()[0]
+
+
+def rebuild(conn):
+    """Backfill in its own write transaction, e.g. after a manual data fix"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = backfill(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rows
+
+
+def drift(conn):
+    """Rollup rows that differ from a fresh aggregation: {key: (stored, expected)}"""
+    stored = {tuple(row[:4]): row[4] for row in conn.execute(
+        'SELECT user_id, symptom, impact, food_category, count FROM symptom_rollups'
+    )}
+    expected = {tuple(row[:4]): row[4] for row in conn.execute(_aggregate_sql(), (UNKNOWN_CATEGORY,))}
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild or verify the per-user symptom rollups')
+    parser.add_argument('--db', default=DATABASE_PATH)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--rebuild', action='store_true', help='Recompute all rollups from predictions')
+    group.add_argument('--check', action='store_true', help='Compare rollups with a fresh aggregation')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.rebuild:
+            print(f"Rebuilt {rebuild(conn)} rollup rows")
+        else:
+            differences = drift(conn)
+            for key, (stored, expected) in sorted(differences.items(), key=str):
+                print(f"DRIFT {key}: stored {stored}, expected {expected}")
+            print(f"{len(differences)} rollup rows differ")
+            sys.exit(1 if differences else 0)
+    finally:
+        conn.close()
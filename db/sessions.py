@@ -0,0 +1,523 @@
+"""
+Server-side sessions shared by every worker and node.
+
+Flask's default session keeps the data in a cookie signed with the app secret,
+which app.py used to generate per process: a login on one worker was invisible
+to the others and every restart logged everyone out. ServerSideSessionInterface
+keeps the data (user_id, username, chat_session_id) in a SessionStore and puts
+only a compact signed session id in the cookie:
+
+  * SQLiteSessionStore   - the default; a table in SESSION_DATABASE_PATH shared by
+                           the workers on one host
+  * PostgresSessionStore - the default when DATABASE_URL is a PostgreSQL URL (or
+                           SESSION_STORE_URL=postgresql://...), shared by every node
+                           using that database
+  * RedisSessionStore    - SESSION_STORE_URL=redis://host:6379/0, shared by several
+                           nodes (needs the redis package); keys expire on their own
+
+The stores also keep the login throttle counters (api/auth.py), so the limits
+apply across every worker and node that shares the store.
+
+Session ids are secrets.token_urlsafe(SESSION_ID_BYTES), signed with
+FLASK_SECRET_KEY. To rotate the secret, set the new key and move the old one to
+FLASK_SECRET_KEY_FALLBACKS (comma separated): cookies signed with a fallback
+key are still accepted and re-signed with the new key on the next response.
+
+A session expires SESSION_LIFETIME_MINUTES after the last request that used it.
+The expiry is pushed forward once half the lifetime has passed rather than on
+every request, so reads do not turn into writes. app.py deletes expired
+sessions every SESSION_GC_INTERVAL_SECONDS:
+
+    python db/sessions.py --gc
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from datetime import timedelta
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from db.connection import ConnectionPool
+from db.repository import DATABASE_URL
+from observability.log import get_logger
+from observability.timing import span
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+SECRET_KEY = os.environ.get('FLASK_SECRET_KEY', '')
+SECRET_KEY_FALLBACKS = [key for key in os.environ.get('FLASK_SECRET_KEY_FALLBACKS', '').split(',') if key]
+SESSION_STORE_URL = os.environ.get('SESSION_STORE_URL', '')
+SESSION_DATABASE_PATH = os.environ.get('SESSION_DATABASE_PATH', 'sessions.db')
+SESSION_LIFETIME_MINUTES = float(os.environ.get('SESSION_LIFETIME_MINUTES', 7 * 24 * 60))
+SESSION_GC_INTERVAL_SECONDS = float(os.environ.get('SESSION_GC_INTERVAL_SECONDS', 600))
+SESSION_GC_BATCH_SIZE = int(os.environ.get('SESSION_GC_BATCH_SIZE', 1000))
+
+# 24 URL-safe characters, 144 random bits
+SESSION_ID_BYTES = 18
+SIGNER_SALT = 'predo-session'
+
+log = get_logger(__name__)
+
+SESSIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID
+'''
+SESSIONS_EXPIRY_INDEX = 'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)'
+
+# Fixed-window counters: hits since the window opened, and when it closes
+COUNTERS_TABLE = '''
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+'''
+COUNTERS_EXPIRY_INDEX = 'CREATE INDEX IF NOT EXISTS idx_counters_expires_at ON counters (expires_at)'
+
+
+def new_session_id():
+    return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+
+class SessionStore:
+    """Session data by id, each with an absolute expiry in epoch seconds"""
+    backend = None
+
+    def load(self, session_id):
+        """(data, expires_at), or None when the session is missing or expired"""
+        raise NotImplementedError
+
+    def save(self, session_id, data, expires_at):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Delete expired sessions; returns how many were removed"""
+        return 0
+
+    def hit(self, key, window_seconds):
+        """Count a hit in key's fixed window, opening a new window if the last one closed"""
+        raise NotImplementedError
+
+    def count(self, key):
+        """(hits, window closes at) for key's open window, or None"""
+        raise NotImplementedError
+
+    def reset(self, key):
+        raise NotImplementedError
+
+    def after_fork(self):
+        """Drop connections inherited from a parent process"""
+
+    def stats(self):
+        return {'backend': self.backend}
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    backend = 'sqlite'
+
+    def __init__(self, path=SESSION_DATABASE_PATH, batch_size=SESSION_GC_BATCH_SIZE):
+        self.pool = ConnectionPool(path)
+        self.batch_size = batch_size
+        self._stats_lock = threading.Lock()
+        self._gc_runs = 0
+        self._purged = 0
+        with self.pool.connection() as conn:
+            conn.execute(SESSIONS_TABLE)
+            conn.execute(SESSIONS_EXPIRY_INDEX)
+            conn.execute(COUNTERS_TABLE)
+            conn.execute(COUNTERS_EXPIRY_INDEX)
+            conn.commit()
+
+    def load(self, session_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?',
+                (session_id, int(time.time()))
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def after_fork(self):
+        self.pool.after_fork()
+
+    def save(self, session_id, data, expires_at):
+        # Committed before the response goes out (not queued), since the next
+        # request may land on another worker
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+                (session_id, json.dumps(data, separators=(',', ':')), int(expires_at))
+            )
+            conn.commit()
+
+    def delete(self, session_id):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            conn.commit()
+
+    def hit(self, key, window_seconds):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT INTO counters (key, hits, expires_at) VALUES (?, 1, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'hits = CASE WHEN counters.expires_at <= ? THEN 1 ELSE counters.hits + 1 END, '
+                'expires_at = CASE WHEN counters.expires_at <= ? THEN excluded.expires_at ELSE counters.expires_at END',
+                (key, now + window_seconds, now, now)
+            )
+            conn.commit()
+
+    def count(self, key):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT hits, expires_at FROM counters WHERE key = ? AND expires_at > ?',
+                               (key, time.time())).fetchone()
+        return tuple(row) if row else None
+
+    def reset(self, key):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM counters WHERE key = ?', (key,))
+            conn.commit()
+
+    def purge_expired(self):
+        """Delete expired sessions in short batches so logins are not held behind the write lock"""
+        purged = 0
+        now = int(time.time())
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
+            conn.commit()
+            while True:
+                deleted = conn.execute(
+                    'DELETE FROM sessions WHERE id IN '
+                    '(SELECT id FROM sessions WHERE expires_at <= ? ORDER BY expires_at LIMIT ?)',
+                    (now, self.batch_size)
+                ).rowcount
+                conn.commit()
+                purged += deleted
+                if deleted < self.batch_size:
+                    break
+        with self._stats_lock:
+            self._gc_runs += 1
+            self._purged += purged
+        return purged
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            active = conn.execute('SELECT COUNT(*) FROM sessions WHERE expires_at > ?',
+                                  (int(time.time()),)).fetchone()[0]
+        with self._stats_lock:
+            return {'backend': self.backend, 'path': self.pool.path, 'active': active,
+                    'gc_runs': self._gc_runs, 'purged': self._purged}
+
+    def close(self):
+        self.pool.close_all()
+
+
+class PostgresSessionStore(SessionStore):
+    """Sessions and counters in tables of the PostgreSQL database, shared by every node"""
+    backend = 'postgresql'
+
+    # pg_advisory_xact_lock key serializing the table setup across nodes
+    SETUP_LOCK_ID = 727002
+
+    def __init__(self, dsn, batch_size=SESSION_GC_BATCH_SIZE):
+        # Only its connection pool is used; the repository schema is not touched
+        from db.postgres import PostgresRepository
+        self.pool = PostgresRepository(dsn)
+        self.batch_size = batch_size
+        self._stats_lock = threading.Lock()
+        self._gc_runs = 0
+        self._purged = 0
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (self.SETUP_LOCK_ID,))
+            cursor.execute('CREATE TABLE IF NOT EXISTS sessions '
+                           '(id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at BIGINT NOT NULL)')
+            cursor.execute(SESSIONS_EXPIRY_INDEX)
+            cursor.execute('CREATE TABLE IF NOT EXISTS counters '
+                           '(key TEXT PRIMARY KEY, hits INTEGER NOT NULL, expires_at DOUBLE PRECISION NOT NULL)')
+            cursor.execute(COUNTERS_EXPIRY_INDEX)
+            cursor.execute('COMMIT')
+
+    def _execute(self, sql, params=()):
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() if cursor.description else cursor.rowcount
+
+    def load(self, session_id):
+        row = self._execute('SELECT data, expires_at FROM sessions WHERE id = %s AND expires_at > %s',
+                            (session_id, int(time.time())))
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, session_id, data, expires_at):
+        self._execute(
+            'INSERT INTO sessions (id, data, expires_at) VALUES (%s, %s, %s) '
+            'ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at',
+            (session_id, json.dumps(data, separators=(',', ':')), int(expires_at))
+        )
+
+    def delete(self, session_id):
+        self._execute('DELETE FROM sessions WHERE id = %s', (session_id,))
+
+    def hit(self, key, window_seconds):
+        now = time.time()
+        self._execute(
+            'INSERT INTO counters (key, hits, expires_at) VALUES (%s, 1, %s) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'hits = CASE WHEN counters.expires_at <= %s THEN 1 ELSE counters.hits + 1 END, '
+            'expires_at = CASE WHEN counters.expires_at <= %s THEN EXCLUDED.expires_at ELSE counters.expires_at END',
+            (key, now + window_seconds, now, now)
+        )
+
+    def count(self, key):
+        row = self._execute('SELECT hits, expires_at FROM counters WHERE key = %s AND expires_at > %s',
+                            (key, time.time()))
+        return tuple(row) if row else None
+
+    def reset(self, key):
+        self._execute('DELETE FROM counters WHERE key = %s', (key,))
+
+    def purge_expired(self):
+        """Delete expired sessions in short batches, like the SQLite store"""
+        purged = 0
+        now = int(time.time())
+        self._execute('DELETE FROM counters WHERE expires_at <= %s', (now,))
+        while True:
+            deleted = self._execute(
+                'DELETE FROM sessions WHERE id IN '
+                '(SELECT id FROM sessions WHERE expires_at <= %s ORDER BY expires_at LIMIT %s)',
+                (now, self.batch_size)
+            )
+            purged += deleted
+            if deleted < self.batch_size:
+                break
+        with self._stats_lock:
+            self._gc_runs += 1
+            self._purged += purged
+        return purged
+
+    def after_fork(self):
+        self.pool.after_fork()
+
+    def stats(self):
+        active = self._execute('SELECT COUNT(*) FROM sessions WHERE expires_at > %s', (int(time.time()),))[0]
+        with self._stats_lock:
+            return {'backend': self.backend, 'active': active, 'gc_runs': self._gc_runs, 'purged': self._purged}
+
+    def close(self):
+        self.pool.close()
+
+
+class RedisSessionStore(SessionStore):
+    backend = 'redis'
+    key_prefix = 'predo:session:'
+    counter_prefix = 'predo:counter:'
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("SESSION_STORE_URL is a Redis URL but redis is not installed. "
+                              "Install it with: pip install redis")
+        self.client = redis.Redis.from_url(url)
+
+    def load(self, session_id):
+        pipe = self.client.pipeline()
+        pipe.get(self.key_prefix + session_id)
+        pipe.ttl(self.key_prefix + session_id)
+        value, ttl = pipe.execute()
+        if value is None:
+            return None
+        return json.loads(value), time.time() + max(ttl, 0)
+
+    def save(self, session_id, data, expires_at):
+        self.client.set(self.key_prefix + session_id, json.dumps(data, separators=(',', ':')),
+                        ex=max(1, int(expires_at - time.time())))
+
+    def delete(self, session_id):
+        self.client.delete(self.key_prefix + session_id)
+
+    def hit(self, key, window_seconds):
+        # The key is created with the window's TTL and expires on its own
+        pipe = self.client.pipeline()
+        pipe.set(self.counter_prefix + key, 0, ex=max(1, int(window_seconds)), nx=True)
+        pipe.incr(self.counter_prefix + key)
+        pipe.execute()
+
+    def count(self, key):
+        pipe = self.client.pipeline()
+        pipe.get(self.counter_prefix + key)
+        pipe.ttl(self.counter_prefix + key)
+        value, ttl = pipe.execute()
+        if value is None or ttl < 0:
+            return None
+        return int(value), time.time() + ttl
+
+    def reset(self, key):
+        self.client.delete(self.counter_prefix + key)
+
+    def close(self):
+        self.client.close()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data loaded from the store; only its signed id travels in the cookie"""
+
+    def __init__(self, initial=None, session_id=None, expires_at=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.session_id = session_id
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        # Set when the cookie was signed with a fallback key
+        self.resign = False
+        self.previous_id = None
+
+    def regenerate(self):
+        """Move the data to a fresh id; call on login so an id issued before it cannot be reused"""
+        if not self.new and self.previous_id is None:
+            self.previous_id = self.session_id
+        self.session_id = new_session_id()
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store, secret_keys, lifetime=timedelta(minutes=SESSION_LIFETIME_MINUTES)):
+        self.store = store
+        # The first key signs; the rest (fallbacks) are only accepted
+        self.signers = [Signer(key, salt=SIGNER_SALT) for key in secret_keys]
+        self.lifetime = lifetime
+
+    def _unsign(self, cookie):
+        """(session id, signed with a fallback key), or (None, False) for a bad signature"""
+        for index, signer in enumerate(self.signers):
+            try:
+                return signer.unsign(cookie).decode('ascii'), index > 0
+            except BadSignature:
+                continue
+        return None, False
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            session_id, old_key = self._unsign(cookie)
+            with span('session'):
+                loaded = self.store.load(session_id) if session_id else None
+            if loaded is not None:
+                data, expires_at = loaded
+                session = ServerSideSession(data, session_id, expires_at)
+                session.resign = old_key
+                return session
+        return ServerSideSession(session_id=new_session_id(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_id is not None:
+            self.store.delete(session.previous_id)
+
+        if not session:
+            # Cleared (logout): drop the stored session and the cookie
+            if not session.new:
+                self.store.delete(session.session_id)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        refresh = (session.modified or session.expires_at is None
+                   or session.expires_at - now < self.lifetime.total_seconds() / 2)
+        if refresh:
+            self.store.save(session.session_id, dict(session), now + self.lifetime.total_seconds())
+        if refresh or session.resign:
+            response.set_cookie(
+                name,
+                self.signers[0].sign(session.session_id).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+            response.vary.add('Cookie')
+
+
+def secret_keys():
+    """[FLASK_SECRET_KEY, *FLASK_SECRET_KEY_FALLBACKS], or a random key for this process when unset"""
+    if SECRET_KEY:
+        return [SECRET_KEY] + SECRET_KEY_FALLBACKS
+    log.warning("FLASK_SECRET_KEY is not set: using a random key, so sessions end on restart "
+                "and are not shared between workers")
+    return [secrets.token_hex(32)]
+
+
+def create_session_store(url=None):
+    """
+    Store for SESSION_STORE_URL (Redis or PostgreSQL by scheme). Without one, sessions go
+    to the PostgreSQL database when DATABASE_URL names one, so every node sharing the
+    database shares logins too, and otherwise to the SQLite file.
+    """
+    url = SESSION_STORE_URL if url is None else url
+    if not url and DATABASE_URL.startswith(('postgres://', 'postgresql://')):
+        url = DATABASE_URL
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSessionStore(url)
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresSessionStore(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):])
+    if url:
+        raise ValueError(f"Unsupported SESSION_STORE_URL scheme: {url.split(':', 1)[0]}")
+    return SQLiteSessionStore()
+
+
+def init_app(app, store=None):
+    """Install server-side sessions on the app; returns the session interface"""
+    keys = secret_keys()
+    lifetime = timedelta(minutes=SESSION_LIFETIME_MINUTES)
+    app.secret_key = keys[0]
+    app.permanent_session_lifetime = lifetime
+    app.session_interface = ServerSideSessionInterface(store or create_session_store(), keys, lifetime)
+    return app.session_interface
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect the session store or delete expired sessions')
+    parser.add_argument('--url', default=None, help='Session store URL (default: SESSION_STORE_URL)')
+    parser.add_argument('--gc', action='store_true', help='Delete expired sessions')
+    args = parser.parse_args()
+
+    store = create_session_store(args.url)
+    try:
+        if args.gc:
+            print(f"Deleted {store.purge_expired()} expired sessions")
+        print(json.dumps(store.stats(), indent=2))
+    finally:
+        store.close()
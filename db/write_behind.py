@@ -0,0 +1,222 @@
+"""
+Write-behind queue with group commit for history inserts.
+
+Request threads enqueue INSERTs and return immediately; a single background
+writer drains the queue and commits them in batches (up to max_batch statements,
+or whatever arrived within max_delay_ms of the first one), so many requests share
+one transaction and one fsync, and request threads never wait on SQLite's write
+lock. The queue is bounded: when it is full, submit() blocks for up to
+put_timeout seconds (backpressure) and then raises WriteQueueFull. stop() drains
+and commits everything still queued; app.py registers it with atexit.
+
+Callers that need the row id (e.g. /predict returns prediction_id) can wait on
+the PendingWrite returned by submit(); the wait covers at most one batch window.
+A statement that changed no rows resolves to None rather than an earlier row's id.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from db.connection import get_pool
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 256))
+MAX_DELAY_MS = float(os.environ.get('WRITE_BEHIND_MAX_DELAY_MS', 20))
+QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000))
+PUT_TIMEOUT = float(os.environ.get('WRITE_BEHIND_PUT_TIMEOUT', 2.0))
+
+_STOP = object()
+
+
+def _row_id(cursor):
+    # lastrowid keeps the connection's previous insert when this statement wrote nothing
+    return cursor.lastrowid if cursor.rowcount > 0 else None
+
+
+class WriteQueueFull(Exception):
+    """The write queue stayed full for longer than the put timeout"""
+
+
+class PendingWrite:
+    """Completion handle for one queued statement"""
+
+    def __init__(self, sql, params, expected_errors=()):
+        self.sql = sql
+        self.params = params
+        self.expected_errors = expected_errors
+        self.lastrowid = None
+        self.error = None
+        self._done = threading.Event()
+
+    def _finish(self, lastrowid=None, error=None):
+        self.lastrowid = lastrowid
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until the statement is committed; returns its lastrowid, or None on timeout"""
+        if not self._done.wait(timeout):
+            return None
+        if self.error is not None:
+            raise self.error
+        return self.lastrowid
+
+
+class WriteBehindQueue:
+    def __init__(self, pool=None, max_batch=MAX_BATCH, max_delay_ms=MAX_DELAY_MS,
+                 queue_size=QUEUE_SIZE, put_timeout=PUT_TIMEOUT):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stopped = False
+        self._submitted = 0
+        self._written = 0
+        self._failed = 0
+        self._batches = 0
+        self._rejected = 0
+        self._max_depth = 0
+
+    def _ensure_started(self):
+        # Started on first use so a forking server starts it in each worker, not the parent
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def submit(self, sql, params=(), expected_errors=()):
+        """
+        Queue one statement; blocks while the queue is full, then raises WriteQueueFull.
+
+        expected_errors are exception types the caller handles itself (e.g. an
+        IntegrityError for a taken username); they are not logged as failures.
+        """
+        if self._stopped:
+            raise RuntimeError('Write-behind queue is stopped')
+        self._ensure_started()
+        pending = PendingWrite(sql, params, expected_errors)
+        try:
+            self._queue.put(pending, timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise WriteQueueFull(f"Write queue full ({self._queue.maxsize} pending)")
+        with self._stats_lock:
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return pending
+
+    def _next_batch(self):
+        """Block for the first item, then gather more until the batch is full or the window closes"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write_batch(self, conn, batch):
+        """Commit the batch in one transaction; on failure retry row by row so one bad row is isolated"""
+        try:
+            rowids = []
+            for pending in batch:
+                rowids.append(_row_id(conn.execute(pending.sql, pending.params)))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            written = 0
+            for pending in batch:
+                try:
+                    rowid = _row_id(conn.execute(pending.sql, pending.params))
+                    conn.commit()
+                    pending._finish(lastrowid=rowid)
+                    written += 1
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    if isinstance(e, pending.expected_errors):
+                        log.debug("Write-behind statement rejected", error=str(e))
+                    else:
+                        log.error("Write-behind statement failed", error=str(e), sql=pending.sql)
+                    pending._finish(error=e)
+            with self._stats_lock:
+                self._written += written
+                self._failed += len(batch) - written
+                self._batches += 1
+            return
+
+        for pending, rowid in zip(batch, rowids):
+            pending._finish(lastrowid=rowid)
+        with self._stats_lock:
+            self._written += len(batch)
+            self._batches += 1
+
+    def _run(self):
+        pool = self.pool or get_pool()
+        conn = pool.acquire()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+            # Drain anything submitted before stop() was observed
+            leftovers = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftovers.append(item)
+            for start in range(0, len(leftovers), self.max_batch):
+                self._write_batch(conn, leftovers[start:start + self.max_batch])
+        finally:
+            pool.release(conn)
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is committed (the writer is FIFO)"""
+        if self._thread is None:
+            return
+        self.submit('SELECT 1').wait(timeout)
+
+    def stop(self, timeout=10.0):
+        """Flush every queued statement and stop the writer thread"""
+        self._stopped = True
+        if self._thread is not None:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                log.warning("Write-behind queue did not drain before shutdown")
+                return
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'submitted': self._submitted,
+                'written': self._written,
+                'failed': self._failed,
+                'batches': self._batches,
+                'avg_batch_size': self._written / self._batches if self._batches else 0.0,
+                'rejected': self._rejected,
+                'max_queue_depth': self._max_depth
+            }
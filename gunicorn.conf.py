@@ -0,0 +1,64 @@
+"""
+Gunicorn settings for python run.py --production.
+
+gunicorn reads this file from the working directory; run.py passes its own flags
+on the command line, which take precedence. The app and model are loaded once in
+the master (preload_app) and workers fork from it. Each worker serves requests
+on a thread pool and is replaced after max_requests (plus up to
+max_requests_jitter, so workers do not all restart together), which bounds
+memory growth.
+
+Background jobs (online updates, retention, session GC) start in the workers, not
+in the master: the worker holding background_jobs.lock runs them, and every
+worker reloads the model when best_model.pkl changes.
+
+kill -HUP <master pid> reloads the model artifacts in the master and replaces the
+workers gracefully: old workers finish their in-flight requests first. Code
+changes need a full restart.
+"""
+import multiprocessing
+import os
+
+# Read by app.py when the master preloads it
+os.environ['BACKGROUND_JOBS_AFTER_FORK'] = '1'
+# Workers write their request histograms here and /metrics adds them up (observability/timing.py)
+os.environ.setdefault('METRICS_DIR', 'metrics')
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+# LLM calls on /predict and /chat can take several seconds
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+
+def on_starting(server):
+    from observability.timing import reset_metrics_dir
+    reset_metrics_dir()
+
+
+def worker_exit(server, worker):
+    # Keep the histograms of requests served since the last periodic write
+    from observability.timing import histograms
+    histograms.flush()
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    after_fork()
+
+
+def on_reload(server):
+    # New workers fork from the master, so refresh the model there before they start
+    from wsgi import warm_up
+    import app
+    if app.predictor is not None:
+        app.predictor.load_model()
+    warm_up()
+    server.log.info("Reloaded model artifacts")
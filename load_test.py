@@ -0,0 +1,166 @@
+"""
+Load test: Flask's development server vs. the production server.
+
+Starts each server on its own port against a scratch database seeded with
+anonymous predictions, then replays a read mix (index page, /check-auth and
+/history pages) from --concurrency client threads for --seconds and reports
+throughput and latency. --url measures an already running server instead.
+Like a browser, the client retries a GET once when a kept-alive connection is
+reset, which happens when a worker is replaced after --max-requests.
+
+    python load_test.py --concurrency 32 --seconds 15
+    python load_test.py --workers 4 --threads 8
+    python load_test.py --url http://localhost:8000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+PATHS = ['/', '/check-auth', '/history?limit=20', '/history?limit=50']
+
+FOOD = {
+    'food_name': 'Oatmeal', 'food_category': 'Grains', 'food_subcategory': 'Whole Grains',
+    'processing_level': 'Minimally Processed', 'caffeine_content_mg': 0, 'flavor_profile': 'Mild',
+    'common_allergens': 'None', 'glycemic_index': 55, 'inflammatory_index': 2, 'calories_kcal': 150,
+    'quantity': '1 cup'
+}
+RESULTS = {
+    'impact_on_cramps': 'Beneficial', 'impact_on_bloating': 'Neutral', 'impact_on_headache': 'Neutral',
+    'impact_on_mood_swings': 'Beneficial', 'impact_on_fatigue': 'Beneficial', 'impact_on_acne': 'Neutral'
+}
+
+
+def seed_database(path, rows):
+    from db.repository import SQLiteRepository
+
+    repository = SQLiteRepository(path)
+    try:
+        repository.migrate()
+        for i in range(rows):
+            repository.add_prediction(f'food {i % 50}', dict(FOOD, food_name=f'food {i % 50}'), RESULTS, None,
+                                      wait=False)
+        repository.flush()
+    finally:
+        repository.close()
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'dev':
+        return [sys.executable, 'app.py']
+    if sys.platform == 'win32':
+        return [sys.executable, '-m', 'waitress', f'--listen=127.0.0.1:{port}', f'--threads={workers * threads}',
+                'wsgi:app']
+    return [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--threads', str(threads)]
+
+
+def wait_until_ready(url, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(url + '/check-auth', timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s")
+
+
+def run_load(url, concurrency, seconds, warmup):
+    """Hit the server from `concurrency` threads; returns (requests per second, latencies in ms, errors)"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + seconds
+
+    def client(index):
+        rng = random.Random(index)
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(max_retries=Retry(total=1, connect=1, read=1, status=0)))
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                ok = session.get(url + rng.choice(PATHS), timeout=30).ok
+            except requests.RequestException:
+                ok = False
+            finished = time.perf_counter()
+            if started >= start_at:
+                if ok:
+                    latencies[index].append((finished - started) * 1000.0)
+                else:
+                    errors[index] += 1
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    all_latencies = np.array([value for values in latencies for value in values])
+    return len(all_latencies) / seconds, all_latencies, sum(errors)
+
+
+def report(name, rps, latencies, errors):
+    p50 = np.percentile(latencies, 50) if len(latencies) else 0.0
+    p99 = np.percentile(latencies, 99) if len(latencies) else 0.0
+    print(f"{name:<12} {rps:10.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  ({errors} errors)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the development server with the production server')
+    parser.add_argument('--url', default=None, help='Measure this running server instead of starting both')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=2000, help='Anonymous predictions to seed')
+    args = parser.parse_args()
+
+    if args.url:
+        report(args.url, *run_load(args.url.rstrip('/'), args.concurrency, args.seconds, args.warmup))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        database = os.path.join(scratch, 'load_test.db')
+        seed_database(database, args.rows)
+        env = dict(os.environ, DATABASE_PATH=database, SESSION_DATABASE_PATH=os.path.join(scratch, 'sessions.db'),
+                   FLASK_SECRET_KEY='load-test', DATABASE_URL='', SESSION_STORE_URL='')
+
+        results = {}
+        for mode, port in (('dev', 5051), ('production', 5052)):
+            log_path = os.path.join(scratch, f'{mode}.log')
+            with open(log_path, 'w') as log:
+                server = subprocess.Popen(server_command(mode, port, args.workers, args.threads), cwd=ROOT,
+                                          env=dict(env, PORT=str(port)), stdout=log, stderr=subprocess.STDOUT)
+                try:
+                    url = f'http://127.0.0.1:{port}'
+                    wait_until_ready(url, server)
+                    results[mode] = run_load(url, args.concurrency, args.seconds, args.warmup)
+                except RuntimeError:
+                    print(open(log_path).read()[-2000:])
+                    raise
+                finally:
+                    server.terminate()
+                    server.wait(timeout=60)
+            report(mode, *results[mode])
+
+        if results['dev'][0]:
+            print(f"Speedup: {results['production'][0] / results['dev'][0]:.2f}x")
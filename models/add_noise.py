@@ -1,52 +1,188 @@
-import pandas as pd
+"""
+Noise augmentation for the food recommendation dataset.
+
+The input is streamed in chunks. A first pass collects per-column statistics
+(standard deviation, range and the category set); a second pass perturbs each
+chunk with its own generator seeded from (seed, chunk index), so the output is
+identical for any number of worker processes. Numeric columns get Gaussian noise
+scaled to the column's standard deviation and clipped to its range; categorical
+columns flip a fraction of values to a different category, drawn on integer codes.
+
+    python models/add_noise.py --noise-level 0.4 --seed 42 --workers 4
+    python models/add_noise.py --column impact_on_cramps=0.1 --column user_id=0
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from collections import deque
+
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 100000
+
 
-def add_noise_to_dataset(input_file, output_file, noise_level=0.6):
+def collect_column_stats(input_file, chunksize=DEFAULT_CHUNKSIZE):
+    """First pass: running moments and range of numeric columns, category sets of the rest"""
+    stats = {}
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        for col in chunk.columns:
+            values = chunk[col]
+            if col not in stats:
+                if values.dtype in ['int64', 'float64']:
+                    stats[col] = {"kind": "numeric", "count": 0, "sum": 0.0, "sumsq": 0.0,
+                                  "min": np.inf, "max": -np.inf}
+                else:
+                    stats[col] = {"kind": "categorical", "categories": set(), "has_missing": False}
+            col_stats = stats[col]
+            if col_stats["kind"] == "numeric":
+                numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+                numbers = numbers[~np.isnan(numbers)]
+                if len(numbers):
+                    col_stats["count"] += len(numbers)
+                    col_stats["sum"] += numbers.sum()
+                    col_stats["sumsq"] += np.square(numbers).sum()
+                    col_stats["min"] = min(col_stats["min"], numbers.min())
+                    col_stats["max"] = max(col_stats["max"], numbers.max())
+            else:
+                col_stats["categories"].update(values.dropna().astype(str).unique())
+                col_stats["has_missing"] = col_stats["has_missing"] or bool(values.isna().any())
+    return stats
+
+
+def build_noise_plan(stats, noise_level, column_noise=None):
+    """
+    Per-column noise settings.
+
+    column_noise maps a column to its own noise level (0 leaves it untouched);
+    every other column uses noise_level.
+    """
+    column_noise = column_noise or {}
+    plan = {}
+    for col, col_stats in stats.items():
+        level = column_noise.get(col, noise_level)
+        if level <= 0:
+            continue
+        if col_stats["kind"] == "numeric":
+            if not col_stats["count"]:
+                continue
+            mean = col_stats["sum"] / col_stats["count"]
+            variance = max(0.0, col_stats["sumsq"] / col_stats["count"] - mean * mean)
+            plan[col] = {"kind": "numeric", "scale": level * np.sqrt(variance),
+                         "min": col_stats["min"], "max": col_stats["max"]}
+        else:
+            categories = sorted(col_stats["categories"])
+            n_codes = len(categories) + (1 if col_stats["has_missing"] else 0)
+            if n_codes < 2:
+                continue
+            plan[col] = {"kind": "categorical", "level": level, "categories": categories,
+                         "has_missing": col_stats["has_missing"]}
+    return plan
+
+
+def add_noise_to_chunk(chunk, plan, rng):
+    """Apply the noise plan to one chunk in place and return it"""
+    n_rows = len(chunk)
+    for col in chunk.columns:
+        spec = plan.get(col)
+        if spec is None:
+            continue
+        if spec["kind"] == "numeric":
+            values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float64)
+            noisy = values + rng.normal(0, spec["scale"], size=n_rows)
+            chunk[col] = np.clip(noisy, spec["min"], spec["max"])
+        else:
+            categories = spec["categories"]
+            codes = pd.Categorical(chunk[col].astype(str).where(chunk[col].notna()),
+                                   categories=categories).codes.astype(np.int64)
+            lookup = list(categories)
+            if spec["has_missing"]:
+                # Missing values take part in the flips as their own category
+                codes[codes < 0] = len(categories)
+                lookup.append(np.nan)
+            n_codes = len(lookup)
+            mask = rng.random(n_rows) < spec["level"]
+            # A non-zero offset modulo the category count always lands on a different category
+            codes[mask] = (codes[mask] + rng.integers(1, n_codes, size=int(mask.sum()))) % n_codes
+            chunk[col] = np.array(lookup, dtype=object)[codes]
+    return chunk
+
+
+def _noise_chunk_to_csv(index, chunk, plan, seed):
+    """Worker task: noise one chunk with its own generator and render it as CSV text"""
+    rng = np.random.default_rng([seed, index])
+    return add_noise_to_chunk(chunk, plan, rng).to_csv(index=False, header=(index == 0))
+
+
+def add_noise_to_dataset(input_file, output_file, noise_level=0.6, seed=42, column_noise=None,
+                         chunksize=DEFAULT_CHUNKSIZE, workers=1):
     """
     Add noise to both numerical and categorical features in a dataset.
-    
+
     Parameters:
         input_file (str): Path to the input CSV file
         output_file (str): Path to save the noisy dataset
         noise_level (float): Intensity of noise to add (default: 0.6)
+        seed (int): Seed for the per-chunk random generators
+        column_noise (dict): Optional per-column noise levels overriding noise_level
+        chunksize (int): Rows read and perturbed at a time
+        workers (int): Processes perturbing chunks in parallel
     """
-    # Load the dataset
-    df = pd.read_csv(input_file)
-    
-    # Add noise to all features
-    for col in df.columns:
-        # For numerical columns
-        if df[col].dtype in ['int64', 'float64']:
-            original_values = df[col].values
-            col_std = original_values.std()
-            noise = np.random.normal(0, noise_level * col_std, size=len(original_values))
-            noisy_values = original_values + noise
-            df[col] = np.clip(noisy_values, original_values.min(), original_values.max())
-        
-        # For categorical columns
-        elif df[col].dtype == 'object':
-            # Get unique categories
-            categories = df[col].unique()
-            if len(categories) > 1:
-                # Randomly flip a percentage of values to other categories
-                mask = np.random.random(size=len(df)) < noise_level
-                if mask.any():
-                    # For each value to flip, choose a random different category
-                    new_values = np.random.choice(
-                        [c for c in categories if c != df[col].iloc[0]], 
-                        size=mask.sum()
-                    )
-                    df.loc[mask, col] = new_values
-    
-    # Save the noisy dataset
-    df.to_csv(output_file, index=False)
+    stats = collect_column_stats(input_file, chunksize)
+    plan = build_noise_plan(stats, noise_level, column_noise)
+
+    chunks = enumerate(pd.read_csv(input_file, chunksize=chunksize))
+    with open(output_file, "w", newline="") as out:
+        if workers <= 1:
+            for index, chunk in chunks:
+                out.write(_noise_chunk_to_csv(index, chunk, plan, seed))
+        else:
+            # Keep a bounded number of chunks in flight and write them back in input order
+            with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                in_flight = deque()
+                for index, chunk in chunks:
+                    in_flight.append(pool.apply_async(_noise_chunk_to_csv, (index, chunk, plan, seed)))
+                    if len(in_flight) >= workers * 2:
+                        out.write(in_flight.popleft().get())
+                while in_flight:
+                    out.write(in_flight.popleft().get())
+
     print(f"Noisy dataset saved to {output_file}")
 
+
+def parse_column_noise(items, path=None):
+    """Per-column levels from a JSON file and/or repeated column=level arguments"""
+    column_noise = {}
+    if path:
+        with open(path, "r") as f:
+            column_noise.update({col: float(level) for col, level in json.load(f).items()})
+    for item in items or []:
+        col, _, level = item.partition("=")
+        column_noise[col] = float(level)
+    return column_noise
+
+
 if __name__ == "__main__":
-    # Input and output file paths
-    input_file = "menstruation_food_recommendations_working.csv"
-    output_file = "menstruation_food_recommendations_noisy.csv"
-    
-    # Add noise with a standard deviation of 60% of each feature's standard deviation
-    add_noise_to_dataset(input_file, output_file, noise_level=0.4)
+    parser = argparse.ArgumentParser(description="Add seeded noise to the food recommendation dataset")
+    parser.add_argument("--input", default="menstruation_food_recommendations_working.csv")
+    parser.add_argument("--output", default="menstruation_food_recommendations_noisy.csv")
+    parser.add_argument("--noise-level", type=float, default=0.4,
+                        help="Gaussian std as a fraction of each column's std, and the categorical flip rate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--column", action="append", metavar="NAME=LEVEL",
+                        help="Noise level for one column (0 disables noise for it); repeatable")
+    parser.add_argument("--column-noise", default=None, help="JSON file mapping columns to noise levels")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) - 1))
+    args = parser.parse_args()
+
+    add_noise_to_dataset(
+        args.input,
+        args.output,
+        noise_level=args.noise_level,
+        seed=args.seed,
+        column_noise=parse_column_noise(args.column, args.column_noise),
+        chunksize=args.chunksize,
+        workers=args.workers
+    )
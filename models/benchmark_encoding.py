@@ -0,0 +1,145 @@
+"""
+Encoding benchmark: dense label codes vs. sparse one-hot vs. feature hashing.
+
+The food catalog is inflated to each requested size by splitting every food name
+into variants ("Kefir #17"), then each encoding is measured on one target:
+feature matrix memory, pickled encoder size, Logistic Regression fit time,
+held-out accuracy and single-row latency (encode + transform + predict), the
+path Predictor takes per request.
+
+    python models/benchmark_encoding.py --catalog-sizes 50 1000 5000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import encode_dataset, target_columns
+from models.sparse_encoding import build_feature_pipeline, fill_missing_categories, matrix_bytes, ENCODINGS
+
+
+def inflate_catalog(df, catalog_size, rng):
+    """Split each food name into variants until roughly catalog_size distinct names exist"""
+    names = df["food_name"].astype(str)
+    variants = max(1, catalog_size // names.nunique())
+    if variants == 1:
+        return df
+    df = df.copy()
+    df["food_name"] = names + " #" + rng.integers(0, variants, size=len(df)).astype(str)
+    return df
+
+
+def pickled_size(obj):
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.tell()
+
+
+def dense_encoding(df, target):
+    """The current path: LabelEncoder ordinals followed by StandardScaler"""
+    X, y, feature_columns, label_encoders, _ = encode_dataset(df.copy())
+    X_train, X_test, y_train, y_test = train_test_split(X, y[target], test_size=0.2, random_state=42)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_test = scaler.transform(X_test)
+
+    def encode_row(row):
+        encoded = pd.DataFrame([row], columns=feature_columns)
+        for col, encoder in label_encoders.items():
+            if col in encoded:
+                try:
+                    encoded[col] = encoder.transform(encoded[col])
+                except ValueError:
+                    encoded[col] = 0
+        return scaler.transform(encoded)
+
+    return X_train, X_test, y_train.to_numpy(), y_test.to_numpy(), (label_encoders, scaler), encode_row
+
+
+def sparse_encoding(df, target, encoding):
+    """CSR features from the sparse ColumnTransformer"""
+    pipeline, feature_columns = build_feature_pipeline(df, encoding)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[feature_columns], df[target], test_size=0.2, random_state=42
+    )
+    X_train = pipeline.fit_transform(X_train).tocsr()
+    X_test = pipeline.transform(X_test).tocsr()
+
+    def encode_row(row):
+        return pipeline.transform(pd.DataFrame([row], columns=feature_columns))
+
+    return X_train, X_test, y_train.to_numpy(), y_test.to_numpy(), pipeline, encode_row
+
+
+def run_benchmark(dataset, catalog_sizes, target, latency_rows):
+    base = pd.read_csv(dataset)
+    rng = np.random.default_rng(42)
+    rows = []
+    for catalog_size in catalog_sizes:
+        # Both paths see the same "None" category for missing values
+        df = fill_missing_categories(inflate_catalog(base, catalog_size, rng).copy())
+        raw_rows = df.drop(columns=target_columns + ["user_id", "name"]).head(latency_rows).to_dict("records")
+
+        for encoding in ["label"] + ENCODINGS:
+            if encoding == "label":
+                X_train, X_test, y_train, y_test, encoders, encode_row = dense_encoding(df, target)
+            else:
+                X_train, X_test, y_train, y_test, encoders, encode_row = sparse_encoding(df, target, encoding)
+
+            model = LogisticRegression(max_iter=1000)
+            start = time.perf_counter()
+            model.fit(X_train, y_train)
+            fit_time = time.perf_counter() - start
+            accuracy = accuracy_score(y_test, model.predict(X_test))
+
+            timings = []
+            for row in raw_rows:
+                start = time.perf_counter()
+                model.predict(encode_row(row))
+                timings.append(time.perf_counter() - start)
+            latency_ms = float(np.median(timings)) * 1000
+
+            result = {
+                "Catalog Size": int(df["food_name"].nunique()),
+                "Encoding": encoding,
+                "Features": X_train.shape[1],
+                "Matrix Memory (MB)": matrix_bytes(X_train) / 1e6,
+                "Encoder Size (KB)": pickled_size(encoders) / 1e3,
+                "Fit Time (s)": fit_time,
+                "Accuracy": accuracy,
+                "Latency (ms/row)": latency_ms
+            }
+            print(f"{result['Catalog Size']:>7} foods  {encoding:<8} {result['Features']:>6} features  "
+                  f"matrix {result['Matrix Memory (MB)']:7.2f} MB  encoders {result['Encoder Size (KB)']:8.1f} KB  "
+                  f"fit {fit_time:6.2f}s  accuracy {accuracy:.4f}  latency {latency_ms:.3f} ms/row")
+            rows.append(result)
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dense label encoding against sparse encodings")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv")
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[50, 1000, 5000])
+    parser.add_argument("--target", choices=target_columns, default="impact_on_cramps")
+    parser.add_argument("--latency-rows", type=int, default=200)
+    parser.add_argument("--output", default="models/trained_models/encoding_benchmark.csv")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.dataset, args.catalog_sizes, args.target, args.latency_rows)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Benchmark results saved to {args.output}")
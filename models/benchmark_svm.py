@@ -0,0 +1,79 @@
+"""
+Scaling benchmark: exact SVC(probability=True) vs. kernel-approximation SVMs.
+
+Fits each estimator on growing training sets (resampled from the dataset when a
+size exceeds it) and reports fit time and held-out accuracy for one target.
+
+    python models/benchmark_svm.py --sizes 1000 5000 10000 50000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import encode_dataset, target_columns
+from models.train_models import build_svm_approximation
+
+
+def run_benchmark(dataset, sizes, target, max_exact_rows, n_components):
+    df = pd.read_csv(dataset)
+    X, y, feature_columns, _, _ = encode_dataset(df)
+    y = y[target].to_numpy()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_test = scaler.transform(X_test)
+
+    estimators = {
+        "SVC (exact)": lambda: SVC(probability=True, random_state=42),
+        "Nystroem + linear SVM": lambda: build_svm_approximation("nystroem", len(feature_columns), n_components),
+        "RFF + linear SVM": lambda: build_svm_approximation("rff", len(feature_columns), n_components)
+    }
+
+    rng = np.random.default_rng(42)
+    rows = []
+    for size in sizes:
+        # Sample with replacement once the requested size exceeds the training split
+        idx = rng.choice(len(X_train), size=size, replace=size > len(X_train))
+        for name, make_estimator in estimators.items():
+            if name == "SVC (exact)" and size > max_exact_rows:
+                print(f"{size:>9} rows  {name:<22} skipped (over --max-exact-rows)")
+                continue
+            estimator = make_estimator()
+            start = time.perf_counter()
+            estimator.fit(X_train[idx], y_train[idx])
+            fit_time = time.perf_counter() - start
+            accuracy = accuracy_score(y_test, estimator.predict(X_test))
+            print(f"{size:>9} rows  {name:<22} fit {fit_time:8.2f}s  accuracy {accuracy:.4f}")
+            rows.append({"Rows": size, "Model": name, "Fit Time (s)": fit_time, "Accuracy": accuracy})
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SVC against kernel-approximation SVMs")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2500, 5000, 10000, 25000, 50000])
+    parser.add_argument("--target", choices=target_columns, default="impact_on_cramps")
+    parser.add_argument("--max-exact-rows", type=int, default=25000,
+                        help="Largest training set to fit with exact SVC")
+    parser.add_argument("--n-components", type=int, default=300)
+    parser.add_argument("--output", default="models/trained_models/svm_scaling_benchmark.csv")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.dataset, args.sizes, args.target, args.max_exact_rows, args.n_components)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Benchmark results saved to {args.output}")
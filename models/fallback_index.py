@@ -0,0 +1,143 @@
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_DATASET = "data/menstruation_food_recommendations_working.csv"
+DEFAULT_CACHE = "models/trained_models/fallback_index.pkl"
+
+NUMERIC_COLUMNS = [
+    "caffeine_content_mg",
+    "glycemic_index",
+    "inflammatory_index",
+    "calories_kcal"
+]
+
+TARGET_COLUMNS = [
+    "impact_on_cramps",
+    "impact_on_bloating",
+    "impact_on_headache",
+    "impact_on_mood_swings",
+    "impact_on_fatigue",
+    "impact_on_acne"
+]
+
+
+class FallbackIndex:
+    """
+    Nearest-neighbor predictor built from the training dataset
+
+    Every distinct catalog food keeps its label counts per symptom. A query looks
+    up the k nearest catalog foods (scaled numeric attributes, within the same
+    food category when possible) and returns the majority label per symptom.
+    Lookups only read precomputed arrays, so they are deterministic and thread-safe.
+    """
+
+    def __init__(self, dataset_path=DEFAULT_DATASET, k=3):
+        self.dataset_path = dataset_path
+        self.k = k
+        self.fingerprint = _fingerprint(dataset_path)
+
+        df = pd.read_csv(dataset_path, usecols=["food_category"] + NUMERIC_COLUMNS + TARGET_COLUMNS)
+        df["food_category"] = df["food_category"].str.lower()
+
+        self.means = df[NUMERIC_COLUMNS].mean().to_numpy(dtype=np.float64)
+        self.stds = df[NUMERIC_COLUMNS].std().replace(0, 1).to_numpy(dtype=np.float64)
+
+        # Label counts per distinct catalog food: shape (foods, targets, classes)
+        self.classes = sorted(set(np.unique(df[TARGET_COLUMNS].to_numpy())))
+        class_codes = {label: code for code, label in enumerate(self.classes)}
+        catalog = df.groupby(["food_category"] + NUMERIC_COLUMNS, sort=True)
+
+        keys = []
+        counts = []
+        for key, group in catalog:
+            food_counts = np.zeros((len(TARGET_COLUMNS), len(self.classes)), dtype=np.int32)
+            for t, col in enumerate(TARGET_COLUMNS):
+                for label, count in group[col].value_counts().items():
+                    food_counts[t, class_codes[label]] = count
+            keys.append(key)
+            counts.append(food_counts)
+
+        categories = np.array([key[0] for key in keys])
+        points = (np.array([key[1:] for key in keys], dtype=np.float64) - self.means) / self.stds
+        self.counts = np.stack(counts)
+
+        # One tree per category plus a global tree for unknown categories
+        self.buckets = {}
+        for category in sorted(set(categories)):
+            rows = np.flatnonzero(categories == category)
+            self.buckets[category] = (KDTree(points[rows]), rows)
+        self.global_bucket = (KDTree(points), np.arange(len(points)))
+
+    @classmethod
+    def load(cls, dataset_path=DEFAULT_DATASET, cache_path=DEFAULT_CACHE, k=3):
+        """Load the index from disk, rebuilding it if the dataset has changed"""
+        if os.path.exists(cache_path):
+            try:
+                index = joblib.load(cache_path)
+                if index.fingerprint == _fingerprint(dataset_path) and index.k == k:
+                    return index
+            except Exception as e:
+                log.warning("Ignoring unreadable fallback index cache", error=str(e))
+
+        index = cls(dataset_path, k=k)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            joblib.dump(index, cache_path)
+        except OSError as e:
+            log.warning("Could not cache fallback index", error=str(e))
+        return index
+
+    def _bucket_for(self, category):
+        category = str(category or "").lower()
+        if category in self.buckets:
+            return self.buckets[category]
+        # Match loosely named categories ("Fresh Fruits", "Spices") in a fixed order
+        for name in self.buckets:
+            if name in category or (category and category in name):
+                return self.buckets[name]
+        return self.global_bucket
+
+    def _vector(self, food_data):
+        values = []
+        for i, col in enumerate(NUMERIC_COLUMNS):
+            try:
+                values.append(float(food_data.get(col)))
+            except (TypeError, ValueError):
+                # Missing or non-numeric attribute: use the dataset mean
+                values.append(self.means[i])
+        return ((np.array(values) - self.means) / self.stds).reshape(1, -1)
+
+    def predict(self, food_data):
+        """Return the majority label per symptom among the k nearest catalog foods"""
+        tree, rows = self._bucket_for(food_data.get("food_category"))
+        k = min(self.k, len(rows))
+        _, neighbors = tree.query(self._vector(food_data), k=k)
+
+        votes = self.counts[rows[neighbors[0]]].sum(axis=0)
+        return {
+            col: self.classes[int(np.argmax(votes[t]))]
+            for t, col in enumerate(TARGET_COLUMNS)
+        }
+
+
+def _fingerprint(path):
+    """Identify a dataset file by size and modification time"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+if __name__ == "__main__":
+    index = FallbackIndex.load()
+    print(f"Fallback index built from {index.dataset_path}: "
+          f"{len(index.counts)} catalog foods in {len(index.buckets)} categories")
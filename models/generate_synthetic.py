@@ -0,0 +1,210 @@
+"""
+Synthetic dataset generator for production-scale experiments.
+
+Learns from the working dataset:
+  * users   - the joint (preference, age) distribution, one draw per user
+  * foods   - the catalog (attributes fixed per food_id) and how often each food appears
+  * labels  - the joint distribution of the six impact labels given (food_id, preference),
+              falling back to food_id alone for unseen combinations
+
+and synthesizes N users x M foods. Users are split into partitions that worker
+processes generate independently with numpy.random.default_rng([seed, partition]),
+so the output does not depend on the worker count. Partitions are written as
+Parquet when pyarrow is installed, otherwise as gzip-compressed CSV, together
+with a manifest.json. The output directory can be passed to
+`models/train_models.py --dataset` (or train_out_of_core.py) directly.
+
+    python models/generate_synthetic.py --users 100000 --foods-per-user 100 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import target_columns
+
+USER_COLUMNS = ["preference", "age"]
+FOOD_COLUMNS = [
+    "food_id", "food_name", "food_category", "food_subcategory", "processing_level",
+    "caffeine_content_mg", "flavor_profile", "common_allergens", "glycemic_index",
+    "inflammatory_index", "calories_kcal"
+]
+COLUMN_ORDER = ["user_id", "name"] + USER_COLUMNS + FOOD_COLUMNS + target_columns
+
+
+def learn_marginals(dataset_path):
+    """Empirical user, food and label distributions from the source dataset"""
+    df = pd.read_csv(dataset_path)
+
+    users = df.groupby("user_id")[USER_COLUMNS].first()
+    user_profiles = users.value_counts(normalize=True)
+
+    catalog = df.groupby("food_id")[FOOD_COLUMNS[1:]].first().reset_index()
+    popularity = df["food_id"].value_counts(normalize=True).reindex(catalog["food_id"]).to_numpy()
+
+    label_tuples = df[target_columns].apply(tuple, axis=1)
+    tuple_values = sorted(label_tuples.unique())
+    tuple_codes = label_tuples.map({value: code for code, value in enumerate(tuple_values)})
+
+    food_index = {food_id: i for i, food_id in enumerate(catalog["food_id"])}
+    preferences = sorted(df["preference"].unique())
+    preference_index = {value: i for i, value in enumerate(preferences)}
+
+    # label_probs[food, preference] is a distribution over label tuples
+    counts = np.zeros((len(catalog), len(preferences), len(tuple_values)))
+    np.add.at(
+        counts,
+        (df["food_id"].map(food_index).to_numpy(), df["preference"].map(preference_index).to_numpy(),
+         tuple_codes.to_numpy()),
+        1
+    )
+    food_counts = counts.sum(axis=1, keepdims=True)
+    unseen = counts.sum(axis=2, keepdims=True) == 0
+    counts = np.where(unseen, food_counts, counts)
+    label_probs = counts / counts.sum(axis=2, keepdims=True)
+
+    return {
+        "user_profiles": [list(profile) for profile in user_profiles.index],
+        "user_profile_probs": user_profiles.to_numpy(),
+        "preferences": preferences,
+        "catalog": catalog,
+        "popularity": popularity / popularity.sum(),
+        "label_tuples": np.array(tuple_values, dtype=object),
+        "label_probs": label_probs
+    }
+
+
+def sample_foods(rng, popularity, n_users, foods_per_user):
+    """Food indices per user, weighted by popularity and distinct while the catalog allows"""
+    n_foods = len(popularity)
+    if foods_per_user <= n_foods:
+        # Gumbel top-k: weighted sampling without replacement for every user at once
+        keys = np.log(popularity) + rng.gumbel(size=(n_users, n_foods))
+        return np.argpartition(-keys, foods_per_user - 1, axis=1)[:, :foods_per_user]
+    return rng.choice(n_foods, size=(n_users, foods_per_user), p=popularity)
+
+
+def generate_partition(marginals, first_user, n_users, foods_per_user, seed, partition):
+    """Rows for users first_user .. first_user + n_users - 1"""
+    rng = np.random.default_rng([seed, partition])
+    catalog = marginals["catalog"]
+
+    profiles = rng.choice(len(marginals["user_profiles"]), size=n_users, p=marginals["user_profile_probs"])
+    food_idx = sample_foods(rng, marginals["popularity"], n_users, foods_per_user).ravel()
+    user_idx = np.repeat(np.arange(n_users), foods_per_user)
+    user_ids = first_user + user_idx + 1
+
+    profile_values = [marginals["user_profiles"][i] for i in profiles]
+    preference = np.array([value[0] for value in profile_values], dtype=object)[user_idx]
+    age = np.array([value[1] for value in profile_values])[user_idx]
+    preference_idx = np.searchsorted(marginals["preferences"], preference)
+
+    # Labels: inverse-CDF sampling from each row's (food, preference) distribution
+    cdf = marginals["label_probs"][food_idx, preference_idx].cumsum(axis=1)
+    draws = rng.random(len(food_idx))[:, None]
+    label_codes = np.minimum((draws > cdf).sum(axis=1), cdf.shape[1] - 1)
+    labels = marginals["label_tuples"][label_codes]
+
+    rows = {
+        "user_id": user_ids,
+        "name": pd.Series(user_ids).map("User{}".format).to_numpy(),
+        "preference": preference,
+        "age": age
+    }
+    for col in FOOD_COLUMNS:
+        rows[col] = catalog[col].to_numpy()[food_idx]
+    for i, col in enumerate(target_columns):
+        rows[col] = np.array([label[i] for label in labels], dtype=object)
+    return pd.DataFrame(rows, columns=COLUMN_ORDER)
+
+
+def write_partition(task):
+    """Worker task: generate and write one partition, returning its file name and row count"""
+    marginals, output_dir, partition, first_user, n_users, foods_per_user, seed, file_format = task
+    df = generate_partition(marginals, first_user, n_users, foods_per_user, seed, partition)
+    if file_format == "parquet":
+        name = f"part-{partition:05d}.parquet"
+        df.to_parquet(os.path.join(output_dir, name), index=False, compression="snappy")
+    else:
+        name = f"part-{partition:05d}.csv.gz"
+        df.to_csv(os.path.join(output_dir, name), index=False, compression="gzip")
+    return name, len(df)
+
+
+def generate(dataset_path, output_dir, users, foods_per_user, seed=42, rows_per_partition=500000,
+             workers=1, file_format=None):
+    """Generate users x foods_per_user rows into partition files; returns the manifest"""
+    start = time.perf_counter()
+    file_format = file_format or ("parquet" if pyarrow is not None else "csv.gz")
+    if file_format == "parquet" and pyarrow is None:
+        raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Partitions from an earlier run (another format or partition count) would be read as part of this one
+    stale = [name for name in os.listdir(output_dir) if name.startswith("part-") or name == "manifest.json"]
+    for name in stale:
+        os.remove(os.path.join(output_dir, name))
+    if stale:
+        print(f"Removed {len(stale)} files from an earlier run in {output_dir}")
+
+    marginals = learn_marginals(dataset_path)
+    users_per_partition = max(1, rows_per_partition // foods_per_user)
+    tasks = [
+        (marginals, output_dir, partition, first_user, min(users_per_partition, users - first_user),
+         foods_per_user, seed, file_format)
+        for partition, first_user in enumerate(range(0, users, users_per_partition))
+    ]
+
+    print(f"Generating {users * foods_per_user} rows in {len(tasks)} {file_format} partitions "
+          f"on {workers} worker(s)...")
+    if workers <= 1:
+        parts = [write_partition(task) for task in tasks]
+    else:
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            parts = list(pool.imap(write_partition, tasks))
+
+    manifest = {
+        "source": dataset_path,
+        "users": users,
+        "foods_per_user": foods_per_user,
+        "rows": sum(rows for _, rows in parts),
+        "seed": seed,
+        "format": file_format,
+        "columns": COLUMN_ORDER,
+        "partitions": [{"file": name, "rows": rows} for name, rows in parts]
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Wrote {manifest['rows']} rows to {output_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset from the learned marginals")
+    parser.add_argument("--source", default="data/menstruation_food_recommendations_working.csv")
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--foods-per-user", type=int, default=20)
+    parser.add_argument("--rows-per-partition", type=int, default=500000)
+    parser.add_argument("--format", choices=["parquet", "csv.gz"], default=None,
+                        help="Defaults to parquet when pyarrow is installed, otherwise csv.gz")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) - 1))
+    args = parser.parse_args()
+
+    generate(args.source, args.output_dir, args.users, args.foods_per_user, seed=args.seed,
+             rows_per_partition=args.rows_per_partition, workers=args.workers, file_format=args.format)
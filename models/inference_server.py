@@ -0,0 +1,230 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import itertools
+from collections import deque
+
+import numpy as np
+
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+# Control message asking the worker to reload the model artifacts
+RELOAD = "__reload__"
+
+
+def _serve(request_queue, response_queue, max_batch_size, max_wait, cache_size):
+    """Worker process loop: gather requests into micro-batches and predict them together"""
+    # Imported here so the parent process never loads the model itself
+    from models.predict import Predictor
+
+    predictor = Predictor(cache_size=cache_size)
+    response_queue.put(("ready", None, None, None))
+
+    stopping = False
+    while not stopping:
+        item = request_queue.get()
+        if item is None:
+            break
+        if item[0] == RELOAD:
+            predictor.load_model()
+            continue
+        batch = [item]
+        reload_after = False
+
+        # Keep collecting until the batch is full or the oldest request has waited long enough
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = request_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            if item[0] == RELOAD:
+                reload_after = True
+                break
+            batch.append(item)
+
+        request_ids = [request_id for request_id, _ in batch]
+        try:
+            results = predictor.predict_batch([food_data for _, food_data in batch])
+        except Exception as e:
+            log.warning("Error in inference worker", error=str(e))
+            results = [None] * len(batch)
+        response_queue.put((request_ids, results, len(batch), predictor.cache_info()))
+        if reload_after:
+            predictor.load_model()
+
+
+class _PendingRequest:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.submitted_at = time.perf_counter()
+
+
+class InferenceServer:
+    """
+    Runs the Predictor in a dedicated worker process and batches concurrent requests
+
+    Request threads call predict() exactly like Predictor.predict(); calls arriving
+    within max_wait_ms of each other are answered by one batched model call.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=2.0, cache_size=1024, timeout=10.0, stats_window=10000):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+        self.timeout = timeout
+
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._process = None
+        self._dispatcher = None
+
+        # Statistics
+        self._latencies = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._completed = 0
+        self._batches = 0
+        self._started_at = None
+        self._worker_cache = {}
+
+    def start(self):
+        """Start the worker process and wait until the model is loaded"""
+        ctx = mp.get_context("spawn")
+        self._request_queue = ctx.Queue()
+        self._response_queue = ctx.Queue()
+        self._process = ctx.Process(
+            target=_serve,
+            args=(self._request_queue, self._response_queue, self.max_batch_size, self.max_wait, self.cache_size),
+            daemon=True
+        )
+        self._process.start()
+
+        self._dispatcher = threading.Thread(target=self._dispatch_responses, daemon=True)
+        self._dispatcher.start()
+
+        if not self._ready.wait(timeout=120):
+            self.stop()
+            raise RuntimeError("Inference worker did not start")
+        self._started_at = time.perf_counter()
+        return self
+
+    def _dispatch_responses(self):
+        """Hand batched results back to the threads waiting on them"""
+        while True:
+            try:
+                message = self._response_queue.get()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            request_ids, results, batch_size, cache_info = message
+            if request_ids == "ready":
+                self._ready.set()
+                continue
+
+            now = time.perf_counter()
+            with self._lock:
+                self._batches += 1
+                self._batch_sizes.append(batch_size)
+                self._worker_cache = cache_info
+                for request_id, result in zip(request_ids, results):
+                    pending = self._pending.pop(request_id, None)
+                    if pending is None:
+                        continue
+                    pending.result = result
+                    self._completed += 1
+                    self._latencies.append(now - pending.submitted_at)
+                    pending.event.set()
+
+    def is_alive(self):
+        """Whether the worker process is running"""
+        return self._process is not None and self._process.is_alive()
+
+    def predict(self, food_data):
+        """Queue a single prediction and block until its batch has been evaluated"""
+        if not self.is_alive():
+            raise RuntimeError("Inference worker is not running")
+
+        request_id = next(self._ids)
+        pending = _PendingRequest()
+        with self._lock:
+            self._pending[request_id] = pending
+        self._request_queue.put((request_id, food_data))
+
+        if not pending.event.wait(timeout=self.timeout):
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise TimeoutError("Timed out waiting for the inference worker")
+        if pending.result is None:
+            raise RuntimeError("Inference worker failed to predict")
+        return pending.result
+
+    def stats(self):
+        """Return throughput, latency percentiles and batch size statistics"""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+            batch_sizes = np.array(self._batch_sizes)
+            completed = self._completed
+            batches = self._batches
+            queued = len(self._pending)
+            worker_cache = dict(self._worker_cache)
+
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return {
+            "mode": "process",
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "completed": completed,
+            "batches": batches,
+            "in_flight": queued,
+            "throughput_per_s": completed / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                "p99": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+                "max": float(latencies.max()) if len(latencies) else 0.0
+            },
+            "batch_size": {
+                "mean": float(batch_sizes.mean()) if len(batch_sizes) else 0.0,
+                "max": int(batch_sizes.max()) if len(batch_sizes) else 0,
+                "histogram": {str(size): int(count) for size, count in zip(*np.unique(batch_sizes, return_counts=True))}
+            },
+            "prediction_cache": worker_cache
+        }
+
+    def load_model(self):
+        """Ask the worker to reload the model artifacts after the batch in progress"""
+        self._request_queue.put((RELOAD, None))
+
+    def stop(self):
+        """Stop the worker process after it finishes the batch in progress"""
+        if self._process is None:
+            return
+        try:
+            if self._process.is_alive():
+                self._request_queue.put(None)
+                self._process.join(timeout=5)
+        finally:
+            if self._process.is_alive():
+                self._process.terminate()
+            # A killed worker can leave the queue locks held, so never wait on the feeder threads at exit
+            self._request_queue.cancel_join_thread()
+            self._response_queue.cancel_join_thread()
+            self._response_queue.put(None)
+            self._process = None
+            # Requests still waiting on this worker fail now instead of at their timeout
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for request in pending.values():
+                request.event.set()
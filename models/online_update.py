@@ -0,0 +1,212 @@
+"""
+Incremental model updates from user-confirmed feedback.
+
+Each run reads the prediction_feedback rows added since the last checkpoint,
+partial_fits the online model on them and publishes a new model version only if
+it is at least as accurate as the served model on the feedback holdout (every
+fifth feedback row). Run it from cron, or let app.py schedule it with
+ONLINE_UPDATE_INTERVAL_MINUTES.
+
+    python models/online_update.py --db food_predictions.db
+"""
+import argparse
+import copy
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.multioutput import MultiOutputClassifier
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.predict import Predictor
+from models.preprocessing import preprocess
+from models.sparse_encoding import preprocess_sparse
+from observability.log import get_logger
+
+log = get_logger(__name__)
+
+MODELS_DIR = "models/trained_models"
+ONLINE_MODEL_PATH = os.path.join(MODELS_DIR, "online_model.pkl")
+CHECKPOINT_PATH = os.path.join(MODELS_DIR, "online_checkpoint.json")
+VERSIONS_DIR = os.path.join(MODELS_DIR, "versions")
+
+HOLDOUT_EVERY = 5
+HOLDOUT_LIMIT = 2000
+BOOTSTRAP_EPOCHS = 5
+
+
+def load_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH, "r") as f:
+            return json.load(f)
+    return {"last_feedback_id": 0, "version": 0}
+
+
+def save_checkpoint(checkpoint):
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def encode_feedback(predictor, rows):
+    """
+    Turn feedback rows into scaled features and target codes using the served encoders.
+
+    Rows that cannot be encoded (a non-numeric attribute, an unknown impact) are
+    logged and skipped, so one bad row cannot stall every later run. Returns
+    (X, y, skipped); X and y are None when no row could be encoded.
+    """
+    encoded = []
+    targets = []
+    skipped = 0
+    for row_id, food_data, confirmed in rows:
+        try:
+            row = predictor._encode_food_data(json.loads(food_data))
+            # Transformed alone first, so a bad value fails here and not for the whole batch
+            predictor._transform(row)
+            confirmed = json.loads(confirmed)
+            target = [
+                predictor.target_encoders[col].transform([confirmed[col]])[0]
+                for col in predictor.target_columns
+            ]
+        except (ValueError, TypeError, KeyError) as e:
+            skipped += 1
+            log.warning("Skipping feedback row", feedback_id=row_id, error=str(e))
+            continue
+        encoded.append(row)
+        targets.append(target)
+    if not encoded:
+        return None, None, skipped
+    X = predictor._transform(pd.concat(encoded, ignore_index=True))
+    return X, np.array(targets), skipped
+
+
+def accuracy(model, X, y):
+    """Mean per-target accuracy"""
+    return float(np.mean(model.predict(X) == y))
+
+
+def bootstrap_online_model(predictor, dataset_path):
+    """Start the online model from the training data when no incremental model exists yet"""
+    if hasattr(predictor.model, "partial_fit"):
+        return copy.deepcopy(predictor.model)
+
+    log.info("Bootstrapping online model from the training dataset")
+    if predictor.feature_pipeline is not None:
+        data = preprocess_sparse(dataset_path, pipeline=predictor.feature_pipeline)
+    else:
+        data = preprocess(dataset_path)
+    classes = [np.arange(len(predictor.target_encoders[col].classes_)) for col in predictor.target_columns]
+    model = MultiOutputClassifier(SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42))
+    y_train = data["y_train"].to_numpy()
+    for _ in range(BOOTSTRAP_EPOCHS):
+        model.partial_fit(data["X_train"], y_train, classes=classes)
+    return model
+
+
+def publish(model, version):
+    """Write a versioned copy and atomically swap it in as the served model"""
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version_path = os.path.join(VERSIONS_DIR, f"model_v{version}.pkl")
+    joblib.dump(model, version_path)
+
+    tmp_path = os.path.join(MODELS_DIR, "best_model.pkl.tmp")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, os.path.join(MODELS_DIR, "best_model.pkl"))
+    return version_path
+
+
+def run_update(db_path="food_predictions.db", dataset_path="menstruation_food_recommendations_noisy.csv",
+               tolerance=0.0):
+    """
+    Train on feedback added since the last checkpoint and publish if the holdout check passes.
+
+    Returns a summary dict; 'published' is True when best_model.pkl was replaced.
+    """
+    start = time.perf_counter()
+    checkpoint = load_checkpoint()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        new_rows = conn.execute(
+            'SELECT id, food_data, confirmed_results FROM prediction_feedback WHERE id > ? ORDER BY id',
+            (checkpoint["last_feedback_id"],)
+        ).fetchall()
+        if not new_rows:
+            return {"status": "no_new_feedback", "published": False, "version": checkpoint["version"]}
+        last_id = new_rows[-1][0]
+        holdout_rows = conn.execute(
+            'SELECT id, food_data, confirmed_results FROM prediction_feedback WHERE id % ? = 0 AND id <= ? '
+            'ORDER BY id DESC LIMIT ?',
+            (HOLDOUT_EVERY, last_id, HOLDOUT_LIMIT)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    predictor = Predictor(cache_size=0)
+    if predictor.using_fallback:
+        return {"status": "no_base_model", "published": False, "version": checkpoint["version"]}
+
+    train_rows = [row for row in new_rows if row[0] % HOLDOUT_EVERY != 0]
+
+    if os.path.exists(ONLINE_MODEL_PATH):
+        online_model = joblib.load(ONLINE_MODEL_PATH)
+    else:
+        online_model = bootstrap_online_model(predictor, dataset_path)
+
+    # Learn from the new rows; the online state always advances, publishing is gated below
+    X_new, y_new, skipped = encode_feedback(predictor, train_rows)
+    if X_new is not None:
+        classes = [np.arange(len(predictor.target_encoders[col].classes_)) for col in predictor.target_columns]
+        online_model.partial_fit(X_new, y_new, classes=classes)
+    joblib.dump(online_model, ONLINE_MODEL_PATH)
+
+    X_holdout, y_holdout, skipped_holdout = encode_feedback(predictor, holdout_rows)
+    summary = {
+        "status": "updated",
+        "new_rows": len(new_rows),
+        "trained_rows": len(train_rows) - skipped,
+        "holdout_rows": len(holdout_rows) - skipped_holdout,
+        "skipped_rows": skipped + skipped_holdout,
+        "published": False,
+        "version": checkpoint["version"]
+    }
+
+    if X_holdout is not None:
+        served_accuracy = accuracy(predictor.model, X_holdout, y_holdout)
+        candidate_accuracy = accuracy(online_model, X_holdout, y_holdout)
+        summary.update({"served_accuracy": served_accuracy, "candidate_accuracy": candidate_accuracy})
+
+        if candidate_accuracy + tolerance >= served_accuracy:
+            checkpoint["version"] += 1
+            summary["model_path"] = publish(online_model, checkpoint["version"])
+            summary["published"] = True
+            summary["version"] = checkpoint["version"]
+    else:
+        summary["status"] = "no_holdout"
+
+    checkpoint["last_feedback_id"] = last_id
+    save_checkpoint(checkpoint)
+
+    summary["elapsed_s"] = time.perf_counter() - start
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the model from user feedback")
+    parser.add_argument("--db", default="food_predictions.db")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv",
+                        help="Training CSV used to bootstrap the first online model")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Publish if the candidate is within this accuracy of the served model")
+    args = parser.parse_args()
+    print(json.dumps(run_update(args.db, args.dataset, args.tolerance), indent=2))
@@ -3,24 +3,36 @@ import joblib
 import os
 import numpy as np
 import random
+import threading
+import zlib
+from collections import OrderedDict
+
+from models.fallback_index import FallbackIndex
+from observability.log import get_logger
+from observability.timing import span
+
+log = get_logger(__name__)
+
+MODEL_PATH = "models/trained_models/best_model.pkl"
 
 class Predictor:
-    def __init__(self):
-        try:
-            self.model = joblib.load("models/trained_models/best_model.pkl")
-            self.scaler = joblib.load("models/trained_models/scaler.pkl")
-            self.label_encoders = joblib.load("models/trained_models/label_encoders.pkl")
-            self.target_encoders = joblib.load("models/trained_models/target_encoders.pkl")
-            
-            # Load feature columns
-            with open("models/trained_models/feature_columns.txt", "r") as f:
-                self.feature_columns = f.read().split(",")
-            
-            self.using_fallback = False
-        except Exception as e:
-            print(f"Error loading trained model: {str(e)}")
-            print("Using fallback prediction behavior")
-            self.using_fallback = True
+    def __init__(self, cache_size=1024):
+        # Bounded LRU of encoded feature rows -> decoded predictions
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # Bumped whenever the cache is emptied, so predictions started before that are not stored
+        self._cache_generation = 0
+        
+        # Dataset nearest-neighbor index, built lazily when a fallback is needed
+        self._fallback_index = None
+        self._fallback_index_failed = False
+        self._fallback_lock = threading.Lock()
+        
+        # Set by load_model when the trained model uses sparse encoding
+        self.feature_pipeline = None
         
         # Target columns
         self.target_columns = [
@@ -31,9 +43,106 @@ class Predictor:
             "impact_on_fatigue",
             "impact_on_acne"
         ]
+        
+        self.load_model()
+    
+    def load_model(self):
+        """Load (or reload) the trained artifacts and drop cached predictions"""
+        # Everything is loaded before anything is replaced, so requests keep using the old model meanwhile
+        artifacts = None
+        try:
+            model = joblib.load(MODEL_PATH)
+            
+            # Sparse models ship a fitted ColumnTransformer instead of label encoders and a scaler
+            pipeline_path = "models/trained_models/feature_pipeline.pkl"
+            if os.path.exists(pipeline_path):
+                feature_pipeline = joblib.load(pipeline_path)
+                scaler = None
+                label_encoders = {}
+            else:
+                feature_pipeline = None
+                scaler = joblib.load("models/trained_models/scaler.pkl")
+                label_encoders = joblib.load("models/trained_models/label_encoders.pkl")
+            target_encoders = joblib.load("models/trained_models/target_encoders.pkl")
+            
+            # Load feature columns
+            with open("models/trained_models/feature_columns.txt", "r") as f:
+                feature_columns = f.read().split(",")
+            
+            artifacts = (model, feature_pipeline, scaler, label_encoders, target_encoders, feature_columns)
+        except Exception as e:
+            log.warning("Error loading trained model, using fallback prediction behavior", error=str(e))
+        
+        # Swap in the new model and an empty cache together; cached answers belong to the previous model
+        with self._cache_lock:
+            if artifacts is not None:
+                (self.model, self.feature_pipeline, self.scaler, self.label_encoders,
+                 self.target_encoders, self.feature_columns) = artifacts
+            self.using_fallback = artifacts is None
+            self._reset_cache()
+    
+    def warm_up(self):
+        """Load what is otherwise loaded on first use, so a pre-forking server does it once in the master"""
+        self._get_fallback_index()
+    
+    def clear_cache(self):
+        """Empty the prediction cache and reset its statistics"""
+        with self._cache_lock:
+            self._reset_cache()
+    
+    def _reset_cache(self):
+        # Callers hold _cache_lock
+        self._cache = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_generation += 1
+    
+    def cache_info(self):
+        """Return hit/miss statistics for the prediction cache"""
+        with self._cache_lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "size": len(self._cache),
+                "maxsize": self.cache_size,
+                "hit_rate": self._cache_hits / lookups if lookups else 0.0
+            }
+    
+    def _cache_key(self, encoded_data):
+        """Build a cache key from the raw bytes of the encoded feature row"""
+        if self.feature_pipeline is not None:
+            # Raw values (strings included) feed the sparse pipeline
+            return repr(encoded_data.to_numpy(dtype=object).tolist()).encode("utf-8")
+        return np.ascontiguousarray(encoded_data.to_numpy(dtype=np.float64)).tobytes()
+    
+    def _cache_get(self, key):
+        with self._cache_lock:
+            results = self._cache.get(key)
+            if results is None:
+                self._cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+            return dict(results)
+    
+    def _cache_put(self, key, results, generation):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            # Computed before a reload, possibly with the previous model
+            if generation != self._cache_generation:
+                return
+            self._cache[key] = dict(results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
     
     def _encode_food_data(self, food_data):
         """Encode food data using trained label encoders"""
+        if self.feature_pipeline is not None:
+            return self._raw_food_data(food_data)
+        
         # Create a DataFrame with all features
         input_df = pd.DataFrame([food_data])
         
@@ -44,7 +153,7 @@ class Predictor:
                     input_df[col] = self.label_encoders[col].transform(input_df[col])
                 except ValueError:
                     # If value not seen during training, set to most common value
-                    print(f"Warning: Unknown category in {col}. Using default value.")
+                    log.debug("Unknown category, using default value", column=col)
                     input_df[col] = 0
         
         # Ensure all feature columns are present
@@ -57,6 +166,30 @@ class Predictor:
         
         return input_df
     
+    def _raw_food_data(self, food_data):
+        """Order raw food attributes for the sparse pipeline, which encodes them itself"""
+        numeric_columns = set()
+        for name, _, columns in self.feature_pipeline.transformers_:
+            if name == "numeric":
+                numeric_columns.update(columns)
+        
+        row = {}
+        for col in self.feature_columns:
+            value = food_data.get(col)
+            missing = value is None or (isinstance(value, float) and np.isnan(value))
+            if col in numeric_columns:
+                row[col] = 0 if missing else value
+            else:
+                # Missing categories were encoded as "None" in training; unknown ones are ignored
+                row[col] = "None" if missing else value
+        return pd.DataFrame([row], columns=self.feature_columns)
+    
+    def _transform(self, encoded_data):
+        """Scale dense rows, or encode raw rows into a CSR matrix"""
+        if self.feature_pipeline is not None:
+            return self.feature_pipeline.transform(encoded_data)
+        return self.scaler.transform(encoded_data)
+    
     def _decode_predictions(self, predictions):
         """Decode prediction values to original labels"""
         results = {}
@@ -69,17 +202,41 @@ class Predictor:
         
         return results
     
+    def _get_fallback_index(self):
+        """Load the dataset nearest-neighbor index on first use"""
+        if self._fallback_index is None and not self._fallback_index_failed:
+            with self._fallback_lock:
+                if self._fallback_index is None and not self._fallback_index_failed:
+                    try:
+                        self._fallback_index = FallbackIndex.load()
+                    except Exception as e:
+                        log.warning("Error loading fallback index", error=str(e))
+                        self._fallback_index_failed = True
+        return self._fallback_index
+    
     def _get_fallback_predictions(self, food_data):
-        """Generate fallback predictions based on food category"""
-        print(f"Generating fallback predictions for: {food_data}")
+        """Generate fallback predictions from the nearest catalog foods"""
+        log.debug("Generating fallback predictions", food_data=food_data)
+        
+        fallback_index = self._get_fallback_index()
+        if fallback_index is not None:
+            try:
+                return fallback_index.predict(food_data)
+            except Exception as e:
+                log.warning("Error in fallback index lookup", error=str(e))
+        
+        return self._get_category_predictions(food_data)
+    
+    def _get_category_predictions(self, food_data):
+        """Generate category-weighted predictions when the dataset is unavailable"""
         impact_options = ["Beneficial", "Neutral", "Harmful"]
         
-        # For consistent results, seed random with food name
-        food_name = food_data.get("food_name", "unknown")
-        random.seed(hash(food_name))
+        # For consistent results across processes, seed a private generator with a stable hash
+        food_name = str(food_data.get("food_name", "unknown"))
+        rng = random.Random(zlib.crc32(food_name.encode("utf-8")))
         
         # Deterministic but looks realistic
-        category = food_data.get("food_category", "").lower()
+        category = str(food_data.get("food_category", "")).lower()
         results = {}
         
         # Default is mostly neutral
@@ -108,7 +265,7 @@ class Predictor:
         
         # Generate predictions for each symptom
         for col in self.target_columns:
-            results[col] = random.choices(impact_options, weights=dist)[0]
+            results[col] = rng.choices(impact_options, weights=dist)[0]
         
         return results
     
@@ -123,23 +280,97 @@ class Predictor:
             Dictionary with predicted impact values
         """
         try:
+            generation = self._cache_generation
             if self.using_fallback:
                 return self._get_fallback_predictions(food_data)
                 
             # Encode input data
-            encoded_data = self._encode_food_data(food_data)
+            with span('encode'):
+                encoded_data = self._encode_food_data(food_data)
+            
+            # Identical encoded rows always yield the same answer
+            cache_key = self._cache_key(encoded_data)
+            cached_results = self._cache_get(cache_key)
+            if cached_results is not None:
+                return cached_results
             
             # Scale features
-            scaled_data = self.scaler.transform(encoded_data)
+            with span('scale'):
+                scaled_data = self._transform(encoded_data)
             
             # Make prediction
-            predictions = self.model.predict(scaled_data)
+            with span('model'):
+                predictions = self.model.predict(scaled_data)
             
             # Decode predictions
-            results = self._decode_predictions(predictions)
+            with span('decode'):
+                results = self._decode_predictions(predictions)
+            self._cache_put(cache_key, results, generation)
             
             return results
         except Exception as e:
-            print(f"Error in prediction: {str(e)}")
+            log.warning("Error in prediction", error=str(e))
             # Fallback to random predictions
-            return self._get_fallback_predictions(food_data) 
\ No newline at end of file
+            return self._get_fallback_predictions(food_data)
+    
+    def predict_batch(self, food_data_list):
+        """
+        Make predictions for several food items with a single model call
+        
+        Args:
+            food_data_list: List of dictionaries containing food attributes
+        
+        Returns:
+            List of dictionaries with predicted impact values, in input order
+        """
+        generation = self._cache_generation
+        if self.using_fallback:
+            return [self._get_fallback_predictions(food_data) for food_data in food_data_list]
+        
+        results = [None] * len(food_data_list)
+        
+        # Encode every row and group cache misses by key so duplicates are predicted once
+        pending = OrderedDict()
+        for index, food_data in enumerate(food_data_list):
+            try:
+                encoded_data = self._encode_food_data(food_data)
+                cache_key = self._cache_key(encoded_data)
+            except Exception as e:
+                log.warning("Error encoding batch item", error=str(e))
+                results[index] = self._get_fallback_predictions(food_data)
+                continue
+            
+            cached_results = self._cache_get(cache_key)
+            if cached_results is not None:
+                results[index] = cached_results
+            elif cache_key in pending:
+                pending[cache_key][1].append(index)
+            else:
+                pending[cache_key] = (encoded_data, [index])
+        
+        if not pending:
+            return results
+        
+        try:
+            batch_data = pd.concat([encoded for encoded, _ in pending.values()], ignore_index=True)
+            scaled_data = self._transform(batch_data)
+            predictions = self.model.predict(scaled_data)
+            
+            # Decode each target column in one call
+            decoded_columns = [
+                self.target_encoders[col].inverse_transform(predictions[:, i])
+                for i, col in enumerate(self.target_columns)
+            ]
+            
+            for row, (cache_key, (_, indexes)) in enumerate(pending.items()):
+                row_results = {col: decoded_columns[i][row] for i, col in enumerate(self.target_columns)}
+                self._cache_put(cache_key, row_results, generation)
+                for index in indexes:
+                    results[index] = dict(row_results)
+        except Exception as e:
+            log.warning("Error in batch prediction", error=str(e))
+            for _, indexes in pending.values():
+                for index in indexes:
+                    results[index] = self._get_fallback_predictions(food_data_list[index])
+        
+        return results
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+# Bump when the encoding logic changes so old cache entries are ignored
+PREPROCESSING_VERSION = 1
+
+CACHE_DIR = "models/trained_models/preprocessing_cache"
+
+# Partition files read from a dataset directory (see generate_synthetic.py)
+PARTITION_SUFFIXES = (".parquet", ".csv.gz", ".csv")
+
+# Label codes are stored in float32 features, which represent integers exactly up to 2**24
+MAX_FEATURE_CATEGORIES = 2 ** 24
+
+# Define target variables
+target_columns = [
+    "impact_on_cramps",
+    "impact_on_bloating",
+    "impact_on_headache",
+    "impact_on_mood_swings",
+    "impact_on_fatigue",
+    "impact_on_acne"
+]
+
+def encode_dataset(df):
+    """Label-encode categorical features and targets, returning X, y and the fitted encoders"""
+    # Encode categorical features
+    categorical_cols = df.select_dtypes(include=['object']).columns
+    label_encoders = {}
+
+    for col in categorical_cols:
+        if col not in target_columns:
+            le = LabelEncoder()
+            df[col] = le.fit_transform(df[col])
+            label_encoders[col] = le
+
+    # Encode target variables
+    target_encoders = {}
+    for col in target_columns:
+        le = LabelEncoder()
+        df[col] = le.fit_transform(df[col])
+        target_encoders[col] = le
+
+    # Define features
+    feature_columns = [col for col in df.columns if col not in target_columns and col not in ['user_id', 'name']]
+
+    return df[feature_columns], df[target_columns], feature_columns, label_encoders, target_encoders
+
+def dataset_files(dataset_path):
+    """A CSV file, or the partition files of a dataset directory (those listed in its manifest.json, if any)"""
+    if os.path.isdir(dataset_path):
+        manifest_path = os.path.join(dataset_path, "manifest.json")
+        if os.path.exists(manifest_path):
+            # Files left over from an earlier generation are not part of the dataset
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            return [os.path.join(dataset_path, part["file"]) for part in manifest["partitions"]]
+        return [
+            os.path.join(dataset_path, name) for name in sorted(os.listdir(dataset_path))
+            if name.endswith(PARTITION_SUFFIXES)
+        ]
+    return [dataset_path]
+
+def read_dataset(dataset_path, nrows=None, dtype=None):
+    """Load a CSV file or a directory of .parquet / .csv.gz partitions into one DataFrame"""
+    frames = []
+    remaining = nrows
+    for path in dataset_files(dataset_path):
+        if path.endswith(".parquet"):
+            frame = pd.read_parquet(path)
+            if remaining is not None:
+                frame = frame.head(remaining)
+            if dtype is not None:
+                frame = frame.astype(dtype)
+        else:
+            frame = pd.read_csv(path, nrows=remaining, dtype=dtype)
+        frames.append(frame)
+        if remaining is not None:
+            remaining -= len(frame)
+            if remaining <= 0:
+                break
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def fingerprint_file(path, chunk_size=1 << 20):
+    """SHA-256 of the file contents (or of every partition of a dataset directory), read in chunks"""
+    digest = hashlib.sha256()
+    for part in dataset_files(path):
+        digest.update(os.path.basename(part).encode("utf-8"))
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(dataset_path, test_size, random_state):
+    """Key derived from the dataset contents and every setting that shapes the matrices"""
+    config = {
+        "version": PREPROCESSING_VERSION,
+        "dataset": fingerprint_file(dataset_path),
+        "test_size": test_size,
+        "random_state": random_state
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+def preprocess(dataset_path, test_size=0.2, random_state=42, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    Encode, split and scale the dataset, reusing cached matrices when possible.
+
+    dataset_path may be a CSV file or a directory of partition files.
+
+    Returns a dict with the scaled train/test matrices, the encoded targets as
+    DataFrames, the feature columns and the fitted encoders and scaler. Results
+    are cached as .npz (matrices) plus a joblib pickle (encoders and scaler);
+    editing the CSV changes its fingerprint and therefore the cache key.
+    """
+    key = cache_key(dataset_path, test_size, random_state)
+    matrices_path = os.path.join(cache_dir, f"{key}.npz")
+    encoders_path = os.path.join(cache_dir, f"{key}.pkl")
+
+    if use_cache and os.path.exists(matrices_path) and os.path.exists(encoders_path):
+        print(f"Using cached preprocessing {key}")
+        with np.load(matrices_path, allow_pickle=False) as matrices:
+            data = {name: matrices[name] for name in matrices.files}
+        data.update(joblib.load(encoders_path))
+        data["feature_columns"] = [str(col) for col in data["feature_columns"]]
+        data["y_train"] = pd.DataFrame(data["y_train"], columns=target_columns)
+        data["y_test"] = pd.DataFrame(data["y_test"], columns=target_columns)
+        return data
+
+    # Load the dataset
+    print("Loading dataset...")
+    df = read_dataset(dataset_path)
+
+    # Print dataset info
+    print(f"Dataset shape: {df.shape}")
+    print(f"Target columns: {target_columns}")
+
+    X, y, feature_columns, label_encoders, target_encoders = encode_dataset(df)
+
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    # Scale features
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    data = {
+        "X_train": X_train_scaled,
+        "X_test": X_test_scaled,
+        "y_train": y_train.reset_index(drop=True),
+        "y_test": y_test.reset_index(drop=True),
+        "feature_columns": feature_columns,
+        "label_encoders": label_encoders,
+        "target_encoders": target_encoders,
+        "scaler": scaler
+    }
+
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(
+            matrices_path,
+            X_train=X_train_scaled,
+            X_test=X_test_scaled,
+            y_train=data["y_train"].to_numpy(),
+            y_test=data["y_test"].to_numpy(),
+            feature_columns=np.array(feature_columns)
+        )
+        joblib.dump(
+            {"label_encoders": label_encoders, "target_encoders": target_encoders, "scaler": scaler},
+            encoders_path
+        )
+        print(f"Cached preprocessing {key} in {cache_dir}")
+
+    return data
+
+def compact_dtypes(dataset_path, sample_rows=1000):
+    """Explicit per-column dtypes for streaming reads: categoricals and 32-bit floats"""
+    sample = read_dataset(dataset_path, nrows=sample_rows)
+    dtypes = {}
+    for col in sample.columns:
+        if sample[col].dtype == object or col in target_columns:
+            dtypes[col] = "category"
+        else:
+            dtypes[col] = "float32"
+    return dtypes
+
+def estimate_row_bytes(dataset_path, dtypes, sample_rows=1000):
+    """Approximate in-memory size of one row read with the given dtypes"""
+    sample = read_dataset(dataset_path, nrows=sample_rows, dtype=dtypes)
+    return max(1, int(sample.memory_usage(deep=True).sum() / max(1, len(sample))))
+
+def iter_chunks(dataset_path, chunksize, dtypes):
+    """Stream the dataset (a CSV or every partition of a directory) in chunks read with compact dtypes"""
+    for path in dataset_files(dataset_path):
+        if path.endswith(".parquet"):
+            # Partitions are written small enough to load one at a time
+            frame = pd.read_parquet(path).astype(dtypes)
+            for start in range(0, len(frame), chunksize):
+                yield frame.iloc[start:start + chunksize]
+        else:
+            yield from pd.read_csv(path, chunksize=chunksize, dtype=dtypes)
+
+def build_encoders(dataset_path, chunksize, dtypes, feature_columns):
+    """
+    First streaming pass: collect every category and fit LabelEncoders without loading the file.
+
+    Classes are sorted exactly as LabelEncoder.fit would sort them, with a
+    missing value (NaN) last, so the encoders are interchangeable. Only the
+    feature and target columns are collected; unused ones such as the per-user
+    name would otherwise grow with the number of users.
+    """
+    categories = {
+        col: set() for col in feature_columns + target_columns if dtypes.get(col) == "category"
+    }
+    has_missing = {col: False for col in categories}
+    n_rows = 0
+    for chunk in iter_chunks(dataset_path, chunksize, dtypes):
+        n_rows += len(chunk)
+        for col in categories:
+            categories[col].update(chunk[col].cat.categories)
+            has_missing[col] = has_missing[col] or bool(chunk[col].isna().any())
+
+    label_encoders = {}
+    target_encoders = {}
+    for col, values in categories.items():
+        le = LabelEncoder()
+        classes = sorted(values)
+        le.classes_ = np.array(classes + [np.nan] if has_missing[col] else classes, dtype=object)
+        if col not in target_columns and len(le.classes_) > MAX_FEATURE_CATEGORIES:
+            raise ValueError(f"{col} has {len(le.classes_)} categories; "
+                             f"float32 features hold codes only up to {MAX_FEATURE_CATEGORIES}")
+        if col in target_columns:
+            target_encoders[col] = le
+        else:
+            label_encoders[col] = le
+    return label_encoders, target_encoders, n_rows
+
+def encode_chunk(chunk, label_encoders, target_encoders, feature_columns):
+    """Encode one chunk into float32 features and int8 target codes"""
+    def codes(series, encoder):
+        known = [c for c in encoder.classes_ if isinstance(c, str)]
+        values = pd.Categorical(series, categories=known).codes.astype(np.int32)
+        # LabelEncoder places NaN last; unseen values also fall back there (or to 0)
+        values[values < 0] = len(encoder.classes_) - 1 if len(known) < len(encoder.classes_) else 0
+        return values
+
+    X = np.empty((len(chunk), len(feature_columns)), dtype=np.float32)
+    for i, col in enumerate(feature_columns):
+        if col in label_encoders:
+            X[:, i] = codes(chunk[col], label_encoders[col])
+        else:
+            X[:, i] = chunk[col].to_numpy(dtype=np.float32)
+    y = np.column_stack([codes(chunk[col], target_encoders[col]).astype(np.int8) for col in target_columns])
+    return X, y
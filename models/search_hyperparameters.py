@@ -0,0 +1,199 @@
+"""
+Hyperparameter search with successive halving.
+
+Each candidate model is tuned with HalvingRandomSearchCV: many configurations
+start on a small subset of the training rows and only the best third advance to
+the next, larger subset. Trials run in parallel across --workers processes, the
+cross-validation folds are computed once and cached next to the preprocessing
+cache, and Gradient Boosting uses early stopping (n_iter_no_change).
+
+The winning configurations go to best_params.json and every trial to
+search_log.csv in the artifact directory; apply them with
+`python models/train_models.py --params models/trained_models/best_params.json`.
+Each configuration includes the fixed settings it was searched with (e.g. the
+early-stopping parameters), so train_models.py rebuilds the model that won.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform, randint, uniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, KFold
+from sklearn.metrics import make_scorer
+from sklearn.linear_model import LogisticRegression
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.svm import SVC
+from sklearn.multioutput import MultiOutputClassifier
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import preprocess, cache_key, CACHE_DIR
+
+OUTPUT_DIR = "models/trained_models"
+
+# Search spaces use the MultiOutputClassifier "estimator__" prefix so they apply to every target
+SEARCH_SPACES = {
+    "Logistic Regression": (
+        MultiOutputClassifier(LogisticRegression(max_iter=1000)),
+        {"estimator__C": loguniform(1e-3, 1e2)}
+    ),
+    "Random Forest": (
+        MultiOutputClassifier(RandomForestClassifier(random_state=42)),
+        {
+            "estimator__n_estimators": randint(50, 400),
+            "estimator__max_depth": [None, 8, 16, 32],
+            "estimator__min_samples_leaf": randint(1, 10),
+            "estimator__max_features": ["sqrt", "log2", None]
+        }
+    ),
+    "Gradient Boosting": (
+        # Early stopping: n_estimators is an upper bound, boosting stops once a
+        # 10% validation split stops improving for 10 rounds
+        MultiOutputClassifier(GradientBoostingClassifier(
+            n_estimators=500, n_iter_no_change=10, validation_fraction=0.1, random_state=42
+        )),
+        {
+            "estimator__learning_rate": loguniform(0.01, 0.3),
+            "estimator__max_depth": randint(2, 6),
+            "estimator__subsample": uniform(0.6, 0.4)
+        }
+    ),
+    "SVM": (
+        # Probabilities are not needed to rank configurations; train_models.py refits with them
+        MultiOutputClassifier(SVC(random_state=42)),
+        {
+            "estimator__C": loguniform(1e-2, 1e2),
+            "estimator__gamma": loguniform(1e-3, 1e0)
+        }
+    )
+}
+
+
+def mean_target_accuracy(y_true, y_pred):
+    """Accuracy averaged over all six targets (train_models.py's selection metric)"""
+    return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+
+def cached_folds(dataset_path, n_rows, n_splits, seed):
+    """Compute the CV fold indices once per preprocessed dataset and reuse them"""
+    folds_path = os.path.join(CACHE_DIR, f"{cache_key(dataset_path, 0.2, 42)}_folds{n_splits}_{seed}.npz")
+    if os.path.exists(folds_path):
+        with np.load(folds_path) as saved:
+            return [(saved[f"train_{i}"], saved[f"test_{i}"]) for i in range(n_splits)]
+
+    folds = list(KFold(n_splits=n_splits, shuffle=True, random_state=seed).split(np.arange(n_rows)))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    arrays = {}
+    for i, (train_idx, test_idx) in enumerate(folds):
+        arrays[f"train_{i}"] = train_idx
+        arrays[f"test_{i}"] = test_idx
+    np.savez(folds_path, **arrays)
+    return folds
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    data = preprocess(args.dataset)
+    X_train, y_train = data["X_train"], data["y_train"].to_numpy()
+    folds = cached_folds(args.dataset, len(X_train), args.folds, args.seed)
+    scorer = make_scorer(mean_target_accuracy)
+
+    best_params = {
+        "dataset": args.dataset,
+        "preprocessing_key": cache_key(args.dataset, 0.2, 42),
+        "seed": args.seed,
+        "n_candidates": args.n_candidates,
+        "factor": args.factor,
+        "folds": args.folds,
+        "models": {}
+    }
+    log_frames = []
+
+    names = args.models or list(SEARCH_SPACES)
+    for name in names:
+        estimator, space = SEARCH_SPACES[name]
+        print(f"Searching {name}...")
+        start = time.perf_counter()
+        search = HalvingRandomSearchCV(
+            estimator,
+            space,
+            n_candidates=args.n_candidates,
+            factor=args.factor,
+            resource="n_samples",
+            min_resources=args.min_resources,
+            cv=folds,
+            scoring=scorer,
+            n_jobs=args.workers,
+            random_state=args.seed,
+            refit=False
+        )
+        search.fit(X_train, y_train)
+        elapsed = time.perf_counter() - start
+
+        print(f"{name} - best score {search.best_score_:.4f} in {elapsed:.1f}s "
+              f"({len(search.cv_results_['params'])} trials over {search.n_iterations_} rounds)")
+        print(f"{name} - best params {search.best_params_}")
+
+        # Fixed settings first, so train_models.py does not fall back to its own (e.g. no early stopping)
+        params = dict(fixed_params(estimator), **search.best_params_)
+        best_params["models"][name] = {
+            "params": {key: _to_builtin(value) for key, value in params.items()},
+            "score": float(search.best_score_),
+            "search_seconds": elapsed
+        }
+
+        log = pd.DataFrame(search.cv_results_)
+        log_frames.append(pd.DataFrame({
+            "Model": name,
+            "Round": log["iter"],
+            "Rows": log["n_resources"],
+            "Params": [json.dumps({k: _to_builtin(v) for k, v in p.items()}) for p in log["params"]],
+            "Mean Score": log["mean_test_score"],
+            "Std Score": log["std_test_score"],
+            "Fit Time (s)": log["mean_fit_time"]
+        }))
+
+    with open(os.path.join(args.output_dir, "best_params.json"), "w") as f:
+        json.dump(best_params, f, indent=2)
+    pd.concat(log_frames, ignore_index=True).to_csv(os.path.join(args.output_dir, "search_log.csv"), index=False)
+    print(f"Best parameters saved to {os.path.join(args.output_dir, 'best_params.json')}")
+    print(f"Search log saved to {os.path.join(args.output_dir, 'search_log.csv')}")
+
+
+def fixed_params(estimator):
+    """Settings of the per-target estimator that differ from scikit-learn's defaults"""
+    base = estimator.estimator
+    defaults = type(base)().get_params(deep=False)
+    return {
+        f"estimator__{key}": value
+        for key, value in base.get_params(deep=False).items()
+        if value != defaults.get(key)
+    }
+
+
+def _to_builtin(value):
+    """Convert numpy scalars so parameters serialize to JSON"""
+    return value.item() if hasattr(value, "item") else value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv")
+    parser.add_argument("--models", nargs="+", choices=list(SEARCH_SPACES), default=None)
+    parser.add_argument("--n-candidates", type=int, default=27,
+                        help="Configurations sampled per model in the first round")
+    parser.add_argument("--factor", type=int, default=3,
+                        help="Only 1/factor of the configurations advance; their data budget grows by factor")
+    parser.add_argument("--min-resources", type=int, default=500,
+                        help="Training rows per configuration in the first round")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=-1, help="Parallel trials (-1 for all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer, LabelEncoder, OneHotEncoder, StandardScaler
+
+from models.preprocessing import read_dataset, target_columns
+
+# Columns whose cardinality grows with the food catalog
+HIGH_CARDINALITY_COLUMNS = ["food_name", "food_id"]
+
+ENCODINGS = ["hashing", "onehot"]
+
+def fill_missing_categories(df):
+    """Missing categoricals become their own "None" category instead of NaN"""
+    for col in df.columns:
+        if df[col].dtype == object and col not in target_columns:
+            df[col] = df[col].fillna("None")
+    return df
+
+def to_categories(X):
+    """Treat every value as a category string, rounding numeric ids to integers"""
+    X = pd.DataFrame(X)
+    for col in X.columns:
+        if pd.api.types.is_numeric_dtype(X[col]):
+            X[col] = X[col].round().astype("Int64")
+        X[col] = X[col].astype(str)
+    return X
+
+def to_tokens(X):
+    """Turn each row into "column=value" strings for FeatureHasher"""
+    X = to_categories(X)
+    for col in X.columns:
+        X[col] = f"{col}=" + X[col]
+    return X.to_numpy().tolist()
+
+def build_feature_pipeline(df, encoding="hashing", n_hash_features=2 ** 12):
+    """
+    Sparse feature pipeline producing CSR matrices.
+
+    High-cardinality columns are feature-hashed into a fixed number of columns
+    (or one-hot encoded); the remaining categoricals are one-hot encoded with
+    unknown categories ignored, and numeric columns are standardized.
+    """
+    feature_columns = [col for col in df.columns if col not in target_columns and col not in ['user_id', 'name']]
+    high_cardinality = [col for col in feature_columns if col in HIGH_CARDINALITY_COLUMNS]
+    categorical = [col for col in feature_columns
+                   if col not in high_cardinality and df[col].dtype == object]
+    numeric = [col for col in feature_columns if col not in high_cardinality and col not in categorical]
+
+    if encoding == "hashing":
+        high_cardinality_encoder = make_pipeline(
+            FunctionTransformer(to_tokens),
+            FeatureHasher(n_features=n_hash_features, input_type="string", alternate_sign=False)
+        )
+    elif encoding == "onehot":
+        high_cardinality_encoder = make_pipeline(
+            FunctionTransformer(to_categories),
+            OneHotEncoder(handle_unknown="ignore", dtype=np.float32)
+        )
+    else:
+        raise ValueError(f"Unknown encoding: {encoding}")
+
+    pipeline = ColumnTransformer(
+        [
+            ("high_cardinality", high_cardinality_encoder, high_cardinality),
+            ("categorical", OneHotEncoder(handle_unknown="ignore", dtype=np.float32), categorical),
+            ("numeric", StandardScaler(), numeric)
+        ],
+        sparse_threshold=1.0
+    )
+    return pipeline, feature_columns
+
+def preprocess_sparse(dataset_path, encoding="hashing", test_size=0.2, random_state=42, pipeline=None):
+    """
+    Sparse counterpart of preprocessing.preprocess.
+
+    Returns the same keys, with CSR train/test matrices and the fitted
+    'feature_pipeline' in place of the label encoders and scaler. Pass an
+    already fitted pipeline to encode new data exactly as a served model does.
+    """
+    print("Loading dataset...")
+    df = read_dataset(dataset_path)
+    print(f"Dataset shape: {df.shape}")
+
+    fill_missing_categories(df)
+
+    target_encoders = {}
+    for col in target_columns:
+        le = LabelEncoder()
+        df[col] = le.fit_transform(df[col])
+        target_encoders[col] = le
+
+    if pipeline is None:
+        pipeline, feature_columns = build_feature_pipeline(df, encoding)
+        fitted = False
+    else:
+        feature_columns = list(pipeline.feature_names_in_)
+        fitted = True
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[feature_columns], df[target_columns], test_size=test_size, random_state=random_state
+    )
+    if fitted:
+        X_train_sparse = pipeline.transform(X_train).tocsr()
+    else:
+        X_train_sparse = pipeline.fit_transform(X_train).tocsr()
+    X_test_sparse = pipeline.transform(X_test).tocsr()
+    print(f"Sparse features: {X_train_sparse.shape[1]} columns, "
+          f"density {X_train_sparse.nnz / np.prod(X_train_sparse.shape):.4f}")
+
+    return {
+        "X_train": X_train_sparse,
+        "X_test": X_test_sparse,
+        "y_train": y_train.reset_index(drop=True),
+        "y_test": y_test.reset_index(drop=True),
+        "feature_columns": feature_columns,
+        "target_encoders": target_encoders,
+        "feature_pipeline": pipeline
+    }
+
+def matrix_bytes(X):
+    """Memory held by a dense array or CSR matrix"""
+    if hasattr(X, "indptr"):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
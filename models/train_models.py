@@ -1,204 +1,354 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.svm import SVC
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.pipeline import make_pipeline
 from sklearn.metrics import roc_curve, auc, accuracy_score, precision_score, recall_score, f1_score, classification_report
 from sklearn.multioutput import MultiOutputClassifier
+from sklearn.base import clone
+from joblib import Parallel, delayed
 import joblib
+import argparse
+import io
+import json
 import os
+import sys
+import threading
+import time
 
-# Create directories if they don't exist
-os.makedirs("models/trained_models", exist_ok=True)
-os.makedirs("static/images", exist_ok=True)
-
-# Load the dataset
-print("Loading dataset...")
-df = pd.read_csv("menstruation_food_recommendations_noisy.csv")
-
-# Define target variables
-target_columns = [
-    "impact_on_cramps",
-    "impact_on_bloating",
-    "impact_on_headache",
-    "impact_on_mood_swings",
-    "impact_on_fatigue",
-    "impact_on_acne"
-]
-
-# Print dataset info
-print(f"Dataset shape: {df.shape}")
-print(f"Target columns: {target_columns}")
-
-# Encode categorical features
-categorical_cols = df.select_dtypes(include=['object']).columns
-label_encoders = {}
-
-for col in categorical_cols:
-    if col not in target_columns:
-        le = LabelEncoder()
-        df[col] = le.fit_transform(df[col])
-        label_encoders[col] = le
-
-# Encode target variables
-target_encoders = {}
-for col in target_columns:
-    le = LabelEncoder()
-    df[col] = le.fit_transform(df[col])
-    target_encoders[col] = le
-
-# Save label encoders
-joblib.dump(label_encoders, "models/trained_models/label_encoders.pkl")
-joblib.dump(target_encoders, "models/trained_models/target_encoders.pkl")
-
-# Define features
-feature_columns = [col for col in df.columns if col not in target_columns and col not in ['user_id', 'name']]
-
-# Split data
-X = df[feature_columns]
-y = df[target_columns]
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Scale features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-# Save scaler
-joblib.dump(scaler, "models/trained_models/scaler.pkl")
-
-# Define models to train
-models = {
-    "Logistic Regression": MultiOutputClassifier(LogisticRegression(max_iter=1000)),
-    "Random Forest": MultiOutputClassifier(RandomForestClassifier(n_estimators=100, random_state=42)),
-    "Gradient Boosting": MultiOutputClassifier(GradientBoostingClassifier(n_estimators=100, random_state=42)),
-    "SVM": MultiOutputClassifier(SVC(probability=True, random_state=42))
-}
-
-# Dictionary to store results
-results = {}
-best_model_name = None
-best_score = 0
-
-# Train and evaluate each model
-for name, model in models.items():
-    print(f"Training {name}...")
-    model.fit(X_train_scaled, y_train)
-    
-    # Predict on test set
-    y_pred = model.predict(X_test_scaled)
-    
-    # Calculate metrics for each target separately and average
-    accuracies = []
-    precisions = []
-    recalls = []
-    f1s = []
-    
-    for i in range(y_test.shape[1]):
-        accuracies.append(accuracy_score(y_test.iloc[:, i], y_pred[:, i]))
-        precisions.append(precision_score(y_test.iloc[:, i], y_pred[:, i], 
-                        average='weighted', zero_division=0))
-        recalls.append(recall_score(y_test.iloc[:, i], y_pred[:, i], 
-                      average='weighted', zero_division=0))
-        f1s.append(f1_score(y_test.iloc[:, i], y_pred[:, i], 
-                  average='weighted', zero_division=0))
-    
-    accuracy = np.mean(accuracies)
-    precision = np.mean(precisions)
-    recall = np.mean(recalls)
-    f1 = np.mean(f1s)
-    
-    print(f"{name} - Accuracy: {accuracy:.4f}, Precision: {precision:.4f}, Recall: {recall:.4f}, F1: {f1:.4f}")
-    
-    # Store results
-    results[name] = {
-        'model': model,
-        'accuracy': accuracy,
-        'precision': precision,
-        'recall': recall,
-        'f1': f1,
-        'y_pred_proba': model.predict_proba(X_test_scaled)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import preprocess, target_columns
+from models.sparse_encoding import preprocess_sparse, ENCODINGS
+
+def build_svm_approximation(method, n_features, n_components=300):
+    """
+    RBF kernel approximation feeding a linear SVM (SGD, hinge loss) with sigmoid-calibrated probabilities.
+
+    Fit cost grows linearly with rows, unlike SVC(probability=True).
+    """
+    gamma = 1.0 / n_features  # matches SVC(gamma='scale') on standardized features
+    if method == "nystroem":
+        feature_map = Nystroem(gamma=gamma, n_components=n_components, random_state=42)
+    elif method == "rff":
+        feature_map = RBFSampler(gamma=gamma, n_components=n_components, random_state=42)
+    else:
+        raise ValueError(f"Unknown SVM approximation: {method}")
+    return make_pipeline(
+        feature_map,
+        CalibratedClassifierCV(SGDClassifier(loss="hinge", random_state=42), method="sigmoid", cv=3)
+    )
+
+def build_models(svm_approximation=None, n_features=None):
+    """Define models to train"""
+    if svm_approximation:
+        svm_name = f"SVM ({svm_approximation})"
+        svm = build_svm_approximation(svm_approximation, n_features)
+    else:
+        svm_name = "SVM"
+        svm = SVC(probability=True, random_state=42)
+    return {
+        "Logistic Regression": MultiOutputClassifier(LogisticRegression(max_iter=1000)),
+        "Random Forest": MultiOutputClassifier(RandomForestClassifier(n_estimators=100, random_state=42)),
+        "Gradient Boosting": MultiOutputClassifier(GradientBoostingClassifier(n_estimators=100, random_state=42)),
+        svm_name: MultiOutputClassifier(svm)
     }
-    
-    # Update best model
-    if accuracy > best_score:
-        best_score = accuracy
-        best_model_name = name
-
-# Print classification report for best model
-best_model = results[best_model_name]['model']
-y_pred = best_model.predict(X_test_scaled)
-print(f"\nBest model: {best_model_name} with accuracy {best_score:.4f}")
-print("\nClassification Report for Best Model:")
-for i, target in enumerate(target_columns):
-    print(f"\nTarget: {target}")
-    print(classification_report(y_test.iloc[:, i], y_pred[:, i], zero_division=0))
-
-# Save best model
-joblib.dump(best_model, f"models/trained_models/best_model.pkl")
-print(f"Best model saved: {best_model_name}")
-
-# Save feature columns
-with open("models/trained_models/feature_columns.txt", "w") as f:
-    f.write(",".join(feature_columns))
-
-# Plot ROC curves for all models
-plt.figure(figsize=(15, 10))
-
-for target_idx, target in enumerate(target_columns):
-    plt.subplot(2, 3, target_idx + 1)
-    
-    for name in models.keys():
-        # Get binary predictions for this target
-        y_test_binary = y_test.iloc[:, target_idx]
-        y_score = results[name]['y_pred_proba'][target_idx]
-        
-        # Calculate ROC curve
-        fpr = {}
-        tpr = {}
-        roc_auc = {}
-        
-        for i in range(len(np.unique(y_test_binary))):
-            # Convert to one-vs-rest for ROC
-            y_binary = (y_test_binary == i).astype(int)
-            if y_score.shape[1] > i:  # Check if the model has predictions for this class
-                fpr[i], tpr[i], _ = roc_curve(y_binary, y_score[:, i])
-                roc_auc[i] = auc(fpr[i], tpr[i])
-        
-        # Plot ROC curve for each class
-        for i in range(len(np.unique(y_test_binary))):
-            if i in roc_auc:
-                plt.plot(fpr[i], tpr[i], lw=2, 
-                         label=f'{name} - Class {i} (AUC = {roc_auc[i]:.2f})')
-    
-    plt.plot([0, 1], [0, 1], 'k--', lw=2)
-    plt.xlim([0.0, 1.0])
-    plt.ylim([0.0, 1.05])
-    plt.xlabel('False Positive Rate')
-    plt.ylabel('True Positive Rate')
-    plt.title(f'ROC Curve - {target}')
-    plt.legend(loc="lower right", fontsize='small')
-
-plt.tight_layout()
-plt.savefig("static/images/roc_curves.png")
-print("ROC curves saved to static/images/roc_curves.png")
-
-# Create a summary of model performances
-summary_df = pd.DataFrame({
-    'Model': list(results.keys()),
-    'Accuracy': [results[model]['accuracy'] for model in results],
-    'Precision': [results[model]['precision'] for model in results],
-    'Recall': [results[model]['recall'] for model in results],
-    'F1 Score': [results[model]['f1'] for model in results]
-})
-
-summary_df.to_csv("models/trained_models/model_performance.csv", index=False)
-print("Model performance summary saved to models/trained_models/model_performance.csv")
-
-print("\nTraining complete!")
-print(f"Best model: {best_model_name}")
-print(f"Saved to: models/trained_models/best_model.pkl") 
\ No newline at end of file
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def fit_target(name, target_idx, estimator, X, y, sample_interval=0.005):
+    """
+    Fit one candidate on one target, recording fit time and peak RSS growth.
+
+    RSS is sampled from a thread while the fit runs, so native allocations
+    (Cython trees, BLAS buffers) count too.
+    """
+    baseline = current_rss()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(sample_interval):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True) if baseline is not None else None
+    if sampler is not None:
+        sampler.start()
+    start = time.perf_counter()
+    estimator.fit(X, y)
+    fit_time = time.perf_counter() - start
+    done.set()
+    if sampler is None:
+        return name, target_idx, estimator, fit_time, None
+    sampler.join()
+    peak_memory = max(peak[0], current_rss()) - baseline
+    return name, target_idx, estimator, fit_time, peak_memory
+
+def fit_candidates(models, X_train, y_train, n_jobs=1):
+    """
+    Fit every (candidate, target) pair, spreading them across a process pool.
+
+    Each MultiOutputClassifier is reassembled from its per-target estimators, so
+    the saved model is identical to one fitted serially.
+    """
+    tasks = [
+        delayed(fit_target)(name, i, clone(model.estimator), X_train, y_train.iloc[:, i].to_numpy())
+        for name, model in models.items()
+        for i in range(y_train.shape[1])
+    ]
+    fitted = Parallel(n_jobs=n_jobs)(tasks)
+
+    fit_stats = {}
+    for name, model in models.items():
+        parts = sorted((r for r in fitted if r[0] == name), key=lambda r: r[1])
+        model.estimators_ = [estimator for _, _, estimator, _, _ in parts]
+        model.n_features_in_ = X_train.shape[1]
+        fit_stats[name] = {
+            'fit_time': sum(fit_time for _, _, _, fit_time, _ in parts),
+            'peak_memory': None if parts[0][4] is None else max(peak for _, _, _, _, peak in parts)
+        }
+    return fit_stats
+
+def measure_latency(model, X, n_rows=100):
+    """Median single-row prediction latency in milliseconds"""
+    timings = []
+    for row in X[:n_rows]:
+        start = time.perf_counter()
+        model.predict(row.reshape(1, -1))
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def artifact_size(model):
+    """Size in bytes of the pickled model"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+def select_best_model(results, latency_budget_ms=None):
+    """Pick the most accurate model, optionally only among those within a latency budget"""
+    candidates = list(results)
+    if latency_budget_ms is not None:
+        candidates = [name for name in results if results[name]['latency_ms'] <= latency_budget_ms]
+        if not candidates:
+            fastest = min(results, key=lambda name: results[name]['latency_ms'])
+            print(f"No model meets the {latency_budget_ms} ms latency budget; using the fastest ({fastest})")
+            return fastest
+    return max(candidates, key=lambda name: results[name]['accuracy'])
+
+def main(args):
+    # Create directories if they don't exist
+    os.makedirs("models/trained_models", exist_ok=True)
+    os.makedirs("static/images", exist_ok=True)
+
+    pipeline_path = "models/trained_models/feature_pipeline.pkl"
+    if args.encoding == "label":
+        # Encode, split and scale (cached by dataset fingerprint)
+        data = preprocess(args.dataset, use_cache=not args.no_cache)
+    else:
+        # Sparse CSR features from a fitted ColumnTransformer
+        data = preprocess_sparse(args.dataset, encoding=args.encoding)
+    X_train_scaled, X_test_scaled = data['X_train'], data['X_test']
+    y_train, y_test = data['y_train'], data['y_test']
+    feature_columns = data['feature_columns']
+
+    joblib.dump(data['target_encoders'], "models/trained_models/target_encoders.pkl")
+    if args.encoding == "label":
+        # Save label encoders
+        joblib.dump(data['label_encoders'], "models/trained_models/label_encoders.pkl")
+
+        # Save scaler
+        joblib.dump(data['scaler'], "models/trained_models/scaler.pkl")
+
+        # Predictor switches to the sparse path whenever a feature pipeline is present
+        if os.path.exists(pipeline_path):
+            os.remove(pipeline_path)
+    else:
+        joblib.dump(data['feature_pipeline'], pipeline_path)
+
+    models = build_models(args.svm_approximation, n_features=X_train_scaled.shape[1])
+
+    # Apply tuned hyperparameters from search_hyperparameters.py
+    if args.params:
+        with open(args.params, "r") as f:
+            tuned = json.load(f)["models"]
+        for name, model in models.items():
+            if name in tuned:
+                model.set_params(**tuned[name]["params"])
+                print(f"Using tuned parameters for {name}: {tuned[name]['params']}")
+        for name in tuned:
+            if name not in models:
+                # e.g. "SVM" was tuned as SVC, but --svm-approximation trains "SVM (nystroem)"
+                print(f"Warning: tuned parameters for {name} not applied, no candidate of that name is trained")
+
+    # Train every candidate/target pair, in parallel when more than one worker is requested
+    print(f"Training {len(models)} models on {args.workers} worker(s)...")
+    start = time.perf_counter()
+    fit_stats = fit_candidates(models, X_train_scaled, y_train, n_jobs=args.workers)
+    print(f"Training finished in {time.perf_counter() - start:.1f}s")
+
+    # Dictionary to store results
+    results = {}
+
+    # Evaluate each model
+    for name, model in models.items():
+        # Predict on test set
+        y_pred = model.predict(X_test_scaled)
+
+        # Calculate metrics for each target separately and average
+        accuracies = []
+        precisions = []
+        recalls = []
+        f1s = []
+
+        for i in range(y_test.shape[1]):
+            accuracies.append(accuracy_score(y_test.iloc[:, i], y_pred[:, i]))
+            precisions.append(precision_score(y_test.iloc[:, i], y_pred[:, i],
+                            average='weighted', zero_division=0))
+            recalls.append(recall_score(y_test.iloc[:, i], y_pred[:, i],
+                          average='weighted', zero_division=0))
+            f1s.append(f1_score(y_test.iloc[:, i], y_pred[:, i],
+                      average='weighted', zero_division=0))
+
+        accuracy = np.mean(accuracies)
+        precision = np.mean(precisions)
+        recall = np.mean(recalls)
+        f1 = np.mean(f1s)
+        latency_ms = measure_latency(model, X_test_scaled)
+
+        print(f"{name} - Accuracy: {accuracy:.4f}, Precision: {precision:.4f}, Recall: {recall:.4f}, F1: {f1:.4f}")
+        peak_memory = fit_stats[name]['peak_memory']
+        print(f"{name} - Fit: {fit_stats[name]['fit_time']:.2f}s, Latency: {latency_ms:.3f} ms/row, "
+              f"Peak RSS growth: {'n/a' if peak_memory is None else f'{peak_memory / 1e6:.1f} MB'}")
+
+        # Store results
+        results[name] = {
+            'model': model,
+            'accuracy': accuracy,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+            'fit_time': fit_stats[name]['fit_time'],
+            'latency_ms': latency_ms,
+            'peak_memory': fit_stats[name]['peak_memory'],
+            'artifact_size': artifact_size(model),
+            'y_pred_proba': model.predict_proba(X_test_scaled)
+        }
+
+    # Select best model
+    best_model_name = select_best_model(results, args.latency_budget_ms)
+    best_score = results[best_model_name]['accuracy']
+
+    # Print classification report for best model
+    best_model = results[best_model_name]['model']
+    y_pred = best_model.predict(X_test_scaled)
+    print(f"\nBest model: {best_model_name} with accuracy {best_score:.4f}")
+    print("\nClassification Report for Best Model:")
+    for i, target in enumerate(target_columns):
+        print(f"\nTarget: {target}")
+        print(classification_report(y_test.iloc[:, i], y_pred[:, i], zero_division=0))
+
+    # Save best model
+    joblib.dump(best_model, f"models/trained_models/best_model.pkl")
+    print(f"Best model saved: {best_model_name}")
+
+    # Save feature columns
+    with open("models/trained_models/feature_columns.txt", "w") as f:
+        f.write(",".join(feature_columns))
+
+    # Plot ROC curves for all models
+    plt.figure(figsize=(15, 10))
+
+    for target_idx, target in enumerate(target_columns):
+        plt.subplot(2, 3, target_idx + 1)
+
+        for name in models.keys():
+            # Get binary predictions for this target
+            y_test_binary = y_test.iloc[:, target_idx]
+            y_score = results[name]['y_pred_proba'][target_idx]
+
+            # Calculate ROC curve
+            fpr = {}
+            tpr = {}
+            roc_auc = {}
+
+            for i in range(len(np.unique(y_test_binary))):
+                # Convert to one-vs-rest for ROC
+                y_binary = (y_test_binary == i).astype(int)
+                if y_score.shape[1] > i:  # Check if the model has predictions for this class
+                    fpr[i], tpr[i], _ = roc_curve(y_binary, y_score[:, i])
+                    roc_auc[i] = auc(fpr[i], tpr[i])
+
+            # Plot ROC curve for each class
+            for i in range(len(np.unique(y_test_binary))):
+                if i in roc_auc:
+                    plt.plot(fpr[i], tpr[i], lw=2,
+                             label=f'{name} - Class {i} (AUC = {roc_auc[i]:.2f})')
+
+        plt.plot([0, 1], [0, 1], 'k--', lw=2)
+        plt.xlim([0.0, 1.0])
+        plt.ylim([0.0, 1.05])
+        plt.xlabel('False Positive Rate')
+        plt.ylabel('True Positive Rate')
+        plt.title(f'ROC Curve - {target}')
+        plt.legend(loc="lower right", fontsize='small')
+
+    plt.tight_layout()
+    plt.savefig("static/images/roc_curves.png")
+    print("ROC curves saved to static/images/roc_curves.png")
+
+    # Create a summary of model performances
+    summary_df = pd.DataFrame({
+        'Model': list(results.keys()),
+        'Accuracy': [results[model]['accuracy'] for model in results],
+        'Precision': [results[model]['precision'] for model in results],
+        'Recall': [results[model]['recall'] for model in results],
+        'F1 Score': [results[model]['f1'] for model in results],
+        'Fit Time (s)': [results[model]['fit_time'] for model in results],
+        'Predict Latency (ms/row)': [results[model]['latency_ms'] for model in results],
+        'Peak RSS Growth (MB)': [np.nan if results[model]['peak_memory'] is None else results[model]['peak_memory'] / 1e6
+                                 for model in results],
+        'Artifact Size (KB)': [results[model]['artifact_size'] / 1e3 for model in results]
+    })
+
+    summary_df.to_csv("models/trained_models/model_performance.csv", index=False)
+    print("Model performance summary saved to models/trained_models/model_performance.csv")
+
+    print("\nTraining complete!")
+    print(f"Best model: {best_model_name}")
+    print(f"Saved to: models/trained_models/best_model.pkl")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and compare food impact models")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv",
+                        help="Training CSV")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore and do not write the preprocessing cache")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used to fit candidates and targets in parallel (-1 for all cores)")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="Only select models whose single-row prediction latency fits this budget")
+    parser.add_argument("--params", default=None,
+                        help="best_params.json written by search_hyperparameters.py")
+    parser.add_argument("--svm-approximation", choices=["nystroem", "rff"], default=None,
+                        help="Replace SVC(probability=True) with a kernel approximation and calibrated linear SVM")
+    parser.add_argument("--encoding", choices=["label"] + ENCODINGS, default="label",
+                        help="Feature encoding: dense label codes, or sparse CSR with hashed/one-hot food columns")
+    main(parser.parse_args())
@@ -0,0 +1,142 @@
+"""
+Out-of-core training for datasets larger than memory.
+
+The CSV is streamed in chunks sized from a memory budget and read with compact
+dtypes (categoricals and float32). A first pass builds the label encoders, a
+second fits the scaler incrementally, and further passes train estimators that
+support partial_fit. Every fifth row is held out for evaluation. The artifacts
+use the same layout as train_models.py, so Predictor loads them unchanged.
+
+    python models/train_out_of_core.py --dataset big.csv --memory-budget-mb 256
+"""
+import argparse
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+
+# Add the project root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.preprocessing import (
+    target_columns, compact_dtypes, estimate_row_bytes, iter_chunks, build_encoders, encode_chunk
+)
+
+# Working copies per chunk: raw frame, encoded float32, scaled float64 and estimator scratch space
+CHUNK_OVERHEAD = 6
+
+ESTIMATORS = {
+    "sgd": lambda: SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42),
+    "naive_bayes": lambda: GaussianNB()
+}
+
+
+def chunk_size_for_budget(dataset_path, dtypes, memory_budget_mb):
+    """Rows per chunk so one chunk and its working copies fit in the memory budget"""
+    row_bytes = estimate_row_bytes(dataset_path, dtypes) + 8 * len(dtypes)
+    return max(100, int(memory_budget_mb * 1024 * 1024 / (row_bytes * CHUNK_OVERHEAD)))
+
+
+def split_holdout(X, y, offset, holdout_every=5):
+    """Deterministically hold out every n-th row of the file"""
+    holdout = (np.arange(offset, offset + len(X)) % holdout_every) == 0
+    return X[~holdout], y[~holdout], X[holdout], y[holdout]
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    dtypes = compact_dtypes(args.dataset)
+    chunksize = chunk_size_for_budget(args.dataset, dtypes, args.memory_budget_mb)
+    print(f"Streaming {args.dataset} in chunks of {chunksize} rows ({args.memory_budget_mb} MB budget)")
+
+    # Pass 1: categories -> encoders
+    feature_columns = [col for col in dtypes if col not in target_columns and col not in ['user_id', 'name']]
+    label_encoders, target_encoders, n_rows = build_encoders(args.dataset, chunksize, dtypes, feature_columns)
+    print(f"Pass 1: {n_rows} rows, {len(label_encoders)} categorical features")
+
+    # Pass 2: incremental scaler statistics on training rows
+    scaler = StandardScaler()
+    offset = 0
+    for chunk in iter_chunks(args.dataset, chunksize, dtypes):
+        X, y = encode_chunk(chunk, label_encoders, target_encoders, feature_columns)
+        X_train, _, _, _ = split_holdout(X, y, offset)
+        offset += len(chunk)
+        if len(X_train):
+            scaler.partial_fit(X_train)
+    # Predictor passes DataFrames; record the column names as a DataFrame fit would
+    scaler.feature_names_in_ = np.array(feature_columns, dtype=object)
+    print("Pass 2: scaler fitted")
+
+    # Remaining passes: partial_fit the estimator over the chunks
+    classes = [np.arange(len(target_encoders[col].classes_)) for col in target_columns]
+    model = MultiOutputClassifier(ESTIMATORS[args.estimator]())
+    for epoch in range(args.epochs):
+        offset = 0
+        for chunk in iter_chunks(args.dataset, chunksize, dtypes):
+            X, y = encode_chunk(chunk, label_encoders, target_encoders, feature_columns)
+            X_train, y_train, _, _ = split_holdout(X, y, offset)
+            offset += len(chunk)
+            if len(X_train):
+                model.partial_fit(scaler.transform(pd.DataFrame(X_train, columns=feature_columns)), y_train, classes=classes)
+        print(f"Epoch {epoch + 1}/{args.epochs} complete")
+
+    # Final pass: accuracy on the held-out rows
+    correct = np.zeros(len(target_columns))
+    total = 0
+    offset = 0
+    for chunk in iter_chunks(args.dataset, chunksize, dtypes):
+        X, y = encode_chunk(chunk, label_encoders, target_encoders, feature_columns)
+        _, _, X_holdout, y_holdout = split_holdout(X, y, offset)
+        offset += len(chunk)
+        if len(X_holdout):
+            X_holdout = scaler.transform(pd.DataFrame(X_holdout, columns=feature_columns))
+            correct += (model.predict(X_holdout) == y_holdout).sum(axis=0)
+            total += len(X_holdout)
+    accuracy = float(np.mean(correct / max(1, total)))
+
+    # Save artifacts in the layout Predictor expects
+    joblib.dump(label_encoders, os.path.join(args.output_dir, "label_encoders.pkl"))
+    joblib.dump(target_encoders, os.path.join(args.output_dir, "target_encoders.pkl"))
+    joblib.dump(scaler, os.path.join(args.output_dir, "scaler.pkl"))
+    joblib.dump(model, os.path.join(args.output_dir, "best_model.pkl"))
+    with open(os.path.join(args.output_dir, "feature_columns.txt"), "w") as f:
+        f.write(",".join(feature_columns))
+
+    # Predictor switches to the sparse path whenever a feature pipeline is present
+    pipeline_path = os.path.join(args.output_dir, "feature_pipeline.pkl")
+    if os.path.exists(pipeline_path):
+        os.remove(pipeline_path)
+
+    print(f"\nHoldout accuracy: {accuracy:.4f} on {total} rows")
+    if resource is not None:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+        print(f"Peak RSS: {peak_mb:.1f} MB")
+    print(f"Elapsed {time.perf_counter() - start:.1f}s")
+    print(f"Model saved to {os.path.join(args.output_dir, 'best_model.pkl')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an incremental model on a dataset streamed from disk")
+    parser.add_argument("--dataset", default="menstruation_food_recommendations_noisy.csv")
+    parser.add_argument("--memory-budget-mb", type=float, default=256,
+                        help="Upper bound for one chunk and its working copies")
+    parser.add_argument("--estimator", choices=sorted(ESTIMATORS), default="sgd")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--output-dir", default="models/trained_models")
+    main(parser.parse_args())
@@ -0,0 +1,203 @@
+"""
+Structured, leveled logging that stays off the request threads.
+
+Request handlers used to print whole payloads (food data, predictions, chat
+requests) synchronously to stdout. Instead:
+
+    from observability.log import get_logger
+    log = get_logger(__name__)
+    log.info('Prediction made', food_name=food_name, results=prediction_results)
+
+Keyword arguments become fields of the record. Records go to a bounded queue
+and are formatted and written by a background thread, so a slow log collector
+never blocks a request. When the queue is full, records are dropped and counted
+rather than waited on. Fields longer than LOG_FIELD_MAX_CHARS are truncated.
+Debug payload logs cost nothing while LOG_LEVEL is INFO, because the level is
+checked before a record is built.
+
+  * LOG_LEVEL            - DEBUG, INFO (default), WARNING, ERROR
+  * LOG_FORMAT           - json (default, one object per line) or text
+  * LOG_QUEUE_SIZE       - records waiting for the writer thread (default 10000)
+  * LOG_FIELD_MAX_CHARS  - longest field value written (default 512)
+  * LOG_SAMPLE_RATES     - JSON {route rule: rate}, e.g. '{"/predict": 0.1}'. Only
+                           that share of requests to the route keep their
+                           DEBUG/INFO records; warnings and errors are always kept
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_FIELD_MAX_CHARS = int(os.environ.get('LOG_FIELD_MAX_CHARS', 512))
+LOG_SAMPLE_RATES = json.loads(os.environ.get('LOG_SAMPLE_RATES', '') or '{}')
+
+# Keyword arguments the logging methods handle themselves
+_RESERVED = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+_handler = None
+_setup_lock = threading.Lock()
+
+
+def cap(value, limit=LOG_FIELD_MAX_CHARS):
+    """The value itself if it serializes within limit characters, otherwise a truncated string"""
+    text = value if isinstance(value, str) else json.dumps(value, default=str, separators=(',', ':'))
+    if len(text) <= limit:
+        return value
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, field_limit=LOG_FIELD_MAX_CHARS):
+        super().__init__()
+        self.field_limit = field_limit
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if getattr(record, 'route', None):
+            entry['route'] = record.route
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = cap(value, self.field_limit)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, field_limit=LOG_FIELD_MAX_CHARS):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.field_limit = field_limit
+
+    def formatMessage(self, record):
+        # Fields go on the first line, before any traceback
+        line = super().formatMessage(record)
+        fields = getattr(record, 'fields', {})
+        if getattr(record, 'route', None):
+            fields = dict(fields, route=record.route)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={cap(value, self.field_limit)}' for key, value in fields.items())
+        return line
+
+
+class RouteSampler(logging.Filter):
+    """Keeps DEBUG/INFO records for a sampled share of requests per route; decided once per request"""
+
+    def __init__(self, rates=None, default_rate=1.0):
+        super().__init__()
+        self.rates = LOG_SAMPLE_RATES if rates is None else rates
+        self.default_rate = default_rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        route = request.url_rule.rule if request.url_rule else request.path
+        record.route = route
+        if record.levelno >= logging.WARNING:
+            return True
+        keep = g.get('_log_sampled')
+        if keep is None:
+            keep = g._log_sampled = random.random() < self.rates.get(route, self.default_rate)
+        if not keep:
+            self.sampled_out += 1
+        return keep
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """Hands records to a writer thread through a bounded queue; drops (and counts) them when it is full"""
+
+    def __init__(self, target, queue_size=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = target
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Started on first use and again in a forked worker, since the thread does not survive a fork
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.Queue(maxsize=self.queue_size)
+                    self._listener = logging.handlers.QueueListener(self.queue, self.target)
+                    self._listener.start()
+                    self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out everything queued and stop the writer thread"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'queue_size': self.queue_size, 'dropped': self.dropped}
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger whose keyword arguments become record fields"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _RESERVED}
+        if fields:
+            kwargs['extra'] = dict(kwargs.get('extra') or {}, fields=fields)
+        return msg, kwargs
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route the root logger through the async handler (once per process); returns the handler"""
+    global _handler
+    with _setup_lock:
+        if _handler is None:
+            target = logging.StreamHandler(stream or sys.stdout)
+            target.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+            _handler = AsyncHandler(target)
+            _handler.addFilter(RouteSampler())
+            root = logging.getLogger()
+            root.addHandler(_handler)
+            root.setLevel(level)
+    return _handler
+
+
+def get_logger(name):
+    setup_logging()
+    return StructuredLogger(logging.getLogger(name), {})
+
+
+def shutdown():
+    if _handler is not None:
+        _handler.stop()
+
+
+def stats():
+    """Queue depth and records dropped or sampled out in this process"""
+    if _handler is None:
+        return {}
+    sampled_out = sum(f.sampled_out for f in _handler.filters if isinstance(f, RouteSampler))
+    return dict(_handler.stats(), sampled_out=sampled_out, level=logging.getLevelName(logging.getLogger().level))
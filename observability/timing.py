@@ -0,0 +1,438 @@
+"""
+Per-stage request timing, latency histograms and an on-demand profiler.
+
+Code on a request path marks its stages with span():
+
+    from observability.timing import span
+    with span('llm'):
+        food_data = llm_api.get_food_attributes(food_name)
+
+Outside a request span() does nothing, so library code can use it freely. When
+a request finishes, its spans and the total time are added to a latency
+histogram per route and stage. Spans with the same name in one request are
+added together. /metrics exposes the histograms in the Prometheus text format
+to holders of ADMIN_TOKEN (as a bearer token or X-Admin-Token). With
+SERVER_TIMING=1 the timings are also sent back in a Server-Timing header, which
+browser dev tools show under Timing; it is off by default because it shows
+every client how long each internal stage took.
+
+Under a pre-forking server each worker writes its histograms to METRICS_DIR
+(gunicorn.conf.py sets it) every METRICS_FLUSH_SECONDS from a background
+thread, and /metrics
+adds up every worker's file. Files of workers that have exited are folded into
+one archive file, so the totals never go backwards when a worker is recycled.
+
+An admin can profile live traffic for a fixed window (POST /admin/profile with
+the X-Admin-Token header). While the window is open, a sampled share of requests
+runs under cProfile. Each sampled request writes a .prof file to PROFILE_DIR,
+which can be read with pstats or snakeviz. The window is stored in a file in
+PROFILE_DIR, so every worker of a pre-forking server picks it up.
+
+  * SERVER_TIMING         - 1 sends the Server-Timing header (default 0)
+  * LATENCY_BUCKETS_MS    - histogram bucket bounds, comma separated
+  * METRICS_DIR           - shared histogram files; unset keeps them in memory
+  * METRICS_FLUSH_SECONDS - how often a worker writes its file (default 5)
+  * ADMIN_TOKEN           - token for /metrics and /admin/profile; both are off without it
+  * PROFILE_DIR         - where profiles are written (default profiles)
+  * PROFILE_MAX_SECONDS - longest profiling window (default 600)
+  * PROFILE_MAX_DUMPS   - profiles each process writes per window (default 200)
+"""
+import bisect
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from observability.log import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, where the app runs as a single process
+
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+LATENCY_BUCKETS_MS = [float(bound) for bound in os.environ.get(
+    'LATENCY_BUCKETS_MS', '1,2.5,5,10,25,50,100,250,500,1000,2500,5000,10000').split(',')]
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 600))
+PROFILE_MAX_DUMPS = int(os.environ.get('PROFILE_MAX_DUMPS', 200))
+
+log = get_logger(__name__)
+
+# Requests that match no route share one label, so stray URLs cannot add series
+UNMATCHED_ROUTE = '<unmatched>'
+
+# Histograms of workers that have exited, in METRICS_DIR
+ARCHIVE_FILE = 'archive.json'
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name` of the current request"""
+    if not has_request_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = g.setdefault('_timing_spans', {})
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - started
+
+
+class Histograms:
+    """Cumulative latency histograms keyed by (route, method, stage)"""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS, directory=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.bounds = [bound / 1000.0 for bound in sorted(buckets_ms)]
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        # key -> [count per bucket (last one is +Inf), sum of seconds]
+        self._series = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+
+    def observe(self, key, seconds):
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.bounds) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+            self._dirty = True
+        if self.directory and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        # Started on first use and again in a forked worker, since the thread does not survive a fork
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        def flush_loop():
+            while True:
+                time.sleep(self.flush_seconds)
+                if self._dirty:
+                    self.flush()
+
+        threading.Thread(target=flush_loop, daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+    def flush(self):
+        """Write this process's histograms to <directory>/<pid>.json"""
+        if not self.directory:
+            return
+        self._dirty = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_series(os.path.join(self.directory, f'{os.getpid()}.json'), self.snapshot())
+        except OSError as e:
+            log.warning("Could not write metrics", directory=self.directory, error=str(e))
+
+    def merged(self):
+        """Histograms of every process sharing the directory, or of this process without one"""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        with _locked(os.path.join(self.directory, '.lock')):
+            self._archive_exited()
+            merged = {}
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    _add_series(merged, _read_series(os.path.join(self.directory, name)))
+        return merged
+
+    def _archive_exited(self):
+        # Recycled workers leave a file each; fold them into one so the directory stays small
+        exited = []
+        for name in os.listdir(self.directory):
+            pid = name[:-len('.json')]
+            if name.endswith('.json') and pid.isdigit() and not _alive(int(pid)):
+                exited.append(os.path.join(self.directory, name))
+        if not exited:
+            return
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        archive = _read_series(archive_path)
+        for path in exited:
+            _add_series(archive, _read_series(path))
+        _write_series(archive_path, archive)
+        for path in exited:
+            os.remove(path)
+
+    def render(self, name='predo_request_duration_seconds'):
+        """The histograms in the Prometheus text exposition format"""
+        lines = [f'# HELP {name} Time spent in each stage of a request, by route',
+                 f'# TYPE {name} histogram']
+        upper_bounds = [f'{bound:g}' for bound in self.bounds] + ['+Inf']
+        for (route, method, stage), (counts, total) in sorted(self.merged().items()):
+            labels = f'route="{_escape(route)}",method="{method}",stage="{_escape(stage)}"'
+            cumulative = 0
+            for upper_bound, count in zip(upper_bounds, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{upper_bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def stats(self):
+        with self._lock:
+            return {'series': len(self._series), 'directory': self.directory or None}
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _write_series(path, series):
+    # Written and renamed, so readers never see half a file
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump([[*key, counts, total] for key, (counts, total) in series.items()], f)
+    os.replace(temp_path, path)
+
+
+def _read_series(path):
+    try:
+        with open(path) as f:
+            rows = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {(route, method, stage): (counts, total) for route, method, stage, counts, total in rows}
+
+
+def _add_series(into, series):
+    for key, (counts, total) in series.items():
+        if key in into:
+            into_counts, into_total = into[key]
+            into[key] = ([a + b for a, b in zip(into_counts, counts)], into_total + total)
+        else:
+            into[key] = (list(counts), total)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _locked(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def reset_metrics_dir(directory=METRICS_DIR):
+    """Start from empty histograms; a pre-forking master calls this before its workers start"""
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
+
+
+class Profiler:
+    """Runs a sampled share of requests under cProfile while a profiling window is open"""
+
+    def __init__(self, directory=PROFILE_DIR, max_seconds=PROFILE_MAX_SECONDS, max_dumps=PROFILE_MAX_DUMPS,
+                 poll_seconds=1.0):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self.max_dumps = max_dumps
+        self.poll_seconds = poll_seconds
+        self.state_path = os.path.join(directory, 'window.json')
+        self._window = None
+        self._checked_at = float('-inf')
+        self._dumps = 0
+        self._dumps_window = None
+        # One profiled request at a time per process; Python 3.12+ allows only one active profiler
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self, seconds, sample_rate):
+        """Open a window of `seconds` in which `sample_rate` of requests are profiled; returns the window"""
+        seconds = min(max(float(seconds), 1.0), self.max_seconds)
+        sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        now = time.time()
+        window = {'started_at': now, 'until': now + seconds, 'sample_rate': sample_rate}
+        os.makedirs(self.directory, exist_ok=True)
+        # Written and renamed, so other workers never read half a file
+        temp_path = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(window, f)
+        os.replace(temp_path, self.state_path)
+        with self._lock:
+            self._window = window
+            self._checked_at = time.monotonic()
+        return window
+
+    def stop(self):
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._window = None
+            self._checked_at = time.monotonic()
+
+    def window(self):
+        """The open profiling window, or None; the state file is read at most every poll_seconds"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.poll_seconds:
+            with self._lock:
+                if now - self._checked_at >= self.poll_seconds:
+                    try:
+                        with open(self.state_path) as f:
+                            self._window = json.load(f)
+                    except (OSError, ValueError):
+                        self._window = None
+                    self._checked_at = now
+        window = self._window
+        if window is None or time.time() >= window['until']:
+            return None
+        return window
+
+    def begin(self):
+        """A running cProfile.Profile if this request is sampled, otherwise None"""
+        window = self.window()
+        if window is None or random.random() >= window['sample_rate']:
+            return None
+        with self._lock:
+            if self._dumps_window != window['started_at']:
+                self._dumps_window = window['started_at']
+                self._dumps = 0
+            if self._dumps >= self.max_dumps:
+                return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, say) is already active
+            self._busy.release()
+            return None
+        return profile
+
+    def end(self, profile):
+        profile.disable()
+        self._busy.release()
+
+    def dump(self, profile, method, route, seconds):
+        with self._lock:
+            self._dumps += 1
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{method}-{slug}-{seconds * 1000:.0f}ms.prof"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, name))
+        except OSError as e:
+            log.warning("Could not write profile", file=name, error=str(e))
+
+    def stats(self):
+        window = self.window()
+        return {
+            'active': window is not None,
+            'until': window['until'] if window else None,
+            'sample_rate': window['sample_rate'] if window else None,
+            'dumps': self._dumps,
+            'directory': os.path.abspath(self.directory)
+        }
+
+
+histograms = Histograms()
+profiler = Profiler()
+
+
+def admin_token_valid(token):
+    """True when ADMIN_TOKEN is set and `token` matches it"""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def request_token():
+    """The token sent with the request, as `Authorization: Bearer` (Prometheus) or X-Admin-Token"""
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+    return request.headers.get('X-Admin-Token', '')
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+
+
+def server_timing(spans, total):
+    return ', '.join([f'{name};dur={seconds * 1000:.1f}' for name, seconds in spans.items()]
+                     + [f'total;dur={total * 1000:.1f}'])
+
+
+def init_app(app):
+    """Time every request of `app`, send Server-Timing and profile sampled requests"""
+    wsgi_app = app.wsgi_app
+
+    def timed_wsgi_app(environ, start_response):
+        # Taken before Flask loads the session, so the total includes it
+        environ['observability.started'] = time.perf_counter()
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = timed_wsgi_app
+
+    @app.before_request
+    def start_profile():
+        g._timing_profile = profiler.begin()
+
+    @app.after_request
+    def record_timing(response):
+        total = time.perf_counter() - request.environ.get('observability.started', time.perf_counter())
+        profile = g.pop('_timing_profile', None)
+        if profile is not None:
+            profiler.end(profile)
+        spans = g.get('_timing_spans', {})
+        route, method = _route(), request.method
+        for name, seconds in spans.items():
+            histograms.observe((route, method, name), seconds)
+        histograms.observe((route, method, 'total'), total)
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = server_timing(spans, total)
+        if profile is not None:
+            # Written once the response has been handed to the server
+            response.call_on_close(lambda: profiler.dump(profile, method, route, total))
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        # after_request is skipped when the response itself fails
+        profile = g.pop('_timing_profile', None)
+        if profile is not None:
+            profiler.end(profile)
+
+
+def stats():
+    return dict(histograms.stats(), profiler=profiler.stats())
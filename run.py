@@ -2,10 +2,14 @@
 """
 Garuda 4.0 Launcher
 This script helps set up and run the Garuda 4.0 application.
+
+By default it starts Flask's development server. --production starts gunicorn
+(waitress on Windows) with several workers and threads; see gunicorn.conf.py.
 """
 
 import os
 import sys
+import signal
 import subprocess
 import argparse
 from pathlib import Path
@@ -63,10 +67,46 @@ def run_application(python_exe, debug=False):
     print(f"Starting Garuda 4.0 {'in debug mode' if debug else ''}...")
     subprocess.run([python_exe, "app.py"], env=env)
 
+def run_production(python_exe, args):
+    """Run the application under a production WSGI server."""
+    if sys.platform == "win32":
+        # Waitress runs one process with a thread pool (no forking, so no worker recycling)
+        command = [python_exe, "-m", "waitress", f"--listen={args.bind}",
+                   f"--threads={args.workers * args.threads}", "wsgi:app"]
+    else:
+        command = [python_exe, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", args.bind,
+                   "--workers", str(args.workers), "--threads", str(args.threads),
+                   "--max-requests", str(args.max_requests),
+                   "--max-requests-jitter", str(args.max_requests_jitter)]
+    
+    print(f"Starting Garuda 4.0 in production mode on {args.bind}...")
+    server = subprocess.Popen(command)
+    
+    if sys.platform != "win32":
+        # kill -HUP <launcher pid> reloads gracefully, like signalling the gunicorn master directly
+        def forward(signum, frame):
+            server.send_signal(signum)
+        signal.signal(signal.SIGHUP, forward)
+        signal.signal(signal.SIGTERM, forward)
+    # Ctrl+C reaches the server too; wait for it to shut down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    return server.wait()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Garuda 4.0 Launcher")
     parser.add_argument("--debug", action="store_true", help="Run in debug mode")
     parser.add_argument("--skip-deps", action="store_true", help="Skip dependency installation")
+    parser.add_argument("--production", action="store_true", help="Run under gunicorn (waitress on Windows)")
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:8000"), help="Production address")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="Production worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("GUNICORN_THREADS", 4)),
+                        help="Threads per worker")
+    parser.add_argument("--max-requests", type=int, default=int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000)),
+                        help="Replace a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int,
+                        default=int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100)),
+                        help="Random extra requests per worker so they are not all replaced at once")
     args = parser.parse_args()
     
     # Check Python version
@@ -83,4 +123,6 @@ if __name__ == "__main__":
     check_models()
     
     # Run application
+    if args.production:
+        sys.exit(run_production(python_exe, args))
     run_application(python_exe, args.debug) 
\ No newline at end of file
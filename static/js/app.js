@@ -519,16 +519,37 @@ document.addEventListener('DOMContentLoaded', function() {
         return typingElement;
     }
     
-    // Fetch prediction history
-    function fetchHistory() {
-        fetch('/history')
+    // Append a "Load more" button that fetches the page after nextCursor
+    function renderLoadMore(listElement, nextCursor, loadPage) {
+        const existing = listElement.querySelector('.load-more-btn');
+        if (existing) {
+            existing.remove();
+        }
+        if (!nextCursor) {
+            return;
+        }
+        
+        const loadMoreBtn = document.createElement('button');
+        loadMoreBtn.className = 'btn btn-sm btn-outline-secondary w-100 mt-2 load-more-btn';
+        loadMoreBtn.textContent = 'Load more';
+        loadMoreBtn.addEventListener('click', function() {
+            loadMoreBtn.disabled = true;
+            loadPage(nextCursor);
+        });
+        listElement.appendChild(loadMoreBtn);
+    }
+    
+    // Fetch prediction history; with a cursor, append the next page
+    function fetchHistory(cursor) {
+        fetch(cursor ? `/history?cursor=${encodeURIComponent(cursor)}` : '/history')
             .then(response => response.json())
             .then(data => {
                 console.log("History data received:", data);
                 if (data.history && data.history.length > 0) {
-                    displayHistory(data.history);
+                    displayHistory(data.history, Boolean(cursor));
+                    renderLoadMore(historyList, data.next_cursor, fetchHistory);
                     noHistory.style.display = 'none';
-                } else {
+                } else if (!cursor) {
                     noHistory.style.display = 'block';
                     historyList.innerHTML = '';
                     historyList.appendChild(noHistory);
@@ -540,16 +561,17 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    // Fetch chat history
-    function fetchChatHistory() {
-        fetch('/chat-history')
+    // Fetch chat history; with a cursor, append the next page
+    function fetchChatHistory(cursor) {
+        fetch(cursor ? `/chat-history?cursor=${encodeURIComponent(cursor)}` : '/chat-history')
             .then(response => response.json())
             .then(data => {
                 console.log("Chat history data received:", data);
                 if (data.history && data.history.length > 0) {
-                    displayChatHistory(data.history);
+                    displayChatHistory(data.history, Boolean(cursor));
+                    renderLoadMore(chatHistoryList, data.next_cursor, fetchChatHistory);
                     noChatHistory.style.display = 'none';
-                } else {
+                } else if (!cursor) {
                     noChatHistory.style.display = 'block';
                     chatHistoryList.innerHTML = '';
                     chatHistoryList.appendChild(noChatHistory);
@@ -561,9 +583,11 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    function displayHistory(historyItems) {
-        // Clear existing content
-        historyList.innerHTML = '';
+    function displayHistory(historyItems, append = false) {
+        // Clear existing content unless this is a further page
+        if (!append) {
+            historyList.innerHTML = '';
+        }
         
         console.log("Displaying history items:", historyItems.length);
         
@@ -632,9 +656,11 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    function displayChatHistory(historyItems) {
-        // Clear existing content
-        chatHistoryList.innerHTML = '';
+    function displayChatHistory(historyItems, append = false) {
+        // Clear existing content unless this is a further page
+        if (!append) {
+            chatHistoryList.innerHTML = '';
+        }
         
         console.log("Displaying chat history items:", historyItems.length);
         
@@ -667,6 +693,31 @@ document.addEventListener('DOMContentLoaded', function() {
                 historyItem.appendChild(userMessage);
                 historyItem.appendChild(botMessage);
                 
+                // Long responses arrive as a preview; fetch the full text on demand
+                if (item.truncated) {
+                    botMessage.textContent += '…';
+                    const showMoreBtn = document.createElement('button');
+                    showMoreBtn.className = 'btn btn-sm btn-link p-0';
+                    showMoreBtn.textContent = 'Show full response';
+                    showMoreBtn.addEventListener('click', function() {
+                        fetch(`/chat-history/${item.id}`)
+                            .then(response => response.json())
+                            .then(detail => {
+                                if (detail.error) {
+                                    showToast(detail.error, 'error');
+                                    return;
+                                }
+                                botMessage.textContent = detail.bot_response;
+                                showMoreBtn.remove();
+                            })
+                            .catch(error => {
+                                console.error('Error fetching chat message:', error);
+                                showToast('Error loading message', 'error');
+                            });
+                    });
+                    historyItem.appendChild(showMoreBtn);
+                }
+                
                 chatHistoryList.appendChild(historyItem);
                 
                 // Remove animation class after animation completes
@@ -1248,8 +1299,8 @@ document.addEventListener('DOMContentLoaded', function() {
         moodmotionResults.scrollIntoView({ behavior: 'smooth', block: 'start' });
     }
     
-    function fetchMoodMotionHistory() {
-        fetch('/moodmotion-history')
+    function fetchMoodMotionHistory(cursor) {
+        fetch(cursor ? `/moodmotion-history?cursor=${encodeURIComponent(cursor)}` : '/moodmotion-history')
             .then(response => response.json())
             .then(data => {
                 if (data.error) {
@@ -1257,7 +1308,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 
-                displayMoodMotionHistory(data.history);
+                displayMoodMotionHistory(data.history, Boolean(cursor));
+                if (moodmotionHistoryList) {
+                    renderLoadMore(moodmotionHistoryList, data.next_cursor, fetchMoodMotionHistory);
+                }
             })
             .catch(error => {
                 console.error('Error:', error);
@@ -1265,13 +1319,15 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    function displayMoodMotionHistory(historyItems) {
+    function displayMoodMotionHistory(historyItems, append = false) {
         if (!moodmotionHistoryList) return;
         
-        // Clear current history
-        moodmotionHistoryList.innerHTML = '';
+        // Clear current history unless this is a further page
+        if (!append) {
+            moodmotionHistoryList.innerHTML = '';
+        }
         
-        if (historyItems.length === 0) {
+        if (historyItems.length === 0 && !append) {
             if (noMoodmotionHistory) {
                 noMoodmotionHistory.style.display = 'block';
             }
@@ -1301,66 +1357,6 @@ document.addEventListener('DOMContentLoaded', function() {
             
             historyCard.classList.add(cardBorder);
             
-            // Format extras and benefits for display
-            let extrasText = '';
-            let benefitsHtml = '';
-            
-            // Process "What you'll need" section
-            if (typeof item.extras === 'string') {
-                extrasText = item.extras;
-            } else if (item.extras) {
-                try {
-                    // If it's already an object
-                    const extrasObj = (typeof item.extras === 'object') 
-                        ? item.extras 
-                        : JSON.parse(item.extras);
-                    
-                    // Create a formatted list from the object properties
-                    extrasText = '<ul class="needs-list">';
-                    for (const [key, value] of Object.entries(extrasObj)) {
-                        const formattedKey = key.replace(/_/g, ' ')
-                                              .split(' ')
-                                              .map(word => word.charAt(0).toUpperCase() + word.slice(1))
-                                              .join(' ');
-                        extrasText += `<li><strong>${formattedKey}:</strong> ${value}</li>`;
-                    }
-                    extrasText += '</ul>';
-                } catch (e) {
-                    console.error("Error parsing extras:", e);
-                    extrasText = String(item.extras);
-                }
-            } else {
-                extrasText = 'None specified';
-            }
-            
-            // Process "Benefits" section
-            if (typeof item.benefits === 'string') {
-                benefitsHtml = item.benefits;
-            } else if (item.benefits) {
-                try {
-                    // If it's already an object
-                    const benefitsObj = (typeof item.benefits === 'object') 
-                        ? item.benefits 
-                        : JSON.parse(item.benefits);
-                    
-                    // Create a formatted list from the object properties
-                    benefitsHtml = '<ul class="benefits-list">';
-                    for (const [key, value] of Object.entries(benefitsObj)) {
-                        const formattedKey = key.replace(/_/g, ' ')
-                                               .split(' ')
-                                               .map(word => word.charAt(0).toUpperCase() + word.slice(1))
-                                               .join(' ');
-                        benefitsHtml += `<li><strong>${formattedKey}:</strong> ${value}</li>`;
-                    }
-                    benefitsHtml += '</ul>';
-                } catch (e) {
-                    console.error("Error parsing benefits:", e);
-                    benefitsHtml = String(item.benefits);
-                }
-            } else {
-                benefitsHtml = 'None specified';
-            }
-            
             // Create card HTML
             historyCard.innerHTML = `
                 <div class="card-header">
@@ -1377,20 +1373,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     </div>
                     <p class="card-text mb-0">${item.description}</p>
                     <button class="btn btn-sm btn-outline-primary mt-2 view-details-btn">View Details</button>
-                    <div class="activity-details mt-3 d-none">
-                        <h6 class="mb-2">How to do it:</h6>
-                        <ol class="step-list small">
-                            ${item.steps.map(step => `<li>${step}</li>`).join('')}
-                        </ol>
-                        <div class="extras-container mt-3">
-                            <h6 class="mb-1 small">What you'll need:</h6>
-                            <div class="small">${extrasText}</div>
-                        </div>
-                        <div class="benefits-container mt-2">
-                            <h6 class="mb-1 small">Benefits:</h6>
-                            <div class="small">${benefitsHtml}</div>
-                        </div>
-                    </div>
+                    <div class="activity-details mt-3 d-none"></div>
                 </div>
             `;
             
@@ -1403,6 +1386,29 @@ document.addEventListener('DOMContentLoaded', function() {
             
             detailsBtn.addEventListener('click', function() {
                 if (detailsContainer.classList.contains('d-none')) {
+                    // Steps, extras and benefits are not in the list response; load them once
+                    if (!detailsContainer.dataset.loaded) {
+                        detailsBtn.disabled = true;
+                        fetch(`/moodmotion-history/${item.id}`)
+                            .then(response => response.json())
+                            .then(detail => {
+                                detailsBtn.disabled = false;
+                                if (detail.error) {
+                                    showToast(detail.error, 'danger');
+                                    return;
+                                }
+                                detailsContainer.innerHTML = renderMoodMotionDetails(detail);
+                                detailsContainer.dataset.loaded = 'true';
+                                detailsContainer.classList.remove('d-none');
+                                detailsBtn.textContent = 'Hide Details';
+                            })
+                            .catch(error => {
+                                detailsBtn.disabled = false;
+                                console.error('Error:', error);
+                                showToast('Error fetching recommendation details', 'danger');
+                            });
+                        return;
+                    }
                     detailsContainer.classList.remove('d-none');
                     detailsBtn.textContent = 'Hide Details';
                 } else {
@@ -1413,6 +1419,83 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    function renderMoodMotionDetails(item) {
+        // Format extras and benefits for display
+        let extrasText = '';
+        let benefitsHtml = '';
+        
+        // Process "What you'll need" section
+        if (typeof item.extras === 'string') {
+            extrasText = item.extras;
+        } else if (item.extras) {
+            try {
+                // If it's already an object
+                const extrasObj = (typeof item.extras === 'object') 
+                    ? item.extras 
+                    : JSON.parse(item.extras);
+                
+                // Create a formatted list from the object properties
+                extrasText = '<ul class="needs-list">';
+                for (const [key, value] of Object.entries(extrasObj)) {
+                    const formattedKey = key.replace(/_/g, ' ')
+                                          .split(' ')
+                                          .map(word => word.charAt(0).toUpperCase() + word.slice(1))
+                                          .join(' ');
+                    extrasText += `<li><strong>${formattedKey}:</strong> ${value}</li>`;
+                }
+                extrasText += '</ul>';
+            } catch (e) {
+                console.error("Error parsing extras:", e);
+                extrasText = String(item.extras);
+            }
+        } else {
+            extrasText = 'None specified';
+        }
+        
+        // Process "Benefits" section
+        if (typeof item.benefits === 'string') {
+            benefitsHtml = item.benefits;
+        } else if (item.benefits) {
+            try {
+                // If it's already an object
+                const benefitsObj = (typeof item.benefits === 'object') 
+                    ? item.benefits 
+                    : JSON.parse(item.benefits);
+                
+                // Create a formatted list from the object properties
+                benefitsHtml = '<ul class="benefits-list">';
+                for (const [key, value] of Object.entries(benefitsObj)) {
+                    const formattedKey = key.replace(/_/g, ' ')
+                                           .split(' ')
+                                           .map(word => word.charAt(0).toUpperCase() + word.slice(1))
+                                           .join(' ');
+                    benefitsHtml += `<li><strong>${formattedKey}:</strong> ${value}</li>`;
+                }
+                benefitsHtml += '</ul>';
+            } catch (e) {
+                console.error("Error parsing benefits:", e);
+                benefitsHtml = String(item.benefits);
+            }
+        } else {
+            benefitsHtml = 'None specified';
+        }
+        
+        return `
+            <h6 class="mb-2">How to do it:</h6>
+            <ol class="step-list small">
+                ${(item.steps || []).map(step => `<li>${step}</li>`).join('')}
+            </ol>
+            <div class="extras-container mt-3">
+                <h6 class="mb-1 small">What you'll need:</h6>
+                <div class="small">${extrasText}</div>
+            </div>
+            <div class="benefits-container mt-2">
+                <h6 class="mb-1 small">Benefits:</h6>
+                <div class="small">${benefitsHtml}</div>
+            </div>
+        `;
+    }
+    
     function clearMoodMotionHistory() {
         if (!confirm('Are you sure you want to clear your MoodMotion history?')) {
             return;
@@ -0,0 +1,19 @@
+"""
+Test configuration.
+
+The app and the db modules read their settings at import time, so every file
+they write goes to a temporary directory before any test module imports them.
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix='predo-tests-')
+
+os.environ['DATABASE_URL'] = ''
+os.environ['DATABASE_PATH'] = os.path.join(TEST_DIR, 'food_predictions.db')
+os.environ['SESSION_STORE_URL'] = ''
+os.environ['SESSION_DATABASE_PATH'] = os.path.join(TEST_DIR, 'sessions.db')
+os.environ['BACKGROUND_JOBS_LOCK'] = os.path.join(TEST_DIR, 'background_jobs.lock')
+os.environ['RETENTION_ARCHIVE_DIR'] = os.path.join(TEST_DIR, 'archive')
+os.environ['FLASK_SECRET_KEY'] = 'test-secret'
+os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from db.conformance import check_repository
+from db.repository import create_repository
+
+POSTGRES_URL = os.environ.get('CONFORMANCE_POSTGRES_URL')
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def repo(request, tmp_path):
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path / 'conformance.db'}"
+    elif POSTGRES_URL:
+        url = POSTGRES_URL
+    else:
+        pytest.skip('PostgreSQL backend NOT checked: set CONFORMANCE_POSTGRES_URL to a throwaway database')
+    repo = create_repository(url)
+    repo.migrate()
+    yield repo
+    repo.close()
+
+
+def test_backend_conformance(repo):
+    check = check_repository(repo)
+    assert check.failures == []
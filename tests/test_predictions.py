@@ -0,0 +1,37 @@
+import uuid
+
+import pytest
+
+import app as predo
+
+LIST_VALUED_FOOD = {
+    'food_name': 'Trail mix', 'food_category': 'Snacks', 'food_subcategory': 'Nuts',
+    'processing_level': 'Minimally Processed', 'caffeine_content_mg': 0, 'flavor_profile': 'Sweet',
+    'common_allergens': ['Nuts', 'Soy'], 'glycemic_index': 40, 'inflammatory_index': 3, 'calories_kcal': 460
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No LLM call: the attributes arrive the way the LLM returned them
+    monkeypatch.setattr(predo.llm_api, 'get_food_attributes', lambda food_name: dict(LIST_VALUED_FOOD))
+    client = predo.app.test_client()
+    username = f'user-{uuid.uuid4().hex[:8]}'
+    credentials = {'username': username, 'email': f'{username}@example.com', 'password': 'correct horse'}
+    assert client.post('/register', json=credentials).status_code == 200
+    assert client.post('/login', json=credentials).status_code == 200
+    return client
+
+
+def test_prediction_with_list_valued_attribute_is_stored(client):
+    response = client.post('/predict', json={'food_name': 'Trail mix'})
+    assert response.status_code == 200
+    prediction_id = response.json['prediction_id']
+    assert prediction_id is not None
+
+    predo.repository.flush()
+    history = client.get('/history').json
+    assert prediction_id in [item['id'] for item in history['history']]
+
+    detail = client.get(f'/history/{prediction_id}').json
+    assert detail['food_data']['common_allergens'] == ['Nuts', 'Soy']
@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from db.migrations import migrate
+from db.predictions import prediction_writes
+from db.queries import HOT_QUERIES
+from db.query_plans import check_query_plans, query_plan
+
+# Pages that must be answered from the index alone
+COVERED_QUERIES = ['prediction_page_by_user', 'prediction_page_anonymous']
+
+RESULTS = {'impact_on_cramps': 'Harmful', 'impact_on_bloating': 'Neutral'}
+
+
+@pytest.fixture(params=['empty', 'analyzed'])
+def conn(request):
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    if request.param == 'analyzed':
+        # Statistics can change the planner's choice, so check with a populated schema too
+        for i in range(500):
+            food = {'food_name': f'food {i % 50}', 'food_category': 'Fruit'}
+            for sql, params in prediction_writes(food['food_name'], food, RESULTS, i % 20 or None):
+                conn.execute(sql, params)
+            conn.execute('INSERT INTO chat_history (session_id, user_message, bot_response, user_id) '
+                         'VALUES (?, ?, ?, ?)', (f'session {i % 30}', 'hi', 'hello', i % 20 or None))
+        conn.commit()
+        conn.execute('ANALYZE')
+    yield conn
+    conn.close()
+
+
+def test_hot_queries_do_not_scan_or_sort(conn):
+    assert check_query_plans(conn) == {}
+
+
+@pytest.mark.parametrize('name', COVERED_QUERIES)
+def test_prediction_pages_use_a_covering_index(conn, name):
+    sql, params = HOT_QUERIES[name]
+    plan = query_plan(conn, sql, params)
+    assert any('USING COVERING INDEX' in step for step in plan), plan
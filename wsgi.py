@@ -0,0 +1,27 @@
+"""
+WSGI entry point for production servers (python run.py --production).
+
+Importing this module builds the app and loads the model. gunicorn imports it
+once in the master (preload_app in gunicorn.conf.py), so workers fork with the
+model already in memory and share it copy-on-write. With INFERENCE_MODE=process
+nothing is loaded here: each worker starts its own inference process on first
+use instead of inheriting one that belongs to the master.
+
+    gunicorn wsgi:app                          # settings from gunicorn.conf.py
+    waitress-serve --port=8000 wsgi:app        # Windows
+"""
+import os
+
+from app import app, get_predictor
+
+
+def warm_up():
+    """Load (or reload) the model and its lazily loaded parts in this process"""
+    if os.environ.get('INFERENCE_MODE', 'inprocess') == 'process':
+        return
+    predictor = get_predictor()
+    if predictor is not None:
+        predictor.warm_up()
+
+
+warm_up()